@@ -0,0 +1,121 @@
+"""Benchmark for the line classification of the UltrastarFileParser.
+
+Generates a synthetic corpus of Ultrastar files and reports the parsed lines per second of the
+previous line classification (looping over every `UltrastarFileRegexMatcher` with `re.search` and
+splitting sing lines with `re.split`) and of the current precompiled first-character dispatch.
+
+Run from the backend directory:
+
+>>> python -m benchmarks.parser_benchmark --songs 200 --lines 1000
+"""
+
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from src.ultrastar_file_parser import UltrastarFileParser
+from src.ultrastar_file_parser.exceptions import UltrastarMatchingError
+from src.ultrastar_file_parser.schemas import UltrastarFileRegexMatcher
+
+SYLLABLES = ["la", "na", "fire", "sing", "storm", "night", "light", "~", "heart", "wolf"]
+
+
+def write_synthetic_song(file_path: str, number_of_lines: int, rng: random.Random) -> None:
+    """Write an Ultrastar file with header attributes, notes, phrase ends and player switches."""
+    lines = [f"#TITLE:Synthetic Song {rng.randrange(10 ** 6)}\n",
+             "#ARTIST:Benchmark\n",
+             "#MP3:song.mp3\n",
+             "#BPM:300\n",
+             "#GAP:1200\n",
+             "P1\n"]
+    beat = 0
+    while len(lines) < number_of_lines - 1:
+        if rng.random() < 0.15:
+            lines.append(f"- {beat + 2}\n")
+        elif rng.random() < 0.01:
+            lines.append(f"P{rng.randint(1, 2)}\n")
+        else:
+            note_type = rng.choice(":::::*FRG")
+            length = rng.randint(1, 8)
+            lines.append(f"{note_type} {beat} {length} {rng.randint(-5, 20)} {rng.choice(SYLLABLES)} \n")
+            beat += length + 1
+    lines.append("E\n")
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+
+
+def legacy_parse(file_path: str) -> Dict[str, str]:
+    """Parse a file the way the parser did before the precompiled classifier was introduced."""
+    attributes: Dict[str, str] = {}
+    lyrics = ""
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            regex_match = None
+            for regex in UltrastarFileRegexMatcher:
+                if re.search(regex.value, line):
+                    regex_match = UltrastarFileRegexMatcher(regex)
+                    break
+            if regex_match is None:
+                raise UltrastarMatchingError(f"Line does not match any Ultrastar file format: {line}")
+            if regex_match is UltrastarFileRegexMatcher.ATTRIBUTE:
+                attr, value = line.split(":", 1)
+                attributes[attr.lstrip("#").lower()] = value.replace("\n", "").strip()
+            elif regex_match is UltrastarFileRegexMatcher.SING_LINE:
+                _, sung = re.split(pattern=UltrastarFileRegexMatcher.SING_LINE.value, string=line, maxsplit=1)
+                lyrics += sung.replace("~", "").replace("\n", "")
+            elif regex_match is UltrastarFileRegexMatcher.END_OF_PHRASE:
+                if lyrics and not lyrics.endswith(" "):
+                    lyrics += " "
+    attributes["lyrics"] = lyrics
+    return attributes
+
+
+def current_parse(file_path: str) -> Dict[str, str]:
+    return UltrastarFileParser.parse_file_for_ultrastar_song_attributes(file_path, encoding="utf-8")
+
+
+def measure(parse: Callable[[str], Dict[str, str]], file_paths: List[str], total_lines: int, rounds: int) -> float:
+    """Return the best lines per second of `parse` over all files in `rounds` runs."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for file_path in file_paths:
+            parse(file_path)
+        best = min(best, time.perf_counter() - start)
+    return total_lines / best
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--songs", type=int, default=200, help="number of synthetic songs")
+    arg_parser.add_argument("--lines", type=int, default=1000, help="lines per synthetic song")
+    arg_parser.add_argument("--rounds", type=int, default=3, help="runs per implementation, the best counts")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        file_paths = [os.path.join(corpus_dir, f"song_{i}.txt") for i in range(args.songs)]
+        for file_path in file_paths:
+            write_synthetic_song(file_path, args.lines, rng)
+
+        for file_path in file_paths:
+            if legacy_parse(file_path) != current_parse(file_path):
+                raise AssertionError(f"Parsers disagree on {file_path}")
+
+        total_lines = args.songs * args.lines
+        before = measure(legacy_parse, file_paths, total_lines, args.rounds)
+        after = measure(current_parse, file_paths, total_lines, args.rounds)
+
+    print(f"corpus: {args.songs} songs x {args.lines} lines")
+    print(f"before: {before:>12,.0f} lines/s")
+    print(f"after:  {after:>12,.0f} lines/s")
+    print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
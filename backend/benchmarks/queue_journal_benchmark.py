@@ -0,0 +1,80 @@
+"""Benchmark for journaling the changes to the queue and recovering the queue from the journal.
+
+Adds, moves, processes and removes entries of a queue with a journal in a temporary dir and reports
+the median and 99th percentile time of each change, then the time to recover the queue from the
+journal without a snapshot.
+
+Run from the backend directory:
+
+>>> python -m benchmarks.queue_journal_benchmark --changes 10000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from src.app.queue.journal import QueueJournal
+from src.app.queue.schemas import QueueEntry
+from src.app.queue.service import QueueService
+from src.app.songs.models import UltrastarSong
+
+
+def generate_entry(song_id: int, rng: random.Random) -> QueueEntry:
+    song = UltrastarSong(id=song_id,
+                         title=f"Song {song_id}",
+                         artist=f"Artist {song_id % 100}",
+                         audio_duration=timedelta(seconds=rng.randint(120, 360)),
+                         lyrics=" ".join(rng.choice(["fire", "storm", "night", "heart", "rain"]) for _ in range(300)))
+    return QueueEntry(song=song, singer=f"Singer {rng.randint(1, 50)}")
+
+
+def make_change(queue_service: QueueService, song_id: int, rng: random.Random) -> None:
+    """Make a random change to the queue, mostly adding entries, while keeping it at a realistic length."""
+    entry_ids = queue_service.entry_ids
+    choice = rng.random()
+    if len(entry_ids) < 50 or choice < 0.4:
+        queue_service.add_entry_at_end(generate_entry(song_id, rng))
+    elif choice < 0.6:
+        queue_service.move_entry_before_entry(rng.choice(entry_ids), rng.choice(entry_ids))
+    elif choice < 0.9:
+        queue_service.mark_entry_as_processed(entry_ids[0])
+    else:
+        queue_service.remove_entry_by_id(rng.choice(entry_ids))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the queue journal.")
+    parser.add_argument("--changes", type=int, default=10000, help="number of changes to journal")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as dir_path:
+        journal_path = os.path.join(dir_path, "queue_journal.sqlite")
+        # no snapshot is taken, so all changes are replayed on recovery
+        queue_service = QueueService()
+        queue_service.open_journal(QueueJournal(journal_path, snapshot_every=args.changes + 1))
+        durations = []
+        for song_id in range(1, args.changes + 1):
+            start = time.perf_counter()
+            make_change(queue_service, song_id, rng)
+            durations.append(time.perf_counter() - start)
+        durations.sort()
+        print(f"median {durations[len(durations) // 2] * 1000:.3f} ms, "
+              f"99th percentile {durations[int(len(durations) * 0.99)] * 1000:.3f} ms per change")
+
+        journal = QueueJournal(journal_path, snapshot_every=args.changes + 1)
+        start = time.perf_counter()
+        recovered = QueueService()
+        replayed = recovered.open_journal(journal)
+        print(f"recovered {len(recovered.queue)} entries and {len(recovered.processed_entries)} processed entries "
+              f"from {replayed} changes in {time.perf_counter() - start:.2f} s")
+        assert recovered.entry_ids == queue_service.entry_ids
+        journal.close()
+        queue_service.close_journal()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark for the typo-tolerant search of the TrigramIndex and the completions of the PrefixIndex.
+
+Builds both indexes of a synthetic catalog and reports the time to build them, the mean and worst time
+of searching for misspelled titles and artists and the median and 99th percentile time of completing
+prefixes typed letter by letter.
+
+Run from the backend directory:
+
+>>> python -m benchmarks.search_index_benchmark --songs 50000
+"""
+
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+from src.app.songs.search_index import PrefixIndex, TrigramIndex
+
+SYLLABLES = ["ka", "ri", "so", "ne", "ta", "lu", "mo", "ver", "an", "del", "gar", "to", "ben", "sil", "por", "in"]
+WORDS = ["fire", "forgive", "storm", "sainted", "night", "light", "heart", "wolf", "hallelujah", "hardrock",
+         "sandman", "blood", "metal", "queen", "dancing", "love", "dream", "highway", "thunder", "rain"]
+ARTISTS = ["Powerwolf", "Lordi", "ABBA", "Queen", "Helene Fischer", "Motörhead", "Beyoncé", "Nena",
+           "Die Ärzte", "Rammstein", "Scooter", "Modern Talking", "Whitney Houston", "Elvis Presley"]
+QUERIES = ["powerwolff", "hallelulah", "motorhed", "helene fisher", "thundr", "sainted storm", "beyonce",
+           "rammstien", "dancin queen", "whitny huston"]
+TYPED_TEXTS = ["powerwolf", "hardrock hallelujah", "motorhead", "helene fischer", "queen", "ka", "die arzte"]
+
+
+def generate_word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+
+
+def generate_catalog(number_of_songs: int, rng: random.Random) -> List[Tuple[int, str, str]]:
+    """Return songs with generated titles and artists, sprinkled with some well known words and artists."""
+    artists = ARTISTS + [f"{generate_word(rng)} {generate_word(rng)}".title() for _ in range(number_of_songs // 5)]
+    catalog = []
+    for song_id in range(1, number_of_songs + 1):
+        words = [rng.choice(WORDS) if rng.random() < 0.1 else generate_word(rng) for _ in range(rng.randint(1, 5))]
+        catalog.append((song_id, " ".join(words).title(), rng.choice(artists)))
+    return catalog
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the search of the TrigramIndex and the PrefixIndex.")
+    parser.add_argument("--songs", type=int, default=50000, help="number of songs in the synthetic catalog")
+    parser.add_argument("--rounds", type=int, default=20, help="number of searches per query")
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.songs, random.Random(42))
+    start = time.perf_counter()
+    index = TrigramIndex(catalog)
+    print(f"built index of {len(index)} songs in {time.perf_counter() - start:.2f} s")
+
+    durations = []
+    for query in QUERIES:
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            results = index.search(query)
+            durations.append(time.perf_counter() - start)
+        best_match = f"{results[0].title} by {results[0].artist}" if results else "-"
+        print(f"{query!r}: {len(results)} results, best match {best_match}")
+    print(f"mean {sum(durations) / len(durations) * 1000:.2f} ms, worst {max(durations) * 1000:.2f} ms per search")
+
+    start = time.perf_counter()
+    prefix_index = PrefixIndex(catalog)
+    print(f"built prefix index of {len(prefix_index)} songs in {time.perf_counter() - start:.2f} s")
+
+    durations = []
+    for text in TYPED_TEXTS:
+        for prefix in (text[:length] for length in range(1, len(text) + 1)):
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                prefix_index.suggest(prefix)
+                durations.append(time.perf_counter() - start)
+    durations.sort()
+    print(f"median {durations[len(durations) // 2] * 1000:.3f} ms, "
+          f"99th percentile {durations[int(len(durations) * 0.99)] * 1000:.3f} ms per completion")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,9 @@
 
             wrapProgram $out/bin/ultrastar-queue-backend \
               --set ALEMBIC_CONFIG_PATH $srcPath/alembic.ini
+
+            wrapProgram $out/bin/ultrastar-queue-build-catalog \
+              --set ALEMBIC_CONFIG_PATH $srcPath/alembic.ini
         '';
 
         meta.mainProgram = "ultrastar-queue-backend";
@@ -8,13 +8,14 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from sqlmodel import SQLModel
 
 from src.app.auth.models import User
-from src.app.songs.models import UltrastarSong
+from src.app.songs.models import UltrastarSong, UltrastarSongFile, UltrastarSongNotes
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
-config.set_main_option("sqlalchemy.url", "sqlite+aiosqlite:///db.sqlite")
+# callers like `src.app.main.upgrade_database` pass the configured database
+config.set_main_option("sqlalchemy.url", config.attributes.get("database_url", "sqlite+aiosqlite:///db.sqlite"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -28,6 +29,11 @@ if config.config_file_name is not None:
 target_metadata = SQLModel.metadata
 
 
+def include_name(name, type_, parent_names) -> bool:
+    """Keep autogenerate away from the full-text search tables, which are created by hand in a migration."""
+    return not (type_ == "table" and name.startswith("ultrastarsong_fts"))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -50,6 +56,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -59,7 +66,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_name=include_name)
 
     with context.begin_transaction():
         context.run_migrations()
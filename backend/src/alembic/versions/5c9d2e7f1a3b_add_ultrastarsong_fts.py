@@ -0,0 +1,47 @@
+"""Add full-text search table for ultrastarsong
+
+Revision ID: 5c9d2e7f1a3b
+Revises: b3e1f0c2d4a5
+Create Date: 2026-10-18 11:42:37.915204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c9d2e7f1a3b'
+down_revision: Union[str, None] = 'b3e1f0c2d4a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # an external content table, the text is only stored in ultrastarsong and indexed here
+    op.execute("CREATE VIRTUAL TABLE ultrastarsong_fts USING fts5("
+               "title, artist, lyrics, "
+               "content='ultrastarsong', content_rowid='id', "
+               "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    op.execute("CREATE TRIGGER ultrastarsong_fts_insert AFTER INSERT ON ultrastarsong BEGIN "
+               "INSERT INTO ultrastarsong_fts(rowid, title, artist, lyrics) "
+               "VALUES (new.id, new.title, new.artist, new.lyrics); "
+               "END")
+    op.execute("CREATE TRIGGER ultrastarsong_fts_delete AFTER DELETE ON ultrastarsong BEGIN "
+               "INSERT INTO ultrastarsong_fts(ultrastarsong_fts, rowid, title, artist, lyrics) "
+               "VALUES ('delete', old.id, old.title, old.artist, old.lyrics); "
+               "END")
+    op.execute("CREATE TRIGGER ultrastarsong_fts_update AFTER UPDATE ON ultrastarsong BEGIN "
+               "INSERT INTO ultrastarsong_fts(ultrastarsong_fts, rowid, title, artist, lyrics) "
+               "VALUES ('delete', old.id, old.title, old.artist, old.lyrics); "
+               "INSERT INTO ultrastarsong_fts(rowid, title, artist, lyrics) "
+               "VALUES (new.id, new.title, new.artist, new.lyrics); "
+               "END")
+    op.execute("INSERT INTO ultrastarsong_fts(ultrastarsong_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER ultrastarsong_fts_update")
+    op.execute("DROP TRIGGER ultrastarsong_fts_delete")
+    op.execute("DROP TRIGGER ultrastarsong_fts_insert")
+    op.execute("DROP TABLE ultrastarsong_fts")
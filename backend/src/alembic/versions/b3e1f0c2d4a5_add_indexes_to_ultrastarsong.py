@@ -0,0 +1,45 @@
+"""Add indexes and normalized uniqueness to ultrastarsong
+
+Revision ID: b3e1f0c2d4a5
+Revises: 7446c32bb6e5
+Create Date: 2026-10-18 11:30:12.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e1f0c2d4a5'
+down_revision: Union[str, None] = '7446c32bb6e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEPT_SONG_IDS = ("SELECT min(id) FROM ultrastarsong "
+                 "GROUP BY lower(trim(title)), lower(trim(artist))")
+
+
+def upgrade() -> None:
+    # merge songs that only differ in case or surrounding spaces into the one added first
+    op.execute("UPDATE ultrastarsongfile SET song_id = ("
+               "SELECT min(duplicate.id) FROM ultrastarsong AS song "
+               "JOIN ultrastarsong AS duplicate "
+               "ON lower(trim(duplicate.title)) = lower(trim(song.title)) "
+               "AND lower(trim(duplicate.artist)) = lower(trim(song.artist)) "
+               "WHERE song.id = ultrastarsongfile.song_id) "
+               "WHERE song_id IS NOT NULL")
+    op.execute(f"DELETE FROM ultrastarsongnotes WHERE song_id NOT IN ({KEPT_SONG_IDS})")
+    op.execute(f"DELETE FROM ultrastarsong WHERE id NOT IN ({KEPT_SONG_IDS})")
+
+    op.create_index('uq_ultrastarsong_normalized_title_artist', 'ultrastarsong',
+                    [sa.text('lower(trim(title))'), sa.text('lower(trim(artist))')], unique=True)
+    op.create_index('ix_ultrastarsong_title_artist', 'ultrastarsong', ['title', 'artist'], unique=False)
+    op.create_index('ix_ultrastarsong_artist', 'ultrastarsong', ['artist'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ultrastarsong_artist', table_name='ultrastarsong')
+    op.drop_index('ix_ultrastarsong_title_artist', table_name='ultrastarsong')
+    op.drop_index('uq_ultrastarsong_normalized_title_artist', table_name='ultrastarsong')
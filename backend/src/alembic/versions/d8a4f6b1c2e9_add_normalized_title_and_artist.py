@@ -0,0 +1,65 @@
+"""Add normalized title and artist to ultrastarsong
+
+Revision ID: d8a4f6b1c2e9
+Revises: 5c9d2e7f1a3b
+Create Date: 2026-10-18 12:21:53.604187
+
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a4f6b1c2e9'
+down_revision: Union[str, None] = '5c9d2e7f1a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def normalize_search_text(value: str) -> str:
+    # a copy of `src.app.songs.search_index.normalize_search_text`, so this migration does not change with it
+    value = value.casefold()
+    if not value.isascii():
+        decomposed = unicodedata.normalize("NFKD", value)
+        value = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC.sub(" ", value).strip()
+
+
+def upgrade() -> None:
+    op.add_column('ultrastarsong', sa.Column('normalized_title', sqlmodel.sql.sqltypes.AutoString(),
+                                             server_default='', nullable=False))
+    op.add_column('ultrastarsong', sa.Column('normalized_artist', sqlmodel.sql.sqltypes.AutoString(),
+                                             server_default='', nullable=False))
+
+    # SQLite cannot strip diacritics, so the columns are filled here
+    connection = op.get_bind()
+    songs = connection.execute(sa.text("SELECT id, title, artist FROM ultrastarsong")).all()
+    if songs:
+        connection.execute(sa.text("UPDATE ultrastarsong "
+                                   "SET normalized_title = :normalized_title, normalized_artist = :normalized_artist "
+                                   "WHERE id = :id"),
+                           [{"id": song_id,
+                             "normalized_title": normalize_search_text(title),
+                             "normalized_artist": normalize_search_text(artist)}
+                            for song_id, title, artist in songs])
+
+    op.create_index('ix_ultrastarsong_normalized_title_normalized_artist', 'ultrastarsong',
+                    ['normalized_title', 'normalized_artist'], unique=False)
+    op.create_index('ix_ultrastarsong_normalized_artist', 'ultrastarsong', ['normalized_artist'], unique=False)
+    # artists are only searched by their normalized form from now on
+    op.drop_index('ix_ultrastarsong_artist', table_name='ultrastarsong')
+
+
+def downgrade() -> None:
+    op.create_index('ix_ultrastarsong_artist', 'ultrastarsong', ['artist'], unique=False)
+    op.drop_index('ix_ultrastarsong_normalized_artist', table_name='ultrastarsong')
+    op.drop_index('ix_ultrastarsong_normalized_title_normalized_artist', table_name='ultrastarsong')
+    op.drop_column('ultrastarsong', 'normalized_artist')
+    op.drop_column('ultrastarsong', 'normalized_title')
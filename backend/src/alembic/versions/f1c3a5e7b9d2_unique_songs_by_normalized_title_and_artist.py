@@ -0,0 +1,49 @@
+"""Make ultrastarsong unique by normalized title and artist
+
+Revision ID: f1c3a5e7b9d2
+Revises: d8a4f6b1c2e9
+Create Date: 2026-10-18 16:08:41.273519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3a5e7b9d2'
+down_revision: Union[str, None] = 'd8a4f6b1c2e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEPT_SONG_IDS = ("SELECT min(id) FROM ultrastarsong "
+                 "GROUP BY normalized_title, normalized_artist")
+
+
+def upgrade() -> None:
+    # merge songs that only differ in case, diacritics or punctuation into the one added first
+    op.execute("UPDATE ultrastarsongfile SET song_id = ("
+               "SELECT min(duplicate.id) FROM ultrastarsong AS song "
+               "JOIN ultrastarsong AS duplicate "
+               "ON duplicate.normalized_title = song.normalized_title "
+               "AND duplicate.normalized_artist = song.normalized_artist "
+               "WHERE song.id = ultrastarsongfile.song_id) "
+               "WHERE song_id IS NOT NULL")
+    op.execute(f"DELETE FROM ultrastarsongnotes WHERE song_id NOT IN ({KEPT_SONG_IDS})")
+    op.execute(f"DELETE FROM ultrastarsong WHERE id NOT IN ({KEPT_SONG_IDS})")
+
+    # the unique index replaces the one of the normalized columns, which served the same queries
+    op.drop_index('uq_ultrastarsong_normalized_title_artist', table_name='ultrastarsong')
+    op.drop_index('ix_ultrastarsong_normalized_title_normalized_artist', table_name='ultrastarsong')
+    op.create_index('uq_ultrastarsong_normalized_title_artist', 'ultrastarsong',
+                    ['normalized_title', 'normalized_artist'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_ultrastarsong_normalized_title_artist', table_name='ultrastarsong')
+    op.create_index('ix_ultrastarsong_normalized_title_normalized_artist', 'ultrastarsong',
+                    ['normalized_title', 'normalized_artist'], unique=False)
+    # songs unique by their normalized title and artist are also unique ignoring case and surrounding spaces
+    op.create_index('uq_ultrastarsong_normalized_title_artist', 'ultrastarsong',
+                    [sa.text('lower(trim(title))'), sa.text('lower(trim(artist))')], unique=True)
@@ -1,35 +1,37 @@
 from datetime import timedelta
 
 from fastapi import APIRouter, status, Depends
+from starlette.concurrency import run_in_threadpool
 from src.app.queue.exceptions import (QueueIndexHTTPException,
+                                      QueueEntryNotFoundHTTPException,
                                       NotAValidNumberHTTPException,
                                       CantAddSongHTTPException,
-                                      NotAValidNumberError)
-from src.app.queue.schemas import QueueEntry
-from src.app.songs import crud as crud_songs
+                                      NotAValidNumberError,
+                                      QueueEntryNotFoundError)
+from src.app.queue.schemas import QueueEntry, ScheduledQueueEntry
+from src.app.songs.schemas import IngestionProgress, SongCacheStatistics
 
 from ..dependencies import is_admin, AsyncSessionDep
-from ..main import queue_service
+from ..main import ingestion_progress, queue_service, song_cache, sync_queue_service
 
 admin_router = APIRouter(
     prefix="/admin",
     tags=["admin"],
-    dependencies=[Depends(is_admin)],
+    dependencies=[Depends(is_admin), Depends(sync_queue_service)],
     responses={404: {"description": "Not found"}}
 )
 
 
-@admin_router.post("/add-entry-as-admin", status_code=status.HTTP_201_CREATED, response_model=QueueEntry)
+@admin_router.post("/add-entry-as-admin", status_code=status.HTTP_201_CREATED, response_model=ScheduledQueueEntry)
 async def add_entry_to_queue_as_admin(session: AsyncSessionDep, requested_song_id: int, singer: str):
-    song = await crud_songs.get_song_by_id(session, requested_song_id)
+    song = await song_cache.get_song_by_id(session, requested_song_id)
     if not song:
         raise CantAddSongHTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                        detail="Requested song cannot be found in the database.")
 
     entry = QueueEntry(song=song, singer=singer)
-    queue_service.add_entry_at_end(entry)
-
-    return entry
+    # the journal may wait for the lock of another worker, which must not block the event loop
+    return await run_in_threadpool(queue_service.add_entry_at_end, entry)
 
 
 @admin_router.put("/mark-entry-at-index-as-processed")
@@ -41,6 +43,15 @@ def mark_entry_in_queue_at_index_as_processed(index: int):
     return {"message": f"Marked as processed: {marked.song.title} by {marked.song.artist}"}
 
 
+@admin_router.put("/mark-entry-as-processed")
+def mark_entry_in_queue_as_processed(entry_id: int):
+    try:
+        marked = queue_service.mark_entry_as_processed(entry_id)
+    except QueueEntryNotFoundError as err:
+        raise QueueEntryNotFoundHTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=err.args[0])
+    return {"message": f"Marked as processed: {marked.song.title} by {marked.song.artist}"}
+
+
 @admin_router.delete("/remove-entry")
 def remove_entry_from_queue(index: int):
     try:
@@ -50,6 +61,15 @@ def remove_entry_from_queue(index: int):
     return {"message": f"Deleted: {removed.song.title} by {removed.song.artist}"}
 
 
+@admin_router.delete("/remove-entry-by-id")
+def remove_entry_from_queue_by_id(entry_id: int):
+    try:
+        removed = queue_service.remove_entry_by_id(entry_id)
+    except QueueEntryNotFoundError as err:
+        raise QueueEntryNotFoundHTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=err.args[0])
+    return {"message": f"Deleted: {removed.song.title} by {removed.song.artist}"}
+
+
 @admin_router.patch("/move-entry-from-index-to-index")
 def move_entry_from_index_to_index(from_index: int, to_index: int):
     try:
@@ -60,6 +80,15 @@ def move_entry_from_index_to_index(from_index: int, to_index: int):
     return {"message": f"Moved: {moved.song.title} by {moved.song.artist}"}
 
 
+@admin_router.patch("/move-entry-before-entry")
+def move_entry_before_entry(entry_id: int, before_entry_id: int | None = None):
+    try:
+        moved = queue_service.move_entry_before_entry(entry_id, before_entry_id)
+    except QueueEntryNotFoundError as err:
+        raise QueueEntryNotFoundHTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=err.args[0])
+    return {"message": f"Moved: {moved.song.title} by {moved.song.artist}"}
+
+
 @admin_router.delete("/clear-queue")
 def clear_queue():
     queue_service.clear_queue()
@@ -131,3 +160,19 @@ def get_queue_is_open() -> bool:
 def set_queue_is_open(open_queue: bool):
     queue_service.queue_is_open = open_queue
     return {"message": f"Set queue is open to {queue_service.queue_is_open}"}
+
+
+@admin_router.get("/get-ingestion-progress", response_model=IngestionProgress)
+def get_ingestion_progress():
+    return ingestion_progress
+
+
+@admin_router.get("/get-song-cache-statistics", response_model=SongCacheStatistics)
+def get_song_cache_statistics():
+    return song_cache.get_statistics()
+
+
+@admin_router.delete("/clear-song-cache")
+def clear_song_cache():
+    song_cache.clear()
+    return {"message": "Song cache cleared"}
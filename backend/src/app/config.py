@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -23,5 +25,39 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 300
     JWT_ALGORITHM: str = "HS256"
 
+    # 1 parses the song files one after another, 0 uses one worker process per cpu core
+    INGESTION_WORKERS: int = 1
+
+    # glob patterns for the song files and for file and dir names or relative paths to skip in the song dir
+    SONG_FILE_PATTERNS: list[str] = ["*.txt"]
+    SONG_DIR_EXCLUDE_PATTERNS: list[str] = []
+    # levels of subdirs of the song dir that are searched, unlimited if not set
+    SONG_DIR_MAX_DEPTH: int | None = None
+
+    # sync the song dir in the background on startup
+    SYNC_SONG_DIR_ON_STARTUP: bool = True
+    # set by `start` for its workers, only the worker taking the lock on this file syncs the song dir
+    SONG_DIR_SYNC_LOCK_PATH: str | None = None
+
+    # sync new, changed and removed song folders while running, after no change happened in them for a while
+    LIBRARY_WATCHER_ENABLED: bool = False
+    LIBRARY_WATCHER_QUIET_SECONDS: float = 5
+
+    # where the duration of a song comes from: its audio file, its notes and header,
+    # or its notes and header with the audio file as fallback when they do not give one
+    SONG_DURATION_SOURCE: Literal["audio", "notes", "notes_with_audio_fallback"] = "audio"
+
+    # sqlite file caching the parse results of song files across database resets, disabled if not set
+    PARSE_CACHE_PATH: str | None = None
+
+    # songs kept in memory for lookups by id, e.g. when adding them to the queue, 0 disables the cache
+    SONG_CACHE_SIZE: int = 4096
+
+    # sqlite file journaling the changes to the queue to recover it after a restart and share it between workers,
+    # kept in memory only if not set
+    QUEUE_JOURNAL_PATH: str | None = None
+    # changes appended to the journal before they are replaced by a snapshot of the queue
+    QUEUE_SNAPSHOT_EVERY: int = 1000
+
 
 settings = Settings()
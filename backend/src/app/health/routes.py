@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response, status
+
+from ..main import ingestion_progress, startup_progress
+
+health_router = APIRouter(
+    tags=["health"],
+    dependencies=[],
+)
+
+
+@health_router.get("/ready")
+def get_readiness(response: Response):
+    # the catalog in the database is served while the song dir is synced in the background
+    if not startup_progress.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {**startup_progress.model_dump(), "library_sync_running": ingestion_progress.running}
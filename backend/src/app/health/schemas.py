@@ -0,0 +1,19 @@
+from pydantic import BaseModel, computed_field
+
+
+class StartupProgress(BaseModel):
+    """The work a worker does after it started serving requests, it is ready once all of it is done.
+
+    Requests are served from the songs already in the database while the song dir is synced,
+    not ready means songs added to the song dir since the last sync may still be missing.
+    """
+    library_synced: bool = False
+
+    @computed_field
+    @property
+    def ready(self) -> bool:
+        return self.library_synced
+
+    def reset(self) -> None:
+        for name, field in self.model_fields.items():
+            setattr(self, name, field.default)
@@ -1,4 +1,10 @@
+import argparse
+import asyncio
+import contextlib
+import fcntl
 import os
+from typing import TextIO
+
 import uvicorn
 
 from alembic.config import Config
@@ -12,42 +18,132 @@ from fastapi.middleware.cors import CORSMiddleware
 from .auth.crud import add_user, get_user_by_username
 from .auth.models import User
 from .config import settings
+from .database import async_engine
 from .dependencies import get_async_session
+from .health.schemas import StartupProgress
+from .queue.journal import QueueJournal
 from .queue.service import QueueService
-from .songs.crud import add_song_if_not_in_db
-from .songs.models import UltrastarSong
-from .songs.schemas import UltrastarSongBase, UltrastarSongConverter
+from .songs.cache import SongCache
+from .songs.crud import get_song_titles_and_artists
+from .songs.schemas import IngestionProgress
+from .songs.search_index import PrefixIndex, TrigramIndex
+from .songs.service import sync_song_dir
+from .songs.watcher import watch_song_dir
 from ..logging.controller import setup_logging, get_db_logger
-from ..ultrastar_file_parser import UltrastarFileParser
-from ..ultrastar_file_parser.exceptions import UltrastarMatchingError
 
 
 async def populate_database() -> None:
-    path = settings.PATH_TO_ULTRASTAR_SONG_DIR
-    file_paths = UltrastarFileParser.get_song_file_paths(path)
-    for file_path in file_paths:
-        try:
-            attr_dict = UltrastarFileParser.parse_file_for_ultrastar_song_attributes(file_path)
-        except UltrastarMatchingError as e:
-            db_logger.error(e.args[0] + f"Probably not an ultrastar file: {file_path}\n")
-            continue
-        song_converter = UltrastarSongConverter(**attr_dict)
+    await sync_song_dir(settings.PATH_TO_ULTRASTAR_SONG_DIR,
+                        progress=ingestion_progress,
+                        search_indexes=(song_search_index, song_suggest_index),
+                        song_cache=song_cache)
+
+
+async def build_song_search_indexes() -> None:
+    # https://stackoverflow.com/questions/56161595/how-to-use-async-for-in-python
+    async for session in get_async_session():
+        songs = await get_song_titles_and_artists(session)
+        song_search_index.rebuild(songs)
+        song_suggest_index.rebuild(songs)
+    db_logger.info(f"Search indexes built with {len(song_search_index)} songs")
+
+
+# written to the sync lock file by the worker that synced the song dir, see `sync_library_once_for_all_workers`
+SONG_DIR_SYNCED_MARK = "synced"
+SYNC_LOCK_POLL_SECONDS = 1
+
+
+async def sync_library() -> bool:
+    """Sync the song dir with the database, return whether it succeeded."""
+    ingestion_progress.start()
+    try:
+        await populate_database()
+    except Exception as e:
+        db_logger.error(f"Could not sync song dir: {e}")
+        ingestion_progress.finish(error=str(e))
+        return False
+    ingestion_progress.finish()
+    db_logger.info(f"Song dir synced, {ingestion_progress.inserted} songs added")
+    return True
+
+
+async def sync_and_watch_library(stop_event: asyncio.Event) -> None:
+    """Sync the song dir with the database in the background, then watch it for changes if enabled."""
+    synced = await sync_library()
+    # a failed sync is not retried, the worker serves the songs in the database
+    startup_progress.library_synced = True
+    if not synced:
+        return
+
+    if settings.LIBRARY_WATCHER_ENABLED:
+        await watch_song_dir(settings.PATH_TO_ULTRASTAR_SONG_DIR,
+                             settings.LIBRARY_WATCHER_QUIET_SECONDS,
+                             stop_event=stop_event,
+                             search_indexes=(song_search_index, song_suggest_index),
+                             song_cache=song_cache)
+
+
+async def lock_file_when_free(path: str, stop_event: asyncio.Event) -> TextIO | None:
+    """Open a file, creating it and its dir if missing, and wait for an exclusive lock on it.
+
+    Returns None if the stop event is set while waiting. Raises an OSError if the file cannot be opened or locked.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    lock_file = open(path, "a+")
+    try:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except BlockingIOError:
+                if stop_event.is_set():
+                    break
+                await asyncio.sleep(SYNC_LOCK_POLL_SECONDS)
+    except BaseException:
+        lock_file.close()
+        raise
+    lock_file.close()
+    return None
+
+
+async def sync_library_once_for_all_workers(lock_path: str, stop_event: asyncio.Event) -> None:
+    """Sync the song dir in the background in the first worker taking the lock on a file.
+
+    The other workers wait for the lock, then rebuild their search indexes and clear their song cache,
+    as only the syncing worker kept its own up to date. If the sync fails, the next worker taking the lock syncs.
+    If the lock cannot be taken, e.g. as the file system does not support it, every worker syncs on its own.
+    """
+    try:
+        lock_file = await lock_file_when_free(lock_path, stop_event)
+    except OSError as e:
+        db_logger.error(f"Could not lock {lock_path}, syncing song dir without it: {e}")
+        await sync_library()
+        startup_progress.library_synced = True
+        return
+    if lock_file is None:
+        return
+
+    with lock_file:
         try:
-            song_converter.set_audio_duration(os.path.dirname(file_path))
-        except RuntimeError as e:
-            db_logger.error(e.args[0])
-        except FileNotFoundError as e:
-            db_logger.error(e.args[0])
-        song_base: UltrastarSongBase = UltrastarSongBase(**song_converter.model_dump())
-
-        song = None
-        # https://stackoverflow.com/questions/56161595/how-to-use-async-for-in-python
-        async for session in get_async_session():
-            song = await add_song_if_not_in_db(session, UltrastarSong(**song_base.dict()))
-        if song:
-            db_logger.info(f"{song.title} by {song.artist} added to db")
-        else:
-            db_logger.info(f"{song_base.title} by {song_base.artist} already in db")
+            lock_file.seek(0)
+            if lock_file.read() == SONG_DIR_SYNCED_MARK:
+                await build_song_search_indexes()
+                song_cache.clear()
+            elif await sync_library():
+                try:
+                    lock_file.write(SONG_DIR_SYNCED_MARK)
+                    lock_file.flush()
+                except OSError as e:
+                    # the next worker taking the lock syncs again
+                    db_logger.error(f"Could not mark song dir as synced in {lock_path}: {e}")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    startup_progress.library_synced = True
+
+
+def sync_queue_service() -> None:
+    """Catch up with the changes to the queue made by other workers, used as dependency of the routes using it."""
+    queue_service.sync()
 
 
 async def add_users_to_db() -> None:
@@ -63,15 +159,40 @@ async def add_users_to_db() -> None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        await populate_database()
-        await add_users_to_db()
-    except FileNotFoundError as e:
-        if e.args[0] == "Could not find path: ":
-            raise FileNotFoundError("Please make sure, that a path to ultrastar files is configured in .env")
-        else:
-            raise e
+    if not settings.PATH_TO_ULTRASTAR_SONG_DIR:
+        raise FileNotFoundError("Please make sure, that a path to ultrastar files is configured in .env")
+    if not os.path.isdir(settings.PATH_TO_ULTRASTAR_SONG_DIR):
+        raise FileNotFoundError(f"Could not find path: {settings.PATH_TO_ULTRASTAR_SONG_DIR}")
+    await add_users_to_db()
+    if settings.QUEUE_JOURNAL_PATH:
+        # the journal is read and written with blocking sqlite calls, which must not hold up the event loop
+        journal = await asyncio.to_thread(QueueJournal, settings.QUEUE_JOURNAL_PATH, settings.QUEUE_SNAPSHOT_EVERY)
+        replayed = await asyncio.to_thread(queue_service.open_journal, journal)
+        db_logger.info(f"Queue recovered with {len(queue_service.queue)} entries, {replayed} changes replayed")
+    await build_song_search_indexes()
+
+    if not settings.SYNC_SONG_DIR_ON_STARTUP:
+        startup_progress.library_synced = True
+        yield
+        startup_progress.reset()
+        await asyncio.to_thread(queue_service.close_journal)
+        return
+
+    # requests are served from the songs already in the database while the song dir is synced
+    library_stop_event = asyncio.Event()
+    if settings.SONG_DIR_SYNC_LOCK_PATH:
+        library_task = asyncio.create_task(sync_library_once_for_all_workers(settings.SONG_DIR_SYNC_LOCK_PATH,
+                                                                             library_stop_event))
+    else:
+        library_task = asyncio.create_task(sync_and_watch_library(library_stop_event))
     yield
+    startup_progress.reset()
+    library_stop_event.set()
+    if ingestion_progress.running:
+        library_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await library_task
+    await asyncio.to_thread(queue_service.close_journal)
 
 
 def create_app() -> FastAPI:
@@ -81,11 +202,13 @@ def create_app() -> FastAPI:
     from src.app.queue.routes import queue_router
     from src.app.songs.routes import song_router
     from src.app.admin.routes import admin_router
+    from src.app.health.routes import health_router
 
     app.include_router(queue_router)
     app.include_router(song_router)
     app.include_router(auth_router)
     app.include_router(admin_router)
+    app.include_router(health_router)
 
     # https://fastapi.tiangolo.com/tutorial/cors/#use-corsmiddleware
     origins = [
@@ -104,15 +227,100 @@ def create_app() -> FastAPI:
 
     return app
 
-def start():
+def upgrade_database() -> None:
     alembic_config_file = os.getenv("ALEMBIC_CONFIG_PATH")
 
     alembic_cfg = Config(alembic_config_file)
+    alembic_cfg.attributes["database_url"] = settings.DATABASE_URL
     command.upgrade(alembic_cfg, "head")
 
-    uvicorn.run("src.app.main:app", host="0.0.0.0", port=8000)
+
+def start():
+    """Run the server, with several worker processes sharing the queue through its journal if asked to.
+
+    With more than one worker the admin user is added once before the workers are started. The song dir
+    is synced in the background by one of them, see `sync_library_once_for_all_workers`, so all workers
+    serve requests right away. The library watcher does not run then, as the songs and search indexes
+    in memory would only be updated in one worker.
+    """
+    parser = argparse.ArgumentParser(description=start.__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes serving requests, one of them syncs the song dir")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and not settings.QUEUE_JOURNAL_PATH:
+        parser.error("Running more than one worker needs QUEUE_JOURNAL_PATH to share the queue between them")
+
+    upgrade_database()
+
+    if args.workers > 1:
+        if not os.path.isdir(settings.PATH_TO_ULTRASTAR_SONG_DIR):
+            parser.error(f"Could not find path: {settings.PATH_TO_ULTRASTAR_SONG_DIR}")
+        if settings.LIBRARY_WATCHER_ENABLED:
+            db_logger.warning("The library watcher does not run with more than one worker")
+
+        async def prepare() -> None:
+            await add_users_to_db()
+            await async_engine.dispose()
+
+        asyncio.run(prepare())
+        # emptied, so the song dir is synced again by the first worker of this run taking the lock
+        lock_path = f"{settings.QUEUE_JOURNAL_PATH}.sync-lock"
+        with open(lock_path, "w"):
+            pass
+        # read by the settings of the worker processes
+        os.environ["SONG_DIR_SYNC_LOCK_PATH"] = lock_path
+
+    uvicorn.run("src.app.main:app", host="0.0.0.0", port=8000, workers=args.workers)
+
+
+async def compact_database(output_path: str | None = None) -> None:
+    """Optimize the full-text index, analyze and vacuum the database, into a new file if a path is given."""
+    async with async_engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.exec_driver_sql("INSERT INTO ultrastarsong_fts(ultrastarsong_fts) VALUES ('optimize')")
+        await connection.exec_driver_sql("ANALYZE")
+        if output_path is None:
+            await connection.exec_driver_sql("VACUUM")
+        else:
+            await connection.exec_driver_sql("VACUUM INTO ?", (output_path,))
+    await async_engine.dispose()
+
+
+def build_catalog():
+    """Build a database with all songs of the song dir offline, e.g. to bake it into an image or copy it to kiosks.
+
+    Runs the migrations and a full sync of the configured song dir against the configured database,
+    then analyzes and vacuums it. A server started against the result with the song dir at the same path
+    finds every song file unchanged and does no ingestion work. Users are added by the server, not here.
+    """
+    parser = argparse.ArgumentParser(description=build_catalog.__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write the vacuumed database to this new file instead of in place")
+    args = parser.parse_args()
+    if args.output is not None and os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    if not os.path.isdir(settings.PATH_TO_ULTRASTAR_SONG_DIR):
+        parser.error(f"Could not find path: {settings.PATH_TO_ULTRASTAR_SONG_DIR}")
+
+    upgrade_database()
+
+    async def build() -> None:
+        ingestion_progress.start()
+        await populate_database()
+        ingestion_progress.finish()
+        db_logger.info(f"Catalog built, {ingestion_progress.discovered} song files, "
+                       f"{ingestion_progress.failed} failed, {ingestion_progress.inserted} songs added")
+        await compact_database(args.output)
+
+    asyncio.run(build())
 
 setup_logging()
 db_logger = get_db_logger()
 queue_service = QueueService()
+ingestion_progress = IngestionProgress()
+startup_progress = StartupProgress()
+song_search_index = TrigramIndex()
+song_suggest_index = PrefixIndex()
+song_cache = SongCache(settings.SONG_CACHE_SIZE)
 app = create_app()
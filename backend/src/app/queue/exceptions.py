@@ -5,10 +5,30 @@ class NotAValidNumberError(Exception):
     pass
 
 
+class QueueEntryNotFoundError(Exception):
+    pass
+
+
+class QueueJournalConflictError(Exception):
+    pass
+
+
+class QueueClosedError(Exception):
+    pass
+
+
+class CantAddEntryError(Exception):
+    pass
+
+
 class QueueIndexHTTPException(HTTPException):
     pass
 
 
+class QueueEntryNotFoundHTTPException(HTTPException):
+    pass
+
+
 class CantAddSongHTTPException(HTTPException):
     pass
 
@@ -0,0 +1,165 @@
+"""A write-ahead journal of the changes to the queue, to recover the queue after a crash or restart
+and to share it between worker processes.
+
+Examples
+--------
+>>> journal = QueueJournal("queue_journal.sqlite")
+>>> with journal.transaction():
+>>>     snapshot, changes = journal.load_after(sequence)
+>>>     journal.append(sequence + 1, "process", {"entry_id": 3, "processed_at": datetime.now()})
+"""
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+
+from .exceptions import QueueJournalConflictError
+from .schemas import QueueEntry, ProcessedQueueEntry
+from ..songs.models import UltrastarSong
+
+
+class QueueJournalChange(NamedTuple):
+    sequence: int
+    operation: str
+    values: Dict[str, Any]
+
+
+class QueueJournalSnapshot(NamedTuple):
+    last_sequence: int
+    state: Dict[str, Any]
+
+
+def encode_value(value: Any) -> Any:
+    """Return a JSON compatible value for the entries, times and durations in the values of a change."""
+    if isinstance(value, QueueEntry):
+        # the song is kept as it is when the entry is added
+        return value.model_dump(mode="json")
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Cannot journal a value of type {type(value).__name__}")
+
+
+def entry_from_values(values: Dict[str, Any]) -> QueueEntry | ProcessedQueueEntry:
+    song_values = values["song"]
+    audio_duration = song_values["audio_duration"]
+    if audio_duration is not None:
+        song_values = {**song_values, "audio_duration": timedelta(seconds=audio_duration)}
+    song = UltrastarSong(**song_values)
+    if "processed_at" in values:
+        return ProcessedQueueEntry(song=song,
+                                   singer=values["singer"],
+                                   processed_at=datetime.fromisoformat(values["processed_at"]))
+    return QueueEntry(song=song, singer=values["singer"])
+
+
+class QueueJournal:
+    """
+    A SQLite file holding the changes to the queue numbered in order and a snapshot of the queue before them.
+
+    Changes are committed when they are appended or at the end of the transaction they are appended in.
+    With the journal in WAL mode and synchronous=NORMAL a commit only writes to the WAL file, so it survives
+    a crash of the server, but not necessarily a power loss. A snapshot replaces the changes it covers,
+    so the journal stays small.
+
+    Several processes can share a journal. A write transaction locks the journal for all of them, and a change
+    is only appended under the number following the last change, so a process that did not read all changes
+    before cannot append one.
+
+    Methods
+    ----------
+    def transaction(self, write: bool = True) -> ContextManager[None]
+        Read or write the journal in one transaction, nested transactions are part of the outer one.
+
+    def load_after(self, sequence: int) -> Tuple[QueueJournalSnapshot | None, List[QueueJournalChange]]
+        Return the snapshot if it covers changes after a change, and the changes after it and the snapshot in order.
+
+    def append(self, sequence: int, operation: str, values: Dict[str, Any]) -> None
+        Append a change, its values are encoded by `encode_value` if they are not JSON compatible.
+
+    def write_snapshot(self, last_sequence: int, state: Dict[str, Any]) -> None
+        Replace the snapshot and the changes it covers by a snapshot of the state after a change.
+    """
+
+    def __init__(self, db_path: str, snapshot_every: int = 1000):
+        self.snapshot_every = snapshot_every
+        # used by the threads serving requests, one transaction at a time
+        self._lock = threading.RLock()
+        self._in_transaction = False
+        # transactions are begun explicitly
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS queue_snapshot ("
+                                 "id INTEGER PRIMARY KEY CHECK (id = 1), "
+                                 "last_sequence INTEGER NOT NULL, "
+                                 "state TEXT NOT NULL)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS queue_change ("
+                                 "sequence INTEGER PRIMARY KEY, "
+                                 "operation TEXT NOT NULL, "
+                                 "vals TEXT NOT NULL)")
+        self._snapshot_sequence = 0
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT count(*) FROM queue_change").fetchone()[0]
+
+    @contextmanager
+    def transaction(self, write: bool = True) -> Iterator[None]:
+        with self._lock:
+            if self._in_transaction:
+                yield
+                return
+            # a write transaction takes the lock of the journal at once, waiting for other processes to release it
+            self._connection.execute("BEGIN IMMEDIATE" if write else "BEGIN DEFERRED")
+            self._in_transaction = True
+            try:
+                yield
+                self._connection.execute("COMMIT")
+            except BaseException:
+                # a commit that failed, e.g. as the disk is full, may leave the transaction open
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+                raise
+            finally:
+                self._in_transaction = False
+
+    def needs_snapshot(self, sequence: int) -> bool:
+        return sequence - self._snapshot_sequence >= self.snapshot_every
+
+    def load_after(self, sequence: int) -> Tuple[QueueJournalSnapshot | None, List[QueueJournalChange]]:
+        with self.transaction(write=False):
+            snapshot = None
+            row = self._connection.execute("SELECT last_sequence, CASE WHEN last_sequence > ? THEN state END "
+                                           "FROM queue_snapshot", (sequence,)).fetchone()
+            if row is not None:
+                self._snapshot_sequence = row[0]
+                if row[1] is not None:
+                    snapshot = QueueJournalSnapshot(row[0], json.loads(row[1]))
+                    sequence = snapshot.last_sequence
+            changes = [QueueJournalChange(change_sequence, operation, json.loads(values))
+                       for change_sequence, operation, values
+                       in self._connection.execute("SELECT sequence, operation, vals FROM queue_change "
+                                                   "WHERE sequence > ? ORDER BY sequence", (sequence,))]
+        return snapshot, changes
+
+    def append(self, sequence: int, operation: str, values: Dict[str, Any]) -> None:
+        with self.transaction():
+            try:
+                self._connection.execute("INSERT INTO queue_change (sequence, operation, vals) VALUES (?, ?, ?)",
+                                         (sequence, operation, json.dumps(values, default=encode_value)))
+            except sqlite3.IntegrityError:
+                raise QueueJournalConflictError(f"Change {sequence} of the queue has already been appended")
+
+    def write_snapshot(self, last_sequence: int, state: Dict[str, Any]) -> None:
+        with self.transaction():
+            self._connection.execute("INSERT OR REPLACE INTO queue_snapshot (id, last_sequence, state) "
+                                     "VALUES (1, ?, ?)", (last_sequence, json.dumps(state, default=encode_value)))
+            self._connection.execute("DELETE FROM queue_change WHERE sequence <= ?", (last_sequence,))
+            self._snapshot_sequence = last_sequence
+
+    def close(self) -> None:
+        self._connection.close()
@@ -1,24 +1,25 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Cookie, Response, status
+from fastapi import APIRouter, Cookie, Depends, Response, status
+from starlette.concurrency import run_in_threadpool
 
-from .exceptions import CantAddSongHTTPException
-from .schemas import QueueEntry
+from .exceptions import (CantAddEntryError, CantAddSongHTTPException, QueueClosedError, QueueEntryNotFoundError,
+                         QueueEntryNotFoundHTTPException)
+from .schemas import QueueEntry, ScheduledQueueEntry
 from ..dependencies import AsyncSessionDep
-from ..main import queue_service
-from ..songs import crud
+from ..main import queue_service, song_cache, sync_queue_service
 
 queue_router = APIRouter(
     prefix="/queue",
     tags=["queue"],
-    dependencies=[],
+    dependencies=[Depends(sync_queue_service)],
     responses={404: {"description": "Not found"}}
 )
 
 
-@queue_router.get("/")
+@queue_router.get("/", response_model=list[ScheduledQueueEntry])
 def get_queue():
-    return queue_service.queue
+    return queue_service.scheduled_queue()
 
 
 @queue_router.get("/processed-entries")
@@ -31,7 +32,15 @@ def get_time_until_end_of_queue():
     return queue_service.time_until_end_of_queue()
 
 
-@queue_router.post("/add-entry", status_code=status.HTTP_201_CREATED, response_model=QueueEntry)
+@queue_router.get("/get-time-until-entry")
+def get_time_until_entry(entry_id: int):
+    try:
+        return queue_service.time_until_entry(entry_id)
+    except QueueEntryNotFoundError as err:
+        raise QueueEntryNotFoundHTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=err.args[0])
+
+
+@queue_router.post("/add-entry", status_code=status.HTTP_201_CREATED, response_model=ScheduledQueueEntry)
 async def add_entry_to_queue(
         session: AsyncSessionDep,
         response: Response,
@@ -50,28 +59,20 @@ async def add_entry_to_queue(
                                                   f"submitting a new song"
                                            )
 
-    song = await crud.get_song_by_id(session, requested_song_id)
+    song = await song_cache.get_song_by_id(session, requested_song_id)
     if not song:
         raise CantAddSongHTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                        detail="Requested song cannot be found in the database.")
 
-    if queue_service.is_song_in_queue(song):
-        raise CantAddSongHTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                       detail=f"Song {song.title} by {song.artist} is already in queue")
-
-    if queue_service.has_song_been_sung_max_times(song):
-        raise CantAddSongHTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                       detail=f"Song {song.title} by {song.artist} has already been sung a few times "
-                                              f"today. Please choose another one.")
-
-    if not queue_service.will_time_between_songs_have_passed_until_end_of_queue(song):
-        raise CantAddSongHTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                       detail=f"Song {song.title} by {song.artist} has been sung recently. "
-                                              f"Please choose another one.")
-
     queue_entry = QueueEntry(song=song, singer=singer)
 
-    queue_service.add_entry_at_end(queue_entry)
+    # the journal may wait for the lock of another worker, which must not block the event loop
+    try:
+        scheduled_entry = await run_in_threadpool(queue_service.try_add_entry, queue_entry)
+    except QueueClosedError as err:
+        raise CantAddSongHTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=err.args[0])
+    except CantAddEntryError as err:
+        raise CantAddSongHTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err.args[0])
 
     response.set_cookie("last_added", str(datetime.now()), httponly=True, max_age=60 * 24)
-    return queue_entry
+    return scheduled_entry
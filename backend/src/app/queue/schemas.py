@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from ..songs.models import UltrastarSong
 
@@ -12,3 +12,10 @@ class QueueEntry(BaseModel):
 
 class ProcessedQueueEntry(QueueEntry):
     processed_at: datetime
+
+
+class ScheduledQueueEntry(QueueEntry):
+    model_config = ConfigDict(ser_json_timedelta='float')
+
+    id: int
+    time_until_start: timedelta
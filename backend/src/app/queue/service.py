@@ -1,11 +1,43 @@
+import functools
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, TypeVar
 
 from .config import QueueBaseSettings
-from .exceptions import NotAValidNumberError
-from .schemas import QueueEntry, ProcessedQueueEntry
+from .exceptions import CantAddEntryError, NotAValidNumberError, QueueClosedError, QueueEntryNotFoundError
+from .journal import QueueJournal, entry_from_values
+from .schemas import QueueEntry, ProcessedQueueEntry, ScheduledQueueEntry
+from .timeline import QueueTimeline
 from ..songs.models import UltrastarSong
 
 
+class _QueueNode:
+    """An entry of the queue, linked to the entries before and after it."""
+
+    __slots__ = ("entry_id", "entry", "previous", "next")
+
+    def __init__(self, entry_id: int | None, entry: QueueEntry | None):
+        self.entry_id = entry_id
+        self.entry = entry
+        self.previous: _QueueNode = self
+        self.next: _QueueNode = self
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _in_journal_transaction(method: F) -> F:
+    """Make a change to the queue holding its lock and in a write transaction of the journal, after catching up."""
+
+    @functools.wraps(method)
+    def wrapper(self: "QueueService", *args, **kwargs):
+        with self._journal_transaction():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class QueueService:
 
     def __init__(self):
@@ -13,25 +45,57 @@ class QueueService:
         self._max_times_song_can_be_sung: int = QueueBaseSettings.MAX_TIMES_SONG_CAN_BE_SUNG
         self._queue_is_open: bool = QueueBaseSettings.QUEUE_IS_OPEN
         self._time_between_song_submissions: timedelta = QueueBaseSettings.TIME_BETWEEN_SONG_SUBMISSIONS
-        self._queue: list[QueueEntry] = []
+        # the queue is a circular doubly linked list of nodes starting after the sentinel node,
+        # so entries are found by id, removed and moved in constant time
+        self._queue_sentinel = _QueueNode(None, None)
+        self._queue_node_by_id: Dict[int, _QueueNode] = {}
         self._processed_entries: list[ProcessedQueueEntry] = []
+        # kept up to date with the queue and processed entries, so the checks when adding an entry do not scan them
+        self._queued_count_by_song_id: Dict[int, int] = {}
+        self._processed_count_by_song_id: Dict[int, int] = {}
+        self._last_sung_at_by_song_id: Dict[int, datetime] = {}
+        # the durations of the queued entries by entry id
+        self._timeline = QueueTimeline()
+        # ids are never reused, so a stale id cannot address another entry
+        self._last_entry_id = 0
+        # every change is appended to the journal before it is made, if one is opened
+        self._journal: QueueJournal | None = None
+        # the sequence of the last change of the journal made to the queue
+        self._journal_sequence = 0
+        # held while the queue is changed or read in several steps, routes run in the threads of a pool
+        self._lock = threading.RLock()
+
+    def _iterate_queue_nodes(self) -> Iterator[_QueueNode]:
+        node = self._queue_sentinel.next
+        while node is not self._queue_sentinel:
+            yield node
+            node = node.next
 
     @property
     def queue(self) -> list[QueueEntry]:
-        return self._queue.copy()
+        with self._lock:
+            return [node.entry for node in self._iterate_queue_nodes()]
+
+    @property
+    def entry_ids(self) -> list[int]:
+        with self._lock:
+            return [node.entry_id for node in self._iterate_queue_nodes()]
 
     @property
     def processed_entries(self) -> list[ProcessedQueueEntry]:
-        return self._processed_entries.copy()
+        with self._lock:
+            return self._processed_entries.copy()
 
     @property
     def time_between_same_song(self) -> timedelta:
         return self._time_between_same_song
 
     @time_between_same_song.setter
+    @_in_journal_transaction
     def time_between_same_song(self, interval: timedelta) -> None:
         if interval.total_seconds() < 0:
             raise NotAValidNumberError("Time between songs cannot be negative")
+        self._journal_change("settings", self._get_settings_values() | {"time_between_same_song": interval})
         self._time_between_same_song = interval
 
     @property
@@ -39,11 +103,13 @@ class QueueService:
         return self._max_times_song_can_be_sung
 
     @max_times_song_can_be_sung.setter
+    @_in_journal_transaction
     def max_times_song_can_be_sung(self, value: int) -> None:
         if value == 0:
             raise NotAValidNumberError("Number cannot be zero")
         elif value < 0:
             raise NotAValidNumberError("Number cannot be negative")
+        self._journal_change("settings", self._get_settings_values() | {"max_times_song_can_be_sung": value})
         self._max_times_song_can_be_sung = value
 
     @property
@@ -51,9 +117,11 @@ class QueueService:
         return self._time_between_song_submissions
 
     @time_between_song_submissions.setter
+    @_in_journal_transaction
     def time_between_song_submissions(self, interval: timedelta) -> None:
         if interval.total_seconds() < 0:
             raise NotAValidNumberError("Time between song submissions cannot be negative")
+        self._journal_change("settings", self._get_settings_values() | {"time_between_song_submissions": interval})
         self._time_between_song_submissions = interval
 
     @property
@@ -61,66 +129,375 @@ class QueueService:
         return self._queue_is_open
 
     @queue_is_open.setter
+    @_in_journal_transaction
     def queue_is_open(self, value: bool) -> None:
+        self._journal_change("settings", self._get_settings_values() | {"queue_is_open": value})
         self._queue_is_open = value
 
-    def add_entry_at_end(self, entry: QueueEntry) -> QueueEntry:
-        self._queue.append(entry)
-        return entry
+    def _count_queued_entry(self, entry: QueueEntry) -> None:
+        song_id = entry.song.id
+        self._queued_count_by_song_id[song_id] = self._queued_count_by_song_id.get(song_id, 0) + 1
 
-    def mark_entry_at_index_as_processed(self, index: int) -> QueueEntry:
-        removed: QueueEntry = self._queue.pop(index)
-        self._processed_entries.append(ProcessedQueueEntry(song=removed.song,
-                                                           singer=removed.singer,
-                                                           processed_at=datetime.now().replace(microsecond=0) +
-                                                                        timedelta(hours=1)))
+    def _uncount_queued_entry(self, entry: QueueEntry) -> None:
+        song_id = entry.song.id
+        self._queued_count_by_song_id[song_id] -= 1
+        if not self._queued_count_by_song_id[song_id]:
+            del self._queued_count_by_song_id[song_id]
+
+    def _count_processed_entry(self, entry: ProcessedQueueEntry) -> None:
+        song_id = entry.song.id
+        self._processed_count_by_song_id[song_id] = self._processed_count_by_song_id.get(song_id, 0) + 1
+        last_sung_at = self._last_sung_at_by_song_id.get(song_id)
+        if last_sung_at is None or entry.processed_at > last_sung_at:
+            self._last_sung_at_by_song_id[song_id] = entry.processed_at
+
+    @staticmethod
+    def _get_duration(entry: QueueEntry) -> timedelta:
+        return entry.song.audio_duration if entry.song.audio_duration is not None else timedelta(seconds=0)
+
+    def _get_node_by_id(self, entry_id: int) -> _QueueNode:
+        try:
+            return self._queue_node_by_id[entry_id]
+        except KeyError:
+            raise QueueEntryNotFoundError(f"There is no entry with id {entry_id} in the queue")
+
+    def _get_node_at_index(self, index: int) -> _QueueNode:
+        """Walk to the entry at an index from the nearer end of the queue, negative indexes count from the end."""
+        length = len(self._queue_node_by_id)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("queue index out of range")
+        if index < length // 2:
+            node = self._queue_sentinel.next
+            for _ in range(index):
+                node = node.next
+        else:
+            node = self._queue_sentinel.previous
+            for _ in range(length - 1 - index):
+                node = node.previous
+        return node
+
+    @staticmethod
+    def _unlink_node(node: _QueueNode) -> None:
+        node.previous.next = node.next
+        node.next.previous = node.previous
+
+    def _link_node_before(self, node: _QueueNode, before: _QueueNode, duration: timedelta) -> None:
+        """Link a node in before another node, the sentinel node for the end of the queue."""
+        after = before.previous
+        node.previous = after
+        node.next = before
+        after.next = node
+        before.previous = node
+        self._timeline.insert(node.entry_id, duration,
+                              after=after.entry_id,
+                              before=before.entry_id)
+
+    def _pop_node(self, node: _QueueNode) -> QueueEntry:
+        self._unlink_node(node)
+        del self._queue_node_by_id[node.entry_id]
+        self._timeline.remove(node.entry_id)
+        self._uncount_queued_entry(node.entry)
+        return node.entry
+
+    def _move_node_before(self, node: _QueueNode, before: _QueueNode) -> None:
+        if node is before:
+            return
+        self._unlink_node(node)
+        self._link_node_before(node, before, self._timeline.remove(node.entry_id))
+
+    def _add_entry(self, entry_id: int, entry: QueueEntry) -> None:
+        node = _QueueNode(entry_id, entry)
+        self._queue_node_by_id[entry_id] = node
+        self._link_node_before(node, self._queue_sentinel, self._get_duration(entry))
+        self._count_queued_entry(entry)
+        self._last_entry_id = max(self._last_entry_id, entry_id)
+
+    def _add_processed_entry(self, processed_entry: ProcessedQueueEntry) -> None:
+        self._processed_entries.append(processed_entry)
+        self._count_processed_entry(processed_entry)
+
+    def _process_node(self, node: _QueueNode, processed_at: datetime) -> QueueEntry:
+        removed = self._pop_node(node)
+        self._add_processed_entry(ProcessedQueueEntry(song=removed.song,
+                                                      singer=removed.singer,
+                                                      processed_at=processed_at))
         return removed
 
+    @_in_journal_transaction
+    def add_entry_at_end(self, entry: QueueEntry) -> ScheduledQueueEntry:
+        """Add an entry at the end and return it with its id and the time until it starts."""
+        entry_id = self._last_entry_id + 1
+        self._journal_change("add", {"entry_id": entry_id, "entry": entry})
+        self._add_entry(entry_id, entry)
+        return ScheduledQueueEntry(id=entry_id,
+                                   song=entry.song,
+                                   singer=entry.singer,
+                                   time_until_start=self._timeline.time_before(entry_id))
+
+    @_in_journal_transaction
+    def try_add_entry(self, entry: QueueEntry) -> ScheduledQueueEntry:
+        """Add an entry at the end, if the queue is open and the song may be sung again.
+
+        The checks and the change are made in the same write transaction of the journal,
+        so two workers cannot both add the same song.
+        """
+        song = entry.song
+        if not self._queue_is_open:
+            raise QueueClosedError("Queue is closed. Can't add any more songs.")
+        if self.is_song_in_queue(song):
+            raise CantAddEntryError(f"Song {song.title} by {song.artist} is already in queue")
+        if self.has_song_been_sung_max_times(song):
+            raise CantAddEntryError(f"Song {song.title} by {song.artist} has already been sung a few times today. "
+                                    f"Please choose another one.")
+        if not self.will_time_between_songs_have_passed_until_end_of_queue(song):
+            raise CantAddEntryError(f"Song {song.title} by {song.artist} has been sung recently. "
+                                    f"Please choose another one.")
+        return self.add_entry_at_end(entry)
+
+    def _mark_node_as_processed(self, node: _QueueNode) -> QueueEntry:
+        processed_at = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+        self._journal_change("process", {"entry_id": node.entry_id, "processed_at": processed_at})
+        return self._process_node(node, processed_at)
+
+    @_in_journal_transaction
+    def mark_entry_at_index_as_processed(self, index: int) -> QueueEntry:
+        return self._mark_node_as_processed(self._get_node_at_index(index))
+
+    @_in_journal_transaction
+    def mark_entry_as_processed(self, entry_id: int) -> QueueEntry:
+        return self._mark_node_as_processed(self._get_node_by_id(entry_id))
+
+    def _remove_node(self, node: _QueueNode) -> QueueEntry:
+        self._journal_change("remove", {"entry_id": node.entry_id})
+        return self._pop_node(node)
+
+    @_in_journal_transaction
     def remove_entry_by_index(self, index: int) -> QueueEntry:
-        removed = self._queue.pop(index)
-        return removed
+        return self._remove_node(self._get_node_at_index(index))
 
+    @_in_journal_transaction
+    def remove_entry_by_id(self, entry_id: int) -> QueueEntry:
+        return self._remove_node(self._get_node_by_id(entry_id))
+
+    def _journal_move_node_before(self, node: _QueueNode, before: _QueueNode) -> None:
+        self._journal_change("move", {"entry_id": node.entry_id, "before_entry_id": before.entry_id})
+        self._move_node_before(node, before)
+
+    @_in_journal_transaction
     def move_entry_from_index_to_index(self, from_index: int, to_index: int) -> QueueEntry:
+        node = self._get_node_at_index(from_index)
         if from_index < to_index:
             to_index = to_index - 1
-        moved = self._queue.pop(from_index)
-        self._queue.insert(to_index, moved)
-        return moved
+        # clamp the index among the other entries the way list.insert does
+        length = len(self._queue_node_by_id) - 1
+        to_index = min(max(to_index + length, 0) if to_index < 0 else to_index, length)
+        if to_index == length:
+            before = self._queue_sentinel
+        else:
+            from_index = from_index + length + 1 if from_index < 0 else from_index
+            before = self._get_node_at_index(to_index if to_index < from_index else to_index + 1)
+        self._journal_move_node_before(node, before)
+        return node.entry
+
+    @_in_journal_transaction
+    def move_entry_before_entry(self, entry_id: int, before_entry_id: int | None) -> QueueEntry:
+        """Move an entry before another entry, or to the end of the queue if `before_entry_id` is None."""
+        node = self._get_node_by_id(entry_id)
+        before = self._get_node_by_id(before_entry_id) if before_entry_id is not None else self._queue_sentinel
+        self._journal_move_node_before(node, before)
+        return node.entry
+
+    def _clear_queue(self) -> None:
+        self._queue_sentinel.previous = self._queue_sentinel.next = self._queue_sentinel
+        self._queue_node_by_id.clear()
+        self._timeline.clear()
+        self._queued_count_by_song_id.clear()
 
+    @_in_journal_transaction
     def clear_queue(self) -> None:
-        self._queue.clear()
+        self._journal_change("clear_queue", {})
+        self._clear_queue()
 
-    def clear_processed_entries(self) -> None:
+    def _clear_processed_entries(self) -> None:
         self._processed_entries.clear()
+        self._processed_count_by_song_id.clear()
+        self._last_sung_at_by_song_id.clear()
+
+    @_in_journal_transaction
+    def clear_processed_entries(self) -> None:
+        self._journal_change("clear_processed_entries", {})
+        self._clear_processed_entries()
 
+    @_in_journal_transaction
     def clear_queue_service(self) -> None:
         self.clear_queue()
         self.clear_processed_entries()
         self.queue_is_open = True
 
+    def _get_settings_values(self) -> Dict[str, Any]:
+        return {"time_between_same_song": self._time_between_same_song,
+                "max_times_song_can_be_sung": self._max_times_song_can_be_sung,
+                "queue_is_open": self._queue_is_open,
+                "time_between_song_submissions": self._time_between_song_submissions}
+
+    def _set_settings_values(self, values: Dict[str, Any]) -> None:
+        self._time_between_same_song = timedelta(seconds=values["time_between_same_song"])
+        self._max_times_song_can_be_sung = values["max_times_song_can_be_sung"]
+        self._queue_is_open = values["queue_is_open"]
+        self._time_between_song_submissions = timedelta(seconds=values["time_between_song_submissions"])
+
+    def _get_state(self) -> Dict[str, Any]:
+        return {"last_entry_id": self._last_entry_id,
+                "settings": self._get_settings_values(),
+                "queue": [{"entry_id": node.entry_id, "entry": node.entry} for node in self._iterate_queue_nodes()],
+                "processed_entries": self._processed_entries}
+
+    def _set_state(self, state: Dict[str, Any]) -> None:
+        self._clear_queue()
+        self._clear_processed_entries()
+        self._set_settings_values(state["settings"])
+        for values in state["queue"]:
+            self._add_entry(values["entry_id"], entry_from_values(values["entry"]))
+        for values in state["processed_entries"]:
+            self._add_processed_entry(entry_from_values(values))
+        self._last_entry_id = state["last_entry_id"]
+
+    def _apply_change(self, operation: str, values: Dict[str, Any]) -> None:
+        """Make a change read from the journal, the way it was made when it was appended."""
+        if operation == "add":
+            self._add_entry(values["entry_id"], entry_from_values(values["entry"]))
+        elif operation == "process":
+            self._process_node(self._queue_node_by_id[values["entry_id"]],
+                               datetime.fromisoformat(values["processed_at"]))
+        elif operation == "remove":
+            self._pop_node(self._queue_node_by_id[values["entry_id"]])
+        elif operation == "move":
+            before_entry_id = values["before_entry_id"]
+            self._move_node_before(self._queue_node_by_id[values["entry_id"]],
+                                   self._queue_node_by_id[before_entry_id]
+                                   if before_entry_id is not None else self._queue_sentinel)
+        elif operation == "clear_queue":
+            self._clear_queue()
+        elif operation == "clear_processed_entries":
+            self._clear_processed_entries()
+        elif operation == "settings":
+            self._set_settings_values(values)
+        else:
+            raise ValueError(f"Unknown queue journal operation {operation}")
+
+    def _catch_up_with_journal(self) -> int:
+        """Make the changes appended to the journal since the last one made here, e.g. by other workers.
+
+        Returns the number of changes made after the snapshot, if the queue was replaced by it.
+        """
+        snapshot, changes = self._journal.load_after(self._journal_sequence)
+        if snapshot is not None:
+            self._set_state(snapshot.state)
+            self._journal_sequence = snapshot.last_sequence
+        for change in changes:
+            self._apply_change(change.operation, change.values)
+            self._journal_sequence = change.sequence
+        return len(changes)
+
+    @contextmanager
+    def _journal_transaction(self) -> Iterator[None]:
+        with self._lock:
+            if self._journal is None:
+                yield
+                return
+            caught_up_sequence = None
+            try:
+                with self._journal.transaction():
+                    self._catch_up_with_journal()
+                    caught_up_sequence = self._journal_sequence
+                    yield
+            except BaseException:
+                # the changes appended in the transaction are rolled back with it, as every change is appended
+                # before it is made, the queue only holds changes that were rolled back if one was appended
+                if caught_up_sequence is not None and self._journal_sequence != caught_up_sequence:
+                    self._reload_from_journal()
+                raise
+
+    def _reload_from_journal(self) -> None:
+        """Replace the queue by the one recovered from the journal, dropping changes that were rolled back."""
+        # the journal always holds a snapshot since it was opened, which covers changes after any sequence below 0
+        self._journal_sequence = -1
+        self._catch_up_with_journal()
+
+    def _journal_change(self, operation: str, values: Dict[str, Any]) -> None:
+        if self._journal is None:
+            return
+        # the state is snapshot before the next change, so it holds all changes appended so far
+        if self._journal.needs_snapshot(self._journal_sequence):
+            self._journal.write_snapshot(self._journal_sequence, self._get_state())
+        self._journal.append(self._journal_sequence + 1, operation, values)
+        self._journal_sequence += 1
+
+    def sync(self) -> None:
+        """Make the changes appended to the journal by other workers, before reading the queue."""
+        with self._lock:
+            if self._journal is None:
+                return
+            with self._journal.transaction(write=False):
+                self._catch_up_with_journal()
+
+    def open_journal(self, journal: QueueJournal) -> int:
+        """Recover the queue from the snapshot and changes of a journal, then append all changes to it.
+
+        Returns the number of changes replayed after the snapshot.
+        """
+        with self._lock, journal.transaction():
+            self._journal = journal
+            replayed = self._catch_up_with_journal()
+            journal.write_snapshot(self._journal_sequence, self._get_state())
+        return replayed
+
+    def close_journal(self) -> None:
+        """Write a snapshot of the queue to the journal and close it."""
+        with self._lock:
+            if self._journal is None:
+                return
+            with self._journal.transaction():
+                self._catch_up_with_journal()
+                self._journal.write_snapshot(self._journal_sequence, self._get_state())
+            self._journal.close()
+            self._journal = None
+
     def is_song_in_queue(self, song: UltrastarSong) -> bool:
-        return song in [entry.song for entry in self._queue]
+        return song.id in self._queued_count_by_song_id
 
     def is_song_in_processed_entries(self, song: UltrastarSong) -> bool:
-        return song in [entry.song for entry in self._processed_entries]
-
-    def _get_processed_entries_by_song(self, song: UltrastarSong) -> list[ProcessedQueueEntry]:
-        return [entry for entry in self._processed_entries if entry.song == song]
+        return song.id in self._processed_count_by_song_id
 
     def time_until_end_of_queue(self) -> timedelta:
-        time_until_end = timedelta(seconds=0)
-        for entry in self._queue:
-            time_until_end += (entry.song.audio_duration
-                               if entry.song.audio_duration is not None
-                               else timedelta(seconds=0))
+        return self._timeline.total
 
-        return time_until_end
+    def time_until_entry_at_index(self, index: int) -> timedelta:
+        with self._lock:
+            return self._timeline.time_before(self._get_node_at_index(index).entry_id)
 
-    def _song_last_sung_at(self, song: UltrastarSong) -> datetime | None:
-        processed_entries = self._get_processed_entries_by_song(song)
-        processed_entries.sort(key=lambda processed_entry: processed_entry.processed_at)
+    def time_until_entry(self, entry_id: int) -> timedelta:
+        with self._lock:
+            return self._timeline.time_before(self._get_node_by_id(entry_id).entry_id)
+
+    def scheduled_queue(self) -> list[ScheduledQueueEntry]:
+        """Return the queue with the time until each entry starts, adding up the durations in one pass."""
+        with self._lock:
+            entries = [(node.entry_id, node.entry) for node in self._iterate_queue_nodes()]
+        scheduled_entries = []
+        time_until_start = timedelta(seconds=0)
+        for entry_id, entry in entries:
+            scheduled_entries.append(ScheduledQueueEntry(id=entry_id,
+                                                         song=entry.song,
+                                                         singer=entry.singer,
+                                                         time_until_start=time_until_start))
+            time_until_start += self._get_duration(entry)
+        return scheduled_entries
 
-        return processed_entries[-1].processed_at if processed_entries else None
+    def _song_last_sung_at(self, song: UltrastarSong) -> datetime | None:
+        return self._last_sung_at_by_song_id.get(song.id)
 
     def will_time_between_songs_have_passed_until_end_of_queue(self, song: UltrastarSong) -> bool:
         last_sung_at = self._song_last_sung_at(song)
@@ -129,7 +506,7 @@ class QueueService:
         return datetime.now() + self.time_until_end_of_queue() - self._time_between_same_song > last_sung_at
 
     def _song_sung_x_times(self, song: UltrastarSong) -> int:
-        return len(self._get_processed_entries_by_song(song))
+        return self._processed_count_by_song_id.get(song.id, 0)
 
     def has_song_been_sung_max_times(self, song: UltrastarSong) -> bool:
         return self._song_sung_x_times(song) >= self._max_times_song_can_be_sung
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+
+class QueueTimeline:
+    """
+    The durations of the queued entries in queue order, to tell when each entry starts in logarithmic time.
+
+    Entries are identified by a handle of the caller. Each entry takes a slot of a Fenwick tree holding the
+    durations, slots increase in queue order and are spaced apart, so an entry moved between two others
+    usually finds a free slot between them. Only when there is none, all entries are given new slots.
+
+    Methods
+    ----------
+    def insert(self, handle: int, duration: timedelta, after: int | None = None, before: int | None = None) -> None
+        Add an entry between the entries `after` and `before`, None for the start or end of the queue.
+
+    def remove(self, handle: int) -> timedelta
+        Remove an entry and return its duration.
+
+    def time_before(self, handle: int) -> timedelta
+        Return the duration of all entries before an entry.
+    """
+
+    SLOT_SPACING: int = 64
+
+    def __init__(self):
+        self._tree: List[timedelta] = [timedelta(0)]
+        self._slot_by_handle: Dict[int, int] = {}
+        self._duration_by_handle: Dict[int, timedelta] = {}
+        self._last_slot = 0
+        self._total = timedelta(0)
+
+    def __len__(self) -> int:
+        return len(self._slot_by_handle)
+
+    def __contains__(self, handle: int) -> bool:
+        return handle in self._slot_by_handle
+
+    @property
+    def total(self) -> timedelta:
+        return self._total
+
+    def _add_to_slot(self, slot: int, duration: timedelta) -> None:
+        while slot < len(self._tree):
+            self._tree[slot] += duration
+            slot += slot & -slot
+
+    def _sum_until_slot(self, slot: int) -> timedelta:
+        total = timedelta(0)
+        while slot > 0:
+            total += self._tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def _rebuild(self, slots_and_durations: List[Tuple[int, timedelta]], size: int) -> None:
+        """Rebuild the tree from the durations by slot in linear time."""
+        self._tree = [timedelta(0)] * (size + 1)
+        for slot, duration in slots_and_durations:
+            self._tree[slot] += duration
+        for slot in range(1, size + 1):
+            parent = slot + (slot & -slot)
+            if parent <= size:
+                self._tree[parent] += self._tree[slot]
+
+    def _respace(self) -> None:
+        """Give all entries new, evenly spaced slots in their current order."""
+        handles = sorted(self._slot_by_handle, key=self._slot_by_handle.__getitem__)
+        self._slot_by_handle = {handle: (i + 1) * self.SLOT_SPACING for i, handle in enumerate(handles)}
+        self._last_slot = len(handles) * self.SLOT_SPACING
+        self._rebuild([(self._slot_by_handle[handle], self._duration_by_handle[handle]) for handle in handles],
+                      max(2 * self._last_slot, self.SLOT_SPACING))
+
+    def _get_free_slot(self, after: int | None, before: int | None) -> int | None:
+        lower = self._slot_by_handle[after] if after is not None else 0
+        if before is None:
+            return max(lower, self._last_slot) + self.SLOT_SPACING
+        upper = self._slot_by_handle[before]
+        return (lower + upper) // 2 if upper - lower > 1 else None
+
+    def insert(self, handle: int, duration: timedelta, after: int | None = None, before: int | None = None) -> None:
+        slot = self._get_free_slot(after, before)
+        if slot is None:
+            self._respace()
+            slot = self._get_free_slot(after, before)
+        if slot >= len(self._tree):
+            self._respace()
+            slot = self._get_free_slot(after, before)
+        self._slot_by_handle[handle] = slot
+        self._duration_by_handle[handle] = duration
+        self._last_slot = max(self._last_slot, slot)
+        self._add_to_slot(slot, duration)
+        self._total += duration
+
+    def remove(self, handle: int) -> timedelta:
+        slot = self._slot_by_handle.pop(handle)
+        duration = self._duration_by_handle.pop(handle)
+        self._add_to_slot(slot, -duration)
+        self._total -= duration
+        return duration
+
+    def time_before(self, handle: int) -> timedelta:
+        return self._sum_until_slot(self._slot_by_handle[handle] - 1)
+
+    def clear(self) -> None:
+        self._tree = [timedelta(0)]
+        self._slot_by_handle.clear()
+        self._duration_by_handle.clear()
+        self._last_slot = 0
+        self._total = timedelta(0)
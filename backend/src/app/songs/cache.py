@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Iterable
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import crud
+from .models import UltrastarSong
+from .schemas import SongCacheStatistics
+
+
+class SongCache:
+    """
+    A size-bounded read-through cache of songs by id, evicting the least recently used song when full.
+
+    Songs only change while the song dir is synced, which invalidates the changed and removed songs,
+    so songs are cached until then. Ids not found in the database are not cached.
+
+    Methods
+    ----------
+    async def get_song_by_id(self, session: AsyncSession, song_id: int) -> UltrastarSong | None
+        Return a song from the cache, or from the database on a miss and cache it.
+
+    def invalidate(self, song_ids: Iterable[int]) -> None
+        Remove songs from the cache, so they are read from the database again.
+
+    def clear(self) -> None
+        Remove all songs from the cache.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._songs: OrderedDict[int, UltrastarSong] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._songs)
+
+    def __contains__(self, song_id: int) -> bool:
+        return song_id in self._songs
+
+    async def get_song_by_id(self, session: AsyncSession, song_id: int) -> UltrastarSong | None:
+        song = self._songs.get(song_id)
+        if song is not None:
+            self.hits += 1
+            self._songs.move_to_end(song_id)
+            return song
+        self.misses += 1
+        song = await crud.get_song_by_id(session, song_id)
+        if song is not None and self.max_size > 0:
+            self._songs[song_id] = song
+            if len(self._songs) > self.max_size:
+                self._songs.popitem(last=False)
+        return song
+
+    def invalidate(self, song_ids: Iterable[int]) -> None:
+        for song_id in song_ids:
+            self._songs.pop(song_id, None)
+
+    def clear(self) -> None:
+        self._songs.clear()
+
+    def get_statistics(self) -> SongCacheStatistics:
+        return SongCacheStatistics(hits=self.hits, misses=self.misses, size=len(self._songs), max_size=self.max_size)
@@ -1,34 +1,108 @@
-from typing import List
+import base64
+import binascii
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
 
-from sqlmodel import select, col
+from sqlalchemy import and_, text, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import defer
+from sqlmodel import select, col, delete, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .models import UltrastarSong
+from .models import UltrastarSong, UltrastarSongFile, UltrastarSongNotes
+from .schemas import UltrastarSongBase, UltrastarSongSearchResult
+from .search_index import normalize_search_text
 
+# sorts behind every text starting with the same characters, as SQLite compares texts by their UTF-8 bytes
+_LAST_CHARACTER = chr(0x10FFFF)
 
-async def get_songs(session: AsyncSession) -> List[UltrastarSong]:
-    statement = select(UltrastarSong).order_by(UltrastarSong.title, UltrastarSong.artist)
+_SEARCH_WORD = re.compile(r"\w+")
+SNIPPET_MARK_START = "<mark>"
+SNIPPET_MARK_END = "</mark>"
+# matches in the title rank higher than in the artist, which rank higher than in the lyrics
+_SEARCH_STATEMENT = text("SELECT ultrastarsong.id, ultrastarsong.title, ultrastarsong.artist, "
+                         "snippet(ultrastarsong_fts, 2, :mark_start, :mark_end, '…', 16) "
+                         "FROM ultrastarsong_fts JOIN ultrastarsong ON ultrastarsong.id = ultrastarsong_fts.rowid "
+                         "WHERE ultrastarsong_fts MATCH :match "
+                         "ORDER BY bm25(ultrastarsong_fts, 10.0, 5.0, 1.0) LIMIT :limit")
+
+
+def encode_song_cursor(song: UltrastarSong) -> str:
+    """Return an opaque cursor pointing behind a song in the order of `get_songs`."""
+    return base64.urlsafe_b64encode(json.dumps([song.title, song.artist, song.id]).encode()).decode()
+
+
+def decode_song_cursor(cursor: str) -> Tuple[str, str, int]:
+    """Return the title, artist and id of a cursor of `encode_song_cursor`, raise a ValueError if it is invalid."""
+    try:
+        title, artist, song_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(title, str) or not isinstance(artist, str) or not isinstance(song_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return title, artist, song_id
+
+
+async def get_songs(session: AsyncSession,
+                    after: Tuple[str, str, int] | None = None,
+                    limit: int | None = None) -> List[UltrastarSong]:
+    """Return songs ordered by title, artist and id, starting behind the title, artist and id `after`.
+
+    The lyrics are not loaded and raise an error when accessed, so a page of songs stays small.
+    """
+    statement = (select(UltrastarSong)
+                 .options(defer(UltrastarSong.lyrics, raiseload=True))
+                 .order_by(UltrastarSong.title, UltrastarSong.artist, UltrastarSong.id))
+    if after is not None:
+        # a row value comparison lets SQLite seek to the cursor in the title and artist index
+        statement = statement.where(tuple_(UltrastarSong.title, UltrastarSong.artist, UltrastarSong.id)
+                                    > tuple_(*after))
+    if limit is not None:
+        statement = statement.limit(limit)
     result = await session.exec(statement)
     return list(result.fetchall())
 
 
+async def get_song_titles_and_artists(session: AsyncSession) -> List[Tuple[int, str, str]]:
+    """Return the id, title and artist of all songs without loading the rest of them."""
+    result = await session.exec(select(UltrastarSong.id, UltrastarSong.title, UltrastarSong.artist))
+    return list(result.all())
+
+
 async def get_song_by_id(session: AsyncSession, song_id: int) -> UltrastarSong | None:
     song = await session.get(UltrastarSong, song_id)
     return song
 
 
+def starts_with(column: Any, prefix: str) -> Any:
+    """Return a condition on a column starting with a prefix, which SQLite can search in an index of the column.
+
+    Unlike LIKE, whose prefix search SQLite only serves from an index of a case-insensitive column.
+    """
+    return and_(column >= prefix, column < prefix + _LAST_CHARACTER)
+
+
 async def get_songs_by_criteria(
         session: AsyncSession,
         title: str | None = None,
         artist: str | None = None,
 ) -> list[UltrastarSong]:
+    """Return the songs with the title and artist or starting with the title or artist.
+
+    Both are compared by their normalized form, see `search_index.normalize_search_text`, so "beyonce" matches
+    "Beyoncé". Searching anywhere in the title or artist is left to `search_songs`.
+    """
     if title and artist:
-        statement = (select(UltrastarSong)
-                     .where(UltrastarSong.title == title, UltrastarSong.artist == artist))
+        statement = select(UltrastarSong).where(UltrastarSong.normalized_title == normalize_search_text(title),
+                                                UltrastarSong.normalized_artist == normalize_search_text(artist))
     elif title:
-        statement = select(UltrastarSong).where(col(UltrastarSong.title).contains(title))
+        statement = select(UltrastarSong).where(starts_with(UltrastarSong.normalized_title,
+                                                            normalize_search_text(title)))
     elif artist:
-        statement = select(UltrastarSong).where(col(UltrastarSong.artist).contains(artist))
+        statement = select(UltrastarSong).where(starts_with(UltrastarSong.normalized_artist,
+                                                            normalize_search_text(artist)))
     else:
         statement = select(UltrastarSong)
 
@@ -39,15 +113,167 @@ async def get_songs_by_criteria(
     return list(songs.all())
 
 
+def get_search_match(query: str) -> str | None:
+    """Return a full-text query matching songs containing all words of a search query or words starting with them.
+
+    Words are quoted, so characters of the FTS5 query syntax in the search query are matched literally.
+    Returns None if the search query contains no words.
+    """
+    words = _SEARCH_WORD.findall(query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+async def search_songs(session: AsyncSession, query: str, limit: int = 20) -> List[UltrastarSongSearchResult]:
+    """Return the songs best matching a search query in their title, artist or lyrics, best match first.
+
+    Only the id, title and artist of the songs are loaded, the lyrics only show in the snippet around the match.
+    """
+    match = get_search_match(query)
+    if match is None:
+        return []
+    result = await session.exec(_SEARCH_STATEMENT, params={"match": match,
+                                                          "mark_start": SNIPPET_MARK_START,
+                                                          "mark_end": SNIPPET_MARK_END,
+                                                          "limit": limit})
+    return [UltrastarSongSearchResult(id=song_id,
+                                      title=title,
+                                      artist=artist,
+                                      lyrics_snippet=snippet if snippet and SNIPPET_MARK_START in snippet else None)
+            for song_id, title, artist, snippet in result.all()]
+
+
+def get_normalized_song_values(title: str, artist: str) -> Dict[str, str]:
+    normalized_title, normalized_artist = get_song_key(title, artist)
+    return {"normalized_title": normalized_title, "normalized_artist": normalized_artist}
+
+
+def get_song_values(song_base: UltrastarSongBase) -> Dict[str, Any]:
+    """Return the column values of a song, including the normalized title and artist."""
+    return song_base.model_dump() | get_normalized_song_values(song_base.title, song_base.artist)
+
+
 async def add_song(session: AsyncSession, song: UltrastarSong) -> UltrastarSong:
+    song.sqlmodel_update(get_normalized_song_values(song.title, song.artist))
     session.add(song)
     await session.commit()
     await session.refresh(song)
     return song
 
 
-async def add_song_if_not_in_db(session: AsyncSession, song: UltrastarSong) -> UltrastarSong | None:
-    matching_songs = await get_songs_by_criteria(session, title=song.title, artist=song.artist)
-    if matching_songs:
-        return None
-    return await add_song(session, song)
+def get_song_key(title: str, artist: str) -> Tuple[str, str]:
+    """Return the key songs are unique by, their normalized title and artist the songs are also searched by."""
+    return normalize_search_text(title), normalize_search_text(artist)
+
+
+async def get_song_ids_by_key(session: AsyncSession) -> Dict[Tuple[str, str], int]:
+    """Return the ids of all songs by their key, see `get_song_key`."""
+    result = await session.exec(select(UltrastarSong.title, UltrastarSong.artist, UltrastarSong.id))
+    return {get_song_key(title, artist): song_id for title, artist, song_id in result.all()}
+
+
+async def get_song_id_by_key(session: AsyncSession, key: Tuple[str, str]) -> int | None:
+    title, artist = key
+    statement = select(UltrastarSong.id).where(UltrastarSong.normalized_title == title,
+                                               UltrastarSong.normalized_artist == artist)
+    result = await session.exec(statement)
+    return result.first()
+
+
+async def add_songs_if_not_in_db(session: AsyncSession,
+                                 song_bases: Iterable[UltrastarSongBase],
+                                 song_ids_by_key: Dict[Tuple[str, str], int]) -> List[UltrastarSongBase]:
+    """Insert the songs whose key is not in `song_ids_by_key` with one statement.
+
+    The unique index on the key skips songs that were added since `song_ids_by_key` was read.
+    The ids of all given songs are added to `song_ids_by_key`, the caller commits the transaction.
+    Returns the inserted songs.
+    """
+    new_songs: Dict[Tuple[str, str], UltrastarSongBase] = {}
+    for song_base in song_bases:
+        key = get_song_key(song_base.title, song_base.artist)
+        if key not in song_ids_by_key:
+            new_songs.setdefault(key, song_base)
+    if not new_songs:
+        return []
+    statement = (insert(UltrastarSong)
+                 .on_conflict_do_nothing()
+                 .returning(UltrastarSong.title, UltrastarSong.artist, UltrastarSong.id))
+    result = await session.exec(statement,
+                                params=[get_song_values(song_base) for song_base in new_songs.values()])
+    inserted_songs = []
+    for title, artist, song_id in result.all():
+        key = get_song_key(title, artist)
+        song_ids_by_key[key] = song_id
+        inserted_songs.append(new_songs.pop(key))
+    for key in new_songs:
+        song_ids_by_key[key] = await get_song_id_by_key(session, key)
+    return inserted_songs
+
+
+async def update_songs(session: AsyncSession, song_bases_by_id: Mapping[int, UltrastarSongBase]) -> None:
+    """Update existing songs with one statement, the caller commits the transaction."""
+    if not song_bases_by_id:
+        return
+    await session.exec(update(UltrastarSong),
+                       params=[{"id": song_id, **get_song_values(song_base)}
+                               for song_id, song_base in song_bases_by_id.items()])
+
+
+async def get_song_files(session: AsyncSession, dir_path: str | None = None) -> List[UltrastarSongFile]:
+    statement = select(UltrastarSongFile)
+    if dir_path:
+        statement = statement.where(col(UltrastarSongFile.path).startswith(os.path.join(dir_path, ""),
+                                                                           autoescape=True))
+    result = await session.exec(statement)
+    return list(result.all())
+
+
+async def add_or_update_song_files(session: AsyncSession, song_files: Iterable[UltrastarSongFile]) -> None:
+    """Insert or replace manifest entries with one statement, the caller commits the transaction."""
+    values = [song_file.model_dump() for song_file in song_files]
+    if not values:
+        return
+    statement = insert(UltrastarSongFile)
+    statement = statement.on_conflict_do_update(index_elements=[UltrastarSongFile.path],
+                                                set_={name: statement.excluded[name]
+                                                      for name in values[0] if name != "path"})
+    await session.exec(statement, params=values)
+
+
+async def remove_song_files(session: AsyncSession, paths: Iterable[str]) -> List[UltrastarSong]:
+    """Remove the manifest entries of the given paths and the songs no remaining file belongs to.
+
+    The caller commits the transaction.
+    """
+    paths = list(paths)
+    if not paths:
+        return []
+    result = await session.exec(select(UltrastarSongFile.song_id).where(col(UltrastarSongFile.path).in_(paths)))
+    song_ids = {song_id for song_id in result.all() if song_id is not None}
+    await session.exec(delete(UltrastarSongFile).where(col(UltrastarSongFile.path).in_(paths)))
+
+    result = await session.exec(select(UltrastarSongFile.song_id).where(col(UltrastarSongFile.song_id).in_(song_ids)))
+    orphaned_song_ids = song_ids - set(result.all())
+    result = await session.exec(select(UltrastarSong).where(col(UltrastarSong.id).in_(orphaned_song_ids)))
+    removed_songs = list(result.all())
+    await session.exec(delete(UltrastarSongNotes).where(col(UltrastarSongNotes.song_id).in_(orphaned_song_ids)))
+    await session.exec(delete(UltrastarSong).where(col(UltrastarSong.id).in_(orphaned_song_ids)))
+    return removed_songs
+
+
+async def get_song_notes(session: AsyncSession, song_id: int) -> UltrastarSongNotes | None:
+    song_notes = await session.get(UltrastarSongNotes, song_id)
+    return song_notes
+
+
+async def add_or_update_song_notes(session: AsyncSession, song_notes: Iterable[UltrastarSongNotes]) -> None:
+    """Insert or replace the notes of songs with one statement, the caller commits the transaction."""
+    values = [{"song_id": notes.song_id, "data": notes.data} for notes in song_notes]
+    if not values:
+        return
+    statement = insert(UltrastarSongNotes)
+    statement = statement.on_conflict_do_update(index_elements=[UltrastarSongNotes.song_id],
+                                                set_={"data": statement.excluded.data})
+    await session.exec(statement, params=values)
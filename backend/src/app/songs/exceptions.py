@@ -7,3 +7,7 @@ class EmptySonglistHTTPException(HTTPException):
 
 class NoMatchingSongHTTPException(HTTPException):
     pass
+
+
+class InvalidCursorHTTPException(HTTPException):
+    pass
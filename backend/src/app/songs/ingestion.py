@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import AsyncIterator, Dict, Iterable, Iterator, Mapping, Tuple, TypeVar
+
+from pydantic import ValidationError
+
+from .schemas import ParsedSongFile, UltrastarSongBase, get_audio_duration
+from ...ultrastar_file_parser import SongNotes, UltrastarFileParser, get_song_duration_in_seconds
+from ...ultrastar_file_parser.cache import ParseResultCache
+from ...ultrastar_file_parser.exceptions import UltrastarMatchingError
+
+T = TypeVar("T")
+
+# items taken from a blocking iterator per call of a worker thread, see `iter_in_thread`
+THREAD_BATCH_SIZE = 64
+
+
+def read_song_file(content: bytes,
+                   encoding: str | None,
+                   song_notes: SongNotes | None) -> Tuple[Dict[str, str], SongNotes | None, str]:
+    """Return the attributes, the notes and the encoding of the content of an Ultrastar file."""
+    with UltrastarFileParser.open_bytes(content, encoding) as file:
+        events = UltrastarFileParser.iter_text_file_events(file)
+        attr_dict = UltrastarFileParser.collect_ultrastar_song_attributes(events, song_notes)
+        return attr_dict, song_notes, file.encoding
+
+
+def read_song_file_in_fitting_encoding(content: bytes,
+                                       encoding: str | None,
+                                       with_notes: bool) -> Tuple[Dict[str, str], SongNotes | None, str]:
+    """Return the attributes, the notes and the encoding of an Ultrastar file, in an encoding that fits all of it.
+
+    An encoding from a previous scan that does not fit the file anymore is detected again.
+    An encoding detected from the first bytes that does not fit a later byte is detected again from the whole file.
+    """
+    if encoding is not None:
+        try:
+            return read_song_file(content, encoding, SongNotes() if with_notes else None)
+        except UnicodeDecodeError:
+            pass
+    try:
+        return read_song_file(content, None, SongNotes() if with_notes else None)
+    except UnicodeDecodeError:
+        encoding = UltrastarFileParser.detect_encoding(content, is_complete=True)
+        return read_song_file(content, encoding, SongNotes() if with_notes else None)
+
+
+def read_song_file_with_fallbacks(content: bytes,
+                                  encoding: str | None = None) -> Tuple[Dict[str, str], SongNotes | None, str]:
+    """Return the attributes, the notes and the encoding of the content of an Ultrastar file.
+
+    The encoding falls back as described in `read_song_file_in_fitting_encoding`.
+    A file with a beat or pitch out of the range of the note columns is read without notes.
+    """
+    try:
+        return read_song_file_in_fitting_encoding(content, encoding, with_notes=True)
+    except OverflowError:
+        return read_song_file_in_fitting_encoding(content, encoding, with_notes=False)
+
+
+def parse_song_file(file_path: str,
+                    encoding: str | None = None,
+                    duration_source: str = "audio",
+                    encoding_content_hash: str | None = None) -> ParsedSongFile:
+    """Parse an Ultrastar file and get the duration of the song.
+
+    The `duration_source` is one of the values of `Settings.SONG_DURATION_SOURCE`,
+    with "notes" the audio file is never opened.
+    An `encoding` with an `encoding_content_hash`, e.g. from a previous scan, is only tried first
+    if the content of the file still has this hash, otherwise the encoding is detected again.
+    Errors are collected as log messages instead of being raised, so this function can run in a worker process.
+    The file is read once, files without an Ultrastar header are rejected after their first bytes.
+    """
+    with open(file_path, "rb") as file:
+        head = file.read(8)
+        if not UltrastarFileParser.starts_with_ultrastar_header(head):
+            # e.g. a readme or license, not worth an error
+            return ParsedSongFile(file_path=file_path, content_hash="")
+        rest = file.read()
+    digest = hashlib.sha256(head)
+    digest.update(rest)
+    content_hash = digest.hexdigest()
+    content = head + rest
+    if encoding_content_hash is not None and encoding_content_hash != content_hash:
+        # a file saved again may be in another encoding that decodes without error in the old one
+        encoding = None
+    try:
+        attr_dict, song_notes, encoding = read_song_file_with_fallbacks(content, encoding)
+    except UltrastarMatchingError as e:
+        return ParsedSongFile(file_path=file_path,
+                              content_hash=content_hash,
+                              errors=[e.args[0] + f"Probably not an ultrastar file: {file_path}\n"])
+    except UnicodeDecodeError as e:
+        return ParsedSongFile(file_path=file_path,
+                              content_hash=content_hash,
+                              errors=[f"Could not decode {file_path}: {e}\n"])
+    try:
+        song_base = UltrastarSongBase.model_validate(attr_dict)
+    except ValidationError as e:
+        return ParsedSongFile(file_path=file_path,
+                              content_hash=content_hash,
+                              encoding=encoding,
+                              errors=[f"Missing or invalid attributes in {file_path}: {e}\n"])
+    errors = []
+    if duration_source != "audio":
+        duration = get_song_duration_in_seconds(attr_dict, song_notes)
+        if duration is not None:
+            song_base.audio_duration = timedelta(seconds=round(duration))
+    if duration_source == "audio" or (duration_source == "notes_with_audio_fallback"
+                                      and song_base.audio_duration is None):
+        try:
+            song_base.audio_duration = get_audio_duration(os.path.join(os.path.dirname(file_path),
+                                                                       attr_dict.get("mp3", "")))
+        except RuntimeError as e:
+            errors.append(str(e.args[0]))
+        except FileNotFoundError as e:
+            errors.append(str(e.args[0]))
+    return ParsedSongFile(file_path=file_path,
+                          content_hash=content_hash,
+                          encoding=encoding,
+                          song=song_base,
+                          notes=song_notes.to_blob() if song_notes is not None else None,
+                          errors=errors)
+
+
+def get_cached_song_file(cache: ParseResultCache,
+                         file_path: str,
+                         file_stat: os.stat_result,
+                         duration_source: str) -> ParsedSongFile | None:
+    cached = cache.get(file_path, file_stat.st_size, file_stat.st_mtime_ns)
+    # a result with the duration from another source is outdated
+    if cached is None or cached.values.pop("duration_source", "audio") != duration_source:
+        return None
+    return ParsedSongFile(**cached.values, file_path=file_path, notes=cached.blob)
+
+
+def cache_song_file(cache: ParseResultCache,
+                    parsed_song_file: ParsedSongFile,
+                    file_stat: os.stat_result,
+                    duration_source: str) -> None:
+    values = parsed_song_file.model_dump(mode="json", exclude={"file_path", "notes"})
+    values["duration_source"] = duration_source
+    cache.put(parsed_song_file.file_path, file_stat.st_size, file_stat.st_mtime_ns, values, parsed_song_file.notes)
+
+
+async def iter_in_thread(items: Iterable[T], batch_size: int = THREAD_BATCH_SIZE) -> AsyncIterator[T]:
+    """Yield the items of a blocking iterable, e.g. a dir walk, advancing it in a worker thread.
+
+    The items are taken in batches, so the event loop keeps serving other tasks while the next ones are produced.
+    The iterable is only ever advanced by one thread at a time.
+    """
+    iterator = iter(items)
+    while batch := await asyncio.to_thread(list, itertools.islice(iterator, batch_size)):
+        for item in batch:
+            yield item
+
+
+async def parse_song_files(file_paths: Iterable[str],
+                           workers: int = 1,
+                           encodings: Mapping[str, Tuple[str | None, str]] | None = None,
+                           cache: ParseResultCache | None = None,
+                           duration_source: str = "audio") -> AsyncIterator[ParsedSongFile]:
+    """Yield the parsed song files, in the order they finish parsing.
+
+    Files with an encoding and content hash in `encodings`, e.g. from a previous scan, are opened with this encoding
+    instead of detecting it, as long as their content still has this hash.
+    With a `cache` the result for a file with unchanged size and modification time is taken from it
+    without reading the file, the results of all other files are added to it.
+    The `duration_source` is passed on to `parse_song_file`, a cached result with another one is parsed again.
+
+    With `workers` set to 1 the files are parsed one after another in a worker thread of this process.
+    Otherwise they are spread across a pool of `workers` processes (one per cpu core for 0),
+    keeping a bounded number of files in flight so results are handed back while parsing continues.
+    `file_paths` is advanced and the files are looked up in the cache in a worker thread as well,
+    so neither walking a dir nor parsing blocks the event loop.
+    """
+    encodings = encodings or {}
+    # the stat before parsing, a file changed while being parsed is parsed again next time
+    file_stats: Dict[str, os.stat_result] = {}
+
+    def iter_uncached_file_paths() -> Iterator[str | ParsedSongFile]:
+        """Yield the cached results and the paths of the files that have to be parsed."""
+        for file_path in file_paths:
+            if cache is None:
+                yield file_path
+                continue
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                yield file_path
+                continue
+            cached_song_file = get_cached_song_file(cache, file_path, file_stat, duration_source)
+            if cached_song_file is not None:
+                yield cached_song_file
+                continue
+            file_stats[file_path] = file_stat
+            yield file_path
+
+    def add_to_cache(parsed_song_file: ParsedSongFile) -> ParsedSongFile:
+        file_stat = file_stats.pop(parsed_song_file.file_path, None)
+        if cache is not None and file_stat is not None:
+            cache_song_file(cache, parsed_song_file, file_stat, duration_source)
+        return parsed_song_file
+
+    def parse_and_cache_song_file(file_path: str) -> ParsedSongFile:
+        encoding, encoding_content_hash = encodings.get(file_path, (None, None))
+        return add_to_cache(parse_song_file(file_path, encoding, duration_source, encoding_content_hash))
+
+    if workers == 1:
+        async for file_path_or_result in iter_in_thread(iter_uncached_file_paths()):
+            if isinstance(file_path_or_result, ParsedSongFile):
+                yield file_path_or_result
+                continue
+            yield await asyncio.to_thread(parse_and_cache_song_file, file_path_or_result)
+        return
+
+    workers = workers if workers > 0 else os.cpu_count() or 1
+    max_in_flight = workers * 4
+    loop = asyncio.get_running_loop()
+    # spawn instead of fork, the event loop and database driver threads must not be copied into the workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = set()
+        async for file_path_or_result in iter_in_thread(iter_uncached_file_paths()):
+            if isinstance(file_path_or_result, ParsedSongFile):
+                yield file_path_or_result
+                continue
+            file_path = file_path_or_result
+            encoding, encoding_content_hash = encodings.get(file_path, (None, None))
+            pending.add(loop.run_in_executor(executor,
+                                             parse_song_file,
+                                             file_path,
+                                             encoding,
+                                             duration_source,
+                                             encoding_content_hash))
+            if len(pending) < max_in_flight:
+                continue
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield add_to_cache(future.result())
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield add_to_cache(future.result())
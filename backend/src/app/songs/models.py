@@ -1,7 +1,32 @@
-from sqlmodel import Field
+from sqlalchemy import BigInteger, Index
+from sqlmodel import Field, SQLModel
 
 from .schemas import UltrastarSongBase
 
 
 class UltrastarSong(UltrastarSongBase, table=True):
+    __table_args__ = (
+        # songs are unique by their normalized title and artist, see `crud.get_song_key`
+        Index("uq_ultrastarsong_normalized_title_artist", "normalized_title", "normalized_artist", unique=True),
+        Index("ix_ultrastarsong_title_artist", "title", "artist"),
+        Index("ix_ultrastarsong_normalized_artist", "normalized_artist"),
+    )
+
     id: int = Field(default=None, primary_key=True)
+    # title and artist as returned by `search_index.normalize_search_text`, set by `crud`, not part of the API
+    normalized_title: str = Field(default="", exclude=True, sa_column_kwargs={"server_default": ""})
+    normalized_artist: str = Field(default="", exclude=True, sa_column_kwargs={"server_default": ""})
+
+
+class UltrastarSongFile(SQLModel, table=True):
+    path: str = Field(primary_key=True)
+    size: int = Field(sa_type=BigInteger)
+    mtime_ns: int = Field(sa_type=BigInteger)
+    content_hash: str
+    encoding: str | None = None
+    song_id: int | None = Field(default=None, foreign_key="ultrastarsong.id", index=True)
+
+
+class UltrastarSongNotes(SQLModel, table=True):
+    song_id: int = Field(primary_key=True, foreign_key="ultrastarsong.id")
+    data: bytes
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, status
+from typing import Literal
+
+from fastapi import APIRouter, Query, status
 
 from . import crud
 from .exceptions import (EmptySonglistHTTPException,
+                         InvalidCursorHTTPException,
                          NoMatchingSongHTTPException)
 from .models import UltrastarSong
+from .schemas import (UltrastarSongFuzzySearchResult,
+                      UltrastarSongListItem,
+                      UltrastarSongNoteStatistics,
+                      UltrastarSongPage,
+                      UltrastarSongSearchResult,
+                      UltrastarSongSuggestion)
+from ...ultrastar_file_parser import SongNotes
 from ..dependencies import AsyncSessionDep
+from ..main import song_cache, song_search_index, song_suggest_index
 
 song_router = APIRouter(
     prefix="/songs",
@@ -14,12 +25,24 @@ song_router = APIRouter(
 )
 
 
-@song_router.get("/", response_model=list[UltrastarSong])
-async def get_songs(session: AsyncSessionDep) -> list[UltrastarSong]:
-    songs = await crud.get_songs(session)
-    if not songs:
+@song_router.get("/")
+async def get_songs(
+        session: AsyncSessionDep,
+        after: str | None = None,
+        limit: int = Query(default=100, ge=1, le=500)
+) -> UltrastarSongPage:
+    try:
+        after_key = crud.decode_song_cursor(after) if after is not None else None
+    except ValueError as e:
+        raise InvalidCursorHTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # one more song than requested tells whether there is a next page
+    songs = await crud.get_songs(session, after_key, limit + 1)
+    if not songs and after is None:
         raise EmptySonglistHTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Songlist is empty")
-    return songs
+    next_cursor = crud.encode_song_cursor(songs[limit - 1]) if len(songs) > limit else None
+    return UltrastarSongPage(songs=[UltrastarSongListItem.model_validate(song, from_attributes=True)
+                                    for song in songs[:limit]],
+                             next_cursor=next_cursor)
 
 
 @song_router.get("/get-songs-by-criteria")
@@ -35,13 +58,66 @@ async def get_songs_by_criteria(
     return songs
 
 
+@song_router.get("/search")
+async def search_songs(
+        session: AsyncSessionDep,
+        query: str,
+        limit: int = Query(default=20, ge=1, le=100)
+) -> list[UltrastarSongSearchResult]:
+    songs = await crud.search_songs(session, query, limit)
+    if not songs:
+        raise NoMatchingSongHTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                          detail="Could not find songs matching the search query")
+    return songs
+
+
+@song_router.get("/fuzzy-search")
+async def fuzzy_search_songs(
+        query: str,
+        limit: int = Query(default=20, ge=1, le=100),
+        threshold: float = Query(default=0.5, gt=0, le=1)
+) -> list[UltrastarSongFuzzySearchResult]:
+    results = song_search_index.search(query, limit, threshold)
+    if not results:
+        raise NoMatchingSongHTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                          detail="Could not find songs similar to the search query")
+    return [UltrastarSongFuzzySearchResult(id=result.song_id,
+                                           title=result.title,
+                                           artist=result.artist,
+                                           similarity=result.similarity)
+            for result in results]
+
+
+@song_router.get("/suggest")
+async def suggest_songs(
+        prefix: str,
+        field: Literal["title", "artist"] | None = None,
+        limit: int = Query(default=10, ge=1, le=50)
+) -> list[UltrastarSongSuggestion]:
+    # an empty list instead of a 404, as this is requested while typing
+    return [UltrastarSongSuggestion(text=suggestion.text, field=suggestion.field)
+            for suggestion in song_suggest_index.suggest(prefix, field, limit)]
+
+
 @song_router.get("/{song_id}")
 async def get_song_by_id(
         session: AsyncSessionDep,
         song_id: int
 ) -> UltrastarSong:
-    song = await crud.get_song_by_id(session, song_id)
+    song = await song_cache.get_song_by_id(session, song_id)
     if song is None:
         raise NoMatchingSongHTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                           detail="Requested song id cannot be found in database")
     return song
+
+
+@song_router.get("/{song_id}/note-statistics")
+async def get_song_note_statistics(
+        session: AsyncSessionDep,
+        song_id: int
+) -> UltrastarSongNoteStatistics:
+    song_notes = await crud.get_song_notes(session, song_id)
+    if song_notes is None:
+        raise NoMatchingSongHTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                          detail="Requested song id has no notes in database")
+    return UltrastarSongNoteStatistics.from_song_notes(SongNotes.from_blob(song_notes.data))
@@ -1,10 +1,20 @@
-import os
-from datetime import timedelta
+from datetime import datetime, timedelta
+from typing import Literal
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, ConfigDict, computed_field
 from sqlmodel import SQLModel
 from tinytag import TinyTag
 
+from ...ultrastar_file_parser import SongNotes
+
+
+def get_audio_duration(audio_path: str) -> timedelta:
+    if not TinyTag.is_supported(audio_path):
+        raise RuntimeError({"error": f"Unsupported file extension: {audio_path}",
+                            "supported extensions": TinyTag.SUPPORTED_FILE_EXTENSIONS})
+    audio = TinyTag.get(audio_path)
+    return timedelta(seconds=round(audio.duration))
+
 
 class UltrastarSongBase(SQLModel):
     title: str
@@ -22,30 +32,123 @@ class UltrastarSongBase(SQLModel):
         return "UltrastarSongBase(\n" + repr_str + ")"
 
 
-class UltrastarSongConverter(BaseModel):
+class UltrastarSongListItem(SQLModel):
+    """A song in a list of songs, without the lyrics, which only `/songs/{song_id}` returns."""
+    id: int
     title: str
     artist: str
     audio_duration: timedelta | None = None
-    lyrics: str | None = None
-    audio: str = Field(default="", alias="mp3")
 
     model_config = ConfigDict(ser_json_timedelta='float')
 
-    def __init__(self, **data):
-        try:
-            data["audio_duration"]
-        except KeyError:
-            pass
-        else:
-            if type(data["audio_duration"]) is float:
-                data["audio_duration"] = timedelta(seconds=data["audio_duration"])
-        finally:
-            super().__init__(**data)
-
-    def set_audio_duration(self, dir_path: str) -> None:
-        audio_path = os.path.join(dir_path, self.audio)
-        if not TinyTag.is_supported(audio_path):
-            raise RuntimeError({"error": f"Unsupported file extension: {audio_path}",
-                                "supported extensions": TinyTag.SUPPORTED_FILE_EXTENSIONS})
-        audio = TinyTag.get(audio_path)
-        self.audio_duration = timedelta(seconds=round(audio.duration))
+
+class UltrastarSongPage(BaseModel):
+    songs: list[UltrastarSongListItem]
+    # pass as `after` to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+class UltrastarSongSearchResult(BaseModel):
+    id: int
+    title: str
+    artist: str
+    # lyrics around the matching words, which are enclosed in <mark></mark>, None if the lyrics did not match
+    lyrics_snippet: str | None = None
+
+
+class UltrastarSongFuzzySearchResult(BaseModel):
+    id: int
+    title: str
+    artist: str
+    # share of the trigrams of the query found in title and artist, between 0 and 1
+    similarity: float
+
+
+class UltrastarSongSuggestion(BaseModel):
+    text: str
+    field: Literal["title", "artist"]
+
+
+class ParsedSongFile(BaseModel):
+    file_path: str
+    content_hash: str
+    encoding: str | None = None
+    song: UltrastarSongBase | None = None
+    notes: bytes | None = None
+    errors: list[str] = []
+
+
+class UltrastarSongNoteStatistics(BaseModel):
+    note_count: int
+    lowest_pitch: int | None = None
+    highest_pitch: int | None = None
+    notes_per_second: float | None = None
+    golden_note_share: float | None = None
+    rap_note_share: float | None = None
+
+    @classmethod
+    def from_song_notes(cls, song_notes: SongNotes) -> "UltrastarSongNoteStatistics":
+        lowest_pitch, highest_pitch = song_notes.pitch_range() or (None, None)
+        return cls(note_count=len(song_notes),
+                   lowest_pitch=lowest_pitch,
+                   highest_pitch=highest_pitch,
+                   notes_per_second=song_notes.notes_per_second(),
+                   golden_note_share=song_notes.golden_note_share(),
+                   rap_note_share=song_notes.rap_note_share())
+
+
+class IngestionProgress(BaseModel):
+    """Counters of a running or finished sync of the song dir with the database.
+
+    Files are discovered while walking the dir, so the ETA grows as long as new files are found.
+    """
+    running: bool = False
+    discovered: int = 0
+    unchanged: int = 0
+    parsed: int = 0
+    failed: int = 0
+    inserted: int = 0
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    error: str | None = None
+
+    def start(self) -> None:
+        for name, field in self.model_fields.items():
+            setattr(self, name, field.default)
+        self.running = True
+        self.started_at = datetime.now()
+
+    def finish(self, error: str | None = None) -> None:
+        self.running = False
+        self.finished_at = datetime.now()
+        self.error = error
+
+    @computed_field
+    @property
+    def files_per_second(self) -> float | None:
+        if self.started_at is None:
+            return None
+        elapsed = ((self.finished_at or datetime.now()) - self.started_at).total_seconds()
+        return self.parsed / elapsed if elapsed > 0 else None
+
+    @computed_field
+    @property
+    def eta_seconds(self) -> float | None:
+        if not self.running:
+            return None
+        if not self.files_per_second:
+            return None
+        return (self.discovered - self.unchanged - self.parsed) / self.files_per_second
+
+
+class SongCacheStatistics(BaseModel):
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+    @computed_field
+    @property
+    def hit_rate(self) -> float | None:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
@@ -0,0 +1,254 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Literal, NamedTuple, Set, Tuple
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def normalize_search_text(value: str) -> str:
+    """Return a text in lowercase without diacritics and with words separated by single spaces.
+
+    e.g. "Motörhead - Ace of Spades!" becomes "motorhead ace of spades"
+    """
+    value = value.casefold()
+    if not value.isascii():
+        decomposed = unicodedata.normalize("NFKD", value)
+        value = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC.sub(" ", value).strip()
+
+
+def get_trigrams(normalized_text: str) -> Set[str]:
+    """Return the trigrams of the words of a normalized text, padded like pg_trgm.
+
+    e.g. "wolf" has the trigrams "  w", " wo", "wol", "olf" and "lf "
+    """
+    trigrams = set()
+    for word in normalized_text.split():
+        padded_word = f"  {word} "
+        trigrams.update(padded_word[i:i + 3] for i in range(len(padded_word) - 2))
+    return trigrams
+
+
+class TrigramSearchResult(NamedTuple):
+    song_id: int
+    title: str
+    artist: str
+    similarity: float
+
+
+class TrigramIndex:
+    """
+    An in-memory index of the trigrams of the titles and artists of songs for typo-tolerant search.
+
+    The similarity of a song to a query is the share of the trigrams of the query found in the title and artist
+    of the song, so "powerwolff" finds "Powerwolf" and "hallelulah" finds "Hardrock Hallelujah".
+    Songs with the same similarity are ranked by the share of their own trigrams matched, i.e. shorter first.
+
+    Methods
+    ----------
+    def rebuild(self, songs: Iterable[Tuple[int, str, str]]) -> None
+        Replace all songs of the index.
+
+    def add(self, song_id: int, title: str, artist: str) -> None
+        Add a song to the index or replace it.
+
+    def remove(self, song_id: int) -> None
+        Remove a song from the index.
+
+    def search(self, query: str, limit: int = 20, threshold: float = 0.5) -> List[TrigramSearchResult]
+        Return the songs with at least the threshold similarity to the query, best match first.
+    """
+
+    def __init__(self, songs: Iterable[Tuple[int, str, str]] = ()):
+        self._song_ids_by_trigram: Dict[str, Set[int]] = {}
+        self._trigrams_by_song_id: Dict[int, Set[str]] = {}
+        self._songs_by_id: Dict[int, Tuple[str, str]] = {}
+        self.rebuild(songs)
+
+    def __len__(self) -> int:
+        return len(self._songs_by_id)
+
+    def __contains__(self, song_id: int) -> bool:
+        return song_id in self._songs_by_id
+
+    def rebuild(self, songs: Iterable[Tuple[int, str, str]]) -> None:
+        self.clear()
+        for song_id, title, artist in songs:
+            self.add(song_id, title, artist)
+
+    def add(self, song_id: int, title: str, artist: str) -> None:
+        if song_id in self._songs_by_id:
+            self.remove(song_id)
+        trigrams = get_trigrams(normalize_search_text(f"{title} {artist}"))
+        for trigram in trigrams:
+            self._song_ids_by_trigram.setdefault(trigram, set()).add(song_id)
+        self._trigrams_by_song_id[song_id] = trigrams
+        self._songs_by_id[song_id] = (title, artist)
+
+    def remove(self, song_id: int) -> None:
+        for trigram in self._trigrams_by_song_id.pop(song_id, ()):
+            song_ids = self._song_ids_by_trigram[trigram]
+            song_ids.discard(song_id)
+            if not song_ids:
+                del self._song_ids_by_trigram[trigram]
+        self._songs_by_id.pop(song_id, None)
+
+    def clear(self) -> None:
+        self._song_ids_by_trigram.clear()
+        self._trigrams_by_song_id.clear()
+        self._songs_by_id.clear()
+
+    def search(self, query: str, limit: int = 20, threshold: float = 0.5) -> List[TrigramSearchResult]:
+        query_trigrams = get_trigrams(normalize_search_text(query))
+        if not query_trigrams:
+            return []
+        query_trigram_count = len(query_trigrams)
+        min_shared_trigrams = max(math.ceil(threshold * query_trigram_count), 1)
+        song_id_sets = sorted((self._song_ids_by_trigram.get(trigram, set()) for trigram in query_trigrams), key=len)
+        # a song sharing min_shared_trigrams trigrams with the query has at least one of the
+        # query_trigram_count - min_shared_trigrams + 1 rarest ones, so only those songs are candidates
+        # and the trigrams shared by many songs are only counted for the candidates
+        rare_trigram_count = query_trigram_count - min_shared_trigrams + 1
+        shared_trigram_counts: Counter[int] = Counter()
+        for song_ids in song_id_sets[:rare_trigram_count]:
+            shared_trigram_counts.update(song_ids)
+        candidate_song_ids = set(shared_trigram_counts)
+        for song_ids in song_id_sets[rare_trigram_count:]:
+            shared_trigram_counts.update(song_ids & candidate_song_ids)
+
+        matches = [(shared_trigrams, song_id) for song_id, shared_trigrams in shared_trigram_counts.items()
+                   if shared_trigrams >= min_shared_trigrams]
+        trigrams_by_song_id = self._trigrams_by_song_id
+        best_matches = heapq.nlargest(limit, matches,
+                                      key=lambda match: (match[0], match[0] / len(trigrams_by_song_id[match[1]])))
+
+        results = []
+        for shared_trigrams, song_id in best_matches:
+            title, artist = self._songs_by_id[song_id]
+            results.append(TrigramSearchResult(song_id, title, artist, shared_trigrams / query_trigram_count))
+        return results
+
+
+SongField = Literal["title", "artist"]
+
+
+class Suggestion(NamedTuple):
+    text: str
+    field: SongField
+
+
+class PrefixIndex:
+    """
+    An in-memory index of the normalized titles and artists of songs, sorted to complete prefixes with bisect.
+
+    Titles and artists starting with the prefix are suggested first, then those with a later word starting with it,
+    so "hall" suggests "Hallelujah" before "Hardrock Hallelujah".
+    Titles and artists shared by several songs are only stored once and counted.
+
+    Methods
+    ----------
+    def rebuild(self, songs: Iterable[Tuple[int, str, str]]) -> None
+        Replace all songs of the index, faster than adding them one by one.
+
+    def add(self, song_id: int, title: str, artist: str) -> None
+        Add a song to the index or replace it.
+
+    def remove(self, song_id: int) -> None
+        Remove a song from the index.
+
+    def suggest(self, prefix: str, field: SongField | None = None, limit: int = 10) -> List[Suggestion]
+        Return distinct titles and artists with a word starting with the prefix.
+    """
+
+    def __init__(self, songs: Iterable[Tuple[int, str, str]] = ()):
+        # sorted (normalized text, original text) of whole texts and from their second word on
+        self._entries: Dict[Tuple[SongField, bool], List[Tuple[str, str]]] = {
+            (field, is_start): [] for field in ("title", "artist") for is_start in (True, False)
+        }
+        self._entry_counts: Dict[Tuple[SongField, bool, str, str], int] = {}
+        self._songs_by_id: Dict[int, Tuple[str, str]] = {}
+        self.rebuild(songs)
+
+    def __len__(self) -> int:
+        return len(self._songs_by_id)
+
+    def __contains__(self, song_id: int) -> bool:
+        return song_id in self._songs_by_id
+
+    @staticmethod
+    def _get_song_entries(title: str, artist: str) -> Set[Tuple[SongField, bool, str, str]]:
+        entries = set()
+        for field, text in (("title", title), ("artist", artist)):
+            words = normalize_search_text(text).split()
+            entries.update((field, i == 0, " ".join(words[i:]), text) for i in range(len(words)))
+        return entries
+
+    def _count_entries(self, song_id: int, title: str, artist: str) -> Iterator[Tuple[SongField, bool, str, str]]:
+        """Count the entries of a song and yield those that are new to the index."""
+        for entry in self._get_song_entries(title, artist):
+            if entry not in self._entry_counts:
+                yield entry
+            self._entry_counts[entry] = self._entry_counts.get(entry, 0) + 1
+        self._songs_by_id[song_id] = (title, artist)
+
+    def rebuild(self, songs: Iterable[Tuple[int, str, str]]) -> None:
+        self.clear()
+        for song_id, title, artist in songs:
+            for field, is_start, normalized_text, text in self._count_entries(song_id, title, artist):
+                self._entries[field, is_start].append((normalized_text, text))
+        for entries in self._entries.values():
+            entries.sort()
+
+    def add(self, song_id: int, title: str, artist: str) -> None:
+        self.remove(song_id)
+        for field, is_start, normalized_text, text in self._count_entries(song_id, title, artist):
+            bisect.insort(self._entries[field, is_start], (normalized_text, text))
+
+    def remove(self, song_id: int) -> None:
+        if song_id not in self._songs_by_id:
+            return
+        title, artist = self._songs_by_id.pop(song_id)
+        for entry in self._get_song_entries(title, artist):
+            self._entry_counts[entry] -= 1
+            if not self._entry_counts[entry]:
+                del self._entry_counts[entry]
+                field, is_start, normalized_text, text = entry
+                entries = self._entries[field, is_start]
+                del entries[bisect.bisect_left(entries, (normalized_text, text))]
+
+    def clear(self) -> None:
+        for entries in self._entries.values():
+            entries.clear()
+        self._entry_counts.clear()
+        self._songs_by_id.clear()
+
+    def _iter_matching_entries(self,
+                               field: SongField,
+                               is_start: bool,
+                               normalized_prefix: str) -> Iterator[Tuple[str, str, SongField]]:
+        entries = self._entries[field, is_start]
+        for i in range(bisect.bisect_left(entries, (normalized_prefix,)), len(entries)):
+            normalized_text, text = entries[i]
+            if not normalized_text.startswith(normalized_prefix):
+                return
+            yield normalized_text, text, field
+
+    def suggest(self, prefix: str, field: SongField | None = None, limit: int = 10) -> List[Suggestion]:
+        normalized_prefix = normalize_search_text(prefix)
+        if not normalized_prefix:
+            return []
+        fields: Tuple[SongField, ...] = (field,) if field is not None else ("title", "artist")
+        # a text matches once for every word starting with the prefix, the dict keeps the first match
+        suggestions: Dict[Suggestion, None] = {}
+        for is_start in (True, False):
+            matching_entries = heapq.merge(*(self._iter_matching_entries(field, is_start, normalized_prefix)
+                                             for field in fields))
+            for _, text, field in matching_entries:
+                suggestions.setdefault(Suggestion(text, field))
+                if len(suggestions) >= limit:
+                    return list(suggestions)
+        return list(suggestions)
@@ -0,0 +1,264 @@
+import asyncio
+import contextlib
+import os
+from typing import ContextManager, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .cache import SongCache
+from .crud import (add_or_update_song_files,
+                   add_or_update_song_notes,
+                   add_songs_if_not_in_db,
+                   get_song_files,
+                   get_song_ids_by_key,
+                   get_song_key,
+                   remove_song_files,
+                   update_songs)
+from .ingestion import parse_song_files
+from .models import UltrastarSong, UltrastarSongFile, UltrastarSongNotes
+from .schemas import IngestionProgress, ParsedSongFile, UltrastarSongBase
+from .search_index import PrefixIndex, TrigramIndex
+from ..config import settings
+from ..dependencies import get_async_session
+from ...logging.controller import get_db_logger
+from ...ultrastar_file_parser import UltrastarFileParser
+from ...ultrastar_file_parser.cache import ParseResultCache
+
+db_logger = get_db_logger()
+
+
+def is_song_file_unchanged(song_file: UltrastarSongFile | None, file_stat: os.stat_result) -> bool:
+    return (song_file is not None
+            and song_file.size == file_stat.st_size
+            and song_file.mtime_ns == file_stat.st_mtime_ns)
+
+
+def is_path_below(path: str, dir_paths: Iterable[str]) -> bool:
+    """Return whether a path is one of the given paths or below one of them."""
+    return any(path == dir_path or path.startswith(os.path.join(dir_path, "")) for dir_path in dir_paths)
+
+
+# parsed song files stored in the database per transaction
+INGESTION_BATCH_SIZE = 500
+
+
+def forget_song_keys(song_ids_by_key: Dict[Tuple[str, str], int], song_ids: Iterable[int]) -> None:
+    song_ids = set(song_ids)
+    if song_ids:
+        for key in [key for key, song_id in song_ids_by_key.items() if song_id in song_ids]:
+            del song_ids_by_key[key]
+
+
+def log_removed_songs(songs: Iterable[UltrastarSong],
+                      search_indexes: Sequence[TrigramIndex | PrefixIndex] = (),
+                      song_cache: SongCache | None = None) -> None:
+    for song in songs:
+        db_logger.info(f"{song.title} by {song.artist} removed from db")
+        for search_index in search_indexes:
+            search_index.remove(song.id)
+        if song_cache is not None:
+            song_cache.invalidate([song.id])
+
+
+async def store_parsed_song_files(session: AsyncSession,
+                                  parsed_song_files: List[ParsedSongFile],
+                                  song_files: Mapping[str, UltrastarSongFile],
+                                  file_stats: Mapping[str, os.stat_result],
+                                  song_ids_by_key: Dict[Tuple[str, str], int],
+                                  search_indexes: Sequence[TrigramIndex | PrefixIndex] = (),
+                                  song_cache: SongCache | None = None) -> int:
+    """Store a batch of parsed song files with their songs, notes and manifest entries in one transaction.
+
+    Returns the number of added songs.
+
+    `song_ids_by_key` holds the ids of all songs in the database by their key and is kept up to date,
+    so new songs are deduplicated against it instead of querying the database for each of them.
+    Added, updated and removed songs are applied to `search_indexes` and updated and removed songs are
+    invalidated in `song_cache` once the transaction is committed.
+    """
+    new_song_files: List[UltrastarSongFile] = []
+    unlinked_paths: List[str] = []
+    updated_song_bases: Dict[int, UltrastarSongBase] = {}
+    updated_song_ids_by_key: Dict[Tuple[str, str], int] = {}
+    updated_notes: Dict[int, bytes | None] = {}
+    added_song_files: List[Tuple[UltrastarSongFile, ParsedSongFile]] = []
+    existing_song_ids = set(song_ids_by_key.values())
+
+    for parsed_song_file in parsed_song_files:
+        file_path = parsed_song_file.file_path
+        song_file = song_files.get(file_path)
+        new_song_file = UltrastarSongFile(path=file_path,
+                                          size=file_stats[file_path].st_size,
+                                          mtime_ns=file_stats[file_path].st_mtime_ns,
+                                          content_hash=parsed_song_file.content_hash,
+                                          encoding=parsed_song_file.encoding,
+                                          song_id=song_file.song_id if song_file else None)
+        new_song_files.append(new_song_file)
+        if song_file is not None and song_file.content_hash == parsed_song_file.content_hash:
+            continue
+
+        for error in parsed_song_file.errors:
+            db_logger.error(error)
+        if parsed_song_file.song is None:
+            if new_song_file.song_id is not None:
+                unlinked_paths.append(file_path)
+                new_song_file.song_id = None
+        elif new_song_file.song_id in existing_song_ids:
+            song_id = new_song_file.song_id
+            key = get_song_key(parsed_song_file.song.title, parsed_song_file.song.artist)
+            if song_ids_by_key.get(key, song_id) != song_id or updated_song_ids_by_key.get(key, song_id) != song_id:
+                # changed to the title and artist of another song, the unique index allows only one of them
+                unlinked_paths.append(file_path)
+                new_song_file.song_id = None
+                added_song_files.append((new_song_file, parsed_song_file))
+                continue
+            updated_song_ids_by_key[key] = song_id
+            updated_song_bases[song_id] = parsed_song_file.song
+            updated_notes[song_id] = parsed_song_file.notes
+        else:
+            added_song_files.append((new_song_file, parsed_song_file))
+
+    removed_songs = await remove_song_files(session, unlinked_paths)
+    forget_song_keys(song_ids_by_key, (song.id for song in removed_songs))
+    log_removed_songs(removed_songs, search_indexes, song_cache)
+
+    await update_songs(session, updated_song_bases)
+    forget_song_keys(song_ids_by_key, updated_song_bases.keys())
+    for song_id, song_base in updated_song_bases.items():
+        song_ids_by_key[get_song_key(song_base.title, song_base.artist)] = song_id
+        db_logger.info(f"{song_base.title} by {song_base.artist} updated in db")
+
+    added_song_bases = await add_songs_if_not_in_db(session,
+                                                    (parsed.song for _, parsed in added_song_files),
+                                                    song_ids_by_key)
+    for song_base in added_song_bases:
+        db_logger.info(f"{song_base.title} by {song_base.artist} added to db")
+    added_keys = {get_song_key(song_base.title, song_base.artist) for song_base in added_song_bases}
+    new_notes: Dict[int, bytes | None] = {}
+    for new_song_file, parsed_song_file in added_song_files:
+        song_base = parsed_song_file.song
+        key = get_song_key(song_base.title, song_base.artist)
+        if key in added_keys:
+            added_keys.remove(key)
+        else:
+            db_logger.info(f"{song_base.title} by {song_base.artist} already in db")
+        new_song_file.song_id = song_ids_by_key[key]
+        new_notes[new_song_file.song_id] = parsed_song_file.notes
+
+    await add_or_update_song_notes(session, [UltrastarSongNotes(song_id=song_id, data=notes)
+                                                   for song_id, notes in (updated_notes | new_notes).items()
+                                                   if notes is not None])
+    await add_or_update_song_files(session, new_song_files)
+    await session.commit()
+
+    if song_cache is not None:
+        song_cache.invalidate(updated_song_bases.keys())
+    for search_index in search_indexes:
+        for song_id, song_base in updated_song_bases.items():
+            search_index.add(song_id, song_base.title, song_base.artist)
+        for song_base in added_song_bases:
+            search_index.add(song_ids_by_key[get_song_key(song_base.title, song_base.artist)],
+                             song_base.title, song_base.artist)
+    return len(added_song_bases)
+
+
+def open_parse_cache() -> ContextManager[ParseResultCache | None]:
+    """Return the configured parse result cache to use in a with statement, None if it is disabled."""
+    if not settings.PARSE_CACHE_PATH:
+        return contextlib.nullcontext()
+    return ParseResultCache(settings.PARSE_CACHE_PATH)
+
+
+async def sync_song_dir(dir_path: str,
+                        missing_ok: bool = False,
+                        progress: IngestionProgress | None = None,
+                        search_indexes: Sequence[TrigramIndex | PrefixIndex] = (),
+                        song_cache: SongCache | None = None) -> None:
+    """Bring the songs of all Ultrastar files below a dir in sync with the database.
+
+    Files that are unchanged according to the manifest are skipped, changed and new files are parsed
+    and songs of files that no longer exist are removed. Songs of files in dirs that cannot be listed
+    or files that cannot be read are kept, as they may still exist.
+    With `missing_ok` a dir that does not exist (anymore) removes all songs that were below it
+    instead of raising a FileNotFoundError.
+    A dir below the song dir is walked with the exclude patterns and max depth measured from the song dir,
+    so it is synced with the same files a sync of the whole song dir finds in it.
+    The counters of `progress` are updated while the sync runs and `search_indexes` and `song_cache`
+    are kept up to date.
+    """
+    progress = progress or IngestionProgress()
+    dir_path = os.path.abspath(dir_path) if dir_path else dir_path
+    song_dir = os.path.abspath(settings.PATH_TO_ULTRASTAR_SONG_DIR)
+    root_dir = song_dir if is_path_below(dir_path, [song_dir]) else dir_path
+    unreadable_paths: List[str] = []
+
+    def skip_unreadable_path(path: str, error: OSError) -> None:
+        db_logger.error(f"Could not read {path}: {error}")
+        unreadable_paths.append(path)
+
+    if missing_ok and not os.path.isdir(dir_path):
+        file_paths = iter(())
+    else:
+        file_paths = UltrastarFileParser.iter_song_file_paths(dir_path,
+                                                              include=settings.SONG_FILE_PATTERNS,
+                                                              exclude=settings.SONG_DIR_EXCLUDE_PATTERNS,
+                                                              max_depth=settings.SONG_DIR_MAX_DEPTH,
+                                                              check_header=False,
+                                                              on_error=skip_unreadable_path,
+                                                              root_dir=root_dir)
+    file_stats: Dict[str, os.stat_result] = {}
+
+    with open_parse_cache() as cache:
+        # https://stackoverflow.com/questions/56161595/how-to-use-async-for-in-python
+        async for session in get_async_session():
+            # the whole song dir also covers files that were ingested from a previously configured song dir
+            is_song_dir = dir_path == song_dir
+            song_files = {song_file.path: song_file
+                          for song_file in await get_song_files(session, None if is_song_dir else dir_path)}
+
+            def iter_changed_file_paths() -> Iterator[str]:
+                """Yield the changed files while walking the dir, so parsing starts with the first one found.
+
+                Advanced in a worker thread by `parse_song_files`, so walking and stating the files does not block
+                the event loop.
+                """
+                for file_path in file_paths:
+                    try:
+                        file_stat = os.stat(file_path)
+                    except OSError as e:
+                        skip_unreadable_path(file_path, e)
+                        continue
+                    file_stats[file_path] = file_stat
+                    progress.discovered += 1
+                    if is_song_file_unchanged(song_files.get(file_path), file_stat):
+                        progress.unchanged += 1
+                    else:
+                        yield file_path
+
+            encodings = {file_path: (song_file.encoding, song_file.content_hash)
+                         for file_path, song_file in song_files.items()}
+            song_ids_by_key = await get_song_ids_by_key(session)
+            batch: List[ParsedSongFile] = []
+            async for parsed_song_file in parse_song_files(iter_changed_file_paths(),
+                                                           workers=settings.INGESTION_WORKERS,
+                                                           encodings=encodings,
+                                                           cache=cache,
+                                                           duration_source=settings.SONG_DURATION_SOURCE):
+                progress.parsed += 1
+                if parsed_song_file.song is None and parsed_song_file.errors:
+                    progress.failed += 1
+                batch.append(parsed_song_file)
+                if len(batch) >= INGESTION_BATCH_SIZE:
+                    progress.inserted += await store_parsed_song_files(session, batch, song_files, file_stats,
+                                                                       song_ids_by_key, search_indexes, song_cache)
+                    batch = []
+            progress.inserted += await store_parsed_song_files(session, batch, song_files, file_stats,
+                                                               song_ids_by_key, search_indexes, song_cache)
+
+            removed_paths = [path for path in song_files.keys() - file_stats.keys()
+                             if not is_path_below(path, unreadable_paths)]
+            removed_songs = await remove_song_files(session, removed_paths)
+            await session.commit()
+            log_removed_songs(removed_songs, search_indexes, song_cache)
+            if cache is not None:
+                await asyncio.to_thread(cache.evict_missing, dir_path, file_stats.keys())
@@ -0,0 +1,77 @@
+import asyncio
+import fnmatch
+import os
+import time
+from typing import Dict, Iterable, List, Sequence
+
+from watchfiles import Change, awatch
+
+from .cache import SongCache
+from .search_index import PrefixIndex, TrigramIndex
+from .service import sync_song_dir
+from ..config import settings
+from ...logging.controller import get_db_logger
+
+db_logger = get_db_logger()
+
+
+def get_affected_dir(change: Change, path: str, file_patterns: Sequence[str]) -> str:
+    """Return the dir that has to be synced for a changed path.
+
+    Changed files affect the song folder they are in. Deleted paths not matching one of the
+    `file_patterns` of song files are treated as dirs, so removing a song folder does not sync
+    the folder containing it.
+    """
+    if os.path.isdir(path):
+        return path
+    if change is Change.deleted and not any(fnmatch.fnmatch(os.path.basename(path), pattern)
+                                            for pattern in file_patterns):
+        return path
+    return os.path.dirname(path)
+
+
+def get_outermost_dirs(dir_paths: Iterable[str]) -> List[str]:
+    """Return the dirs that are not below one of the other dirs, syncing those covers all given dirs."""
+    outermost_dirs: List[str] = []
+    for dir_path in sorted(dir_paths):
+        if outermost_dirs and dir_path.startswith(os.path.join(outermost_dirs[-1], "")):
+            continue
+        outermost_dirs.append(dir_path)
+    return outermost_dirs
+
+
+async def watch_song_dir(song_dir: str,
+                         quiet_seconds: float,
+                         stop_event: asyncio.Event | None = None,
+                         search_indexes: Sequence[TrigramIndex | PrefixIndex] = (),
+                         song_cache: SongCache | None = None) -> None:
+    """Sync song folders below the song dir with the database as soon as they changed.
+
+    A folder is only synced after no event occurred in or below it for `quiet_seconds`, so a folder that is
+    still being copied is parsed once when it is complete and bursts of events do not cause a full rescan.
+    """
+    song_dir = os.path.abspath(song_dir)
+    last_change_per_dir: Dict[str, float] = {}
+    timeout_ms = max(int(quiet_seconds * 1000), 100)
+    async for changes in awatch(song_dir, stop_event=stop_event, rust_timeout=timeout_ms, yield_on_timeout=True):
+        now = time.monotonic()
+        for change, path in changes:
+            affected_dir = get_affected_dir(change, path, settings.SONG_FILE_PATTERNS)
+            if not affected_dir.startswith(os.path.join(song_dir, "")):
+                continue
+            last_change_per_dir[affected_dir] = now
+            # a pending dir, e.g. a song pack moved in, is not quiet while something below it still changes
+            for dir_path in last_change_per_dir:
+                if affected_dir.startswith(os.path.join(dir_path, "")):
+                    last_change_per_dir[dir_path] = now
+
+        quiet_dirs = [dir_path for dir_path, last_change in last_change_per_dir.items()
+                      if now - last_change >= quiet_seconds]
+        for dir_path in quiet_dirs:
+            del last_change_per_dir[dir_path]
+        for dir_path in get_outermost_dirs(quiet_dirs):
+            db_logger.info(f"Syncing changed song folder: {dir_path}")
+            try:
+                await sync_song_dir(dir_path, missing_ok=True, search_indexes=search_indexes, song_cache=song_cache)
+            except OSError as e:
+                db_logger.error(f"Could not sync {dir_path}: {e}")
@@ -2,4 +2,6 @@
 This package provides the tools necessary for parsing Ultrastar files for their attributes.
 """
 
+from .events import EndOfFile, EndOfPhrase, HeaderAttribute, Note, NoteType, PlayerSwitch, UltrastarEvent
+from .notes import SongNotes, get_song_duration_in_seconds
 from .parser import UltrastarFileParser
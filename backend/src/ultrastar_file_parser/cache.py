@@ -0,0 +1,105 @@
+"""An on-disk cache for the results of parsing Ultrastar files.
+
+Examples
+--------
+>>> with ParseResultCache("parse_cache.sqlite") as cache:
+>>>     file_stat = os.stat(path)
+>>>     cached = cache.get(path, file_stat.st_size, file_stat.st_mtime_ns)
+>>>     if cached is None:
+>>>         attr_dict = UltrastarFileParser.parse_file_for_ultrastar_song_attributes(path)
+>>>         cache.put(path, file_stat.st_size, file_stat.st_mtime_ns, attr_dict)
+"""
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, NamedTuple
+
+
+class CachedParseResult(NamedTuple):
+    """The values cached for a file, a JSON compatible dictionary and an optional binary blob."""
+    values: Dict[str, Any]
+    blob: bytes | None = None
+
+
+class ParseResultCache:
+    """
+    A SQLite file holding parse results keyed by the path, size and modification time of the parsed file.
+
+    A result is only returned as long as size and modification time of the file are unchanged,
+    so a hit means the file does not have to be read at all.
+    Writes are committed in batches and on `close`; the cache can be deleted at any time.
+
+    Methods
+    ----------
+    def get(self, file_path: str, size: int, mtime_ns: int) -> CachedParseResult | None
+        Return the cached result for a file, None if there is none for this size and modification time.
+
+    def put(self, file_path: str, size: int, mtime_ns: int, values: Dict[str, Any], blob: bytes | None = None)
+        Cache the result for a file.
+
+    def evict_missing(self, dir_path: str, existing_paths: Iterable[str]) -> int
+        Remove the results of files below a dir that are not among the existing paths.
+    """
+
+    COMMIT_EVERY: int = 500
+
+    def __init__(self, db_path: str):
+        # used by one thread at a time, but not only by the one opening it, e.g. while ingesting in a worker thread
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS parse_result ("
+                                 "path TEXT PRIMARY KEY, "
+                                 "size INTEGER NOT NULL, "
+                                 "mtime_ns INTEGER NOT NULL, "
+                                 "vals TEXT NOT NULL, "
+                                 "blob BLOB)")
+        self._connection.commit()
+        self._uncommitted = 0
+
+    def __enter__(self) -> "ParseResultCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, file_path: str, size: int, mtime_ns: int) -> CachedParseResult | None:
+        row = self._connection.execute("SELECT vals, blob FROM parse_result "
+                                       "WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                       (file_path, size, mtime_ns)).fetchone()
+        if row is None:
+            return None
+        values, blob = row
+        return CachedParseResult(json.loads(values), blob)
+
+    def put(self, file_path: str, size: int, mtime_ns: int, values: Dict[str, Any], blob: bytes | None = None) -> None:
+        self._connection.execute("INSERT OR REPLACE INTO parse_result (path, size, mtime_ns, vals, blob) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 (file_path, size, mtime_ns, json.dumps(values), blob))
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_EVERY:
+            self.commit()
+
+    def evict_missing(self, dir_path: str, existing_paths: Iterable[str]) -> int:
+        """Remove the results of files below a dir that are not among the existing paths.
+
+        Returns the number of removed results.
+        """
+        existing_paths = set(existing_paths)
+        prefix = os.path.join(dir_path, "")
+        cached_paths = [path for path, in self._connection.execute("SELECT path FROM parse_result "
+                                                                   "WHERE substr(path, 1, ?) = ?",
+                                                                   (len(prefix), prefix))]
+        missing_paths = [(path,) for path in cached_paths if path not in existing_paths]
+        self._connection.executemany("DELETE FROM parse_result WHERE path = ?", missing_paths)
+        self.commit()
+        return len(missing_paths)
+
+    def commit(self) -> None:
+        self._connection.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self._connection.close()
@@ -0,0 +1,66 @@
+"""Events yielded while streaming through an Ultrastar file.
+
+Examples
+--------
+>>> for event in UltrastarFileParser.iter_file_events("./ultrastarfile_1.txt"):
+>>>     print(event)
+HeaderAttribute(attribute='title', value='Best Title Ever')
+...
+PlayerSwitch(player=1)
+Note(note_type=<NoteType.NORMAL: ':'>, start_beat=0, length=4, pitch=8, lyrics='Best ')
+EndOfPhrase(start_beat=6, end_beat=None)
+...
+EndOfFile()
+"""
+
+from enum import Enum
+from typing import NamedTuple, Union
+
+
+class NoteType(str, Enum):
+    """
+    The type of a note, named after the first character of its sing line.
+
+    References
+    ----------
+    https://usdx.eu/format/#specs (accessesed at 27.07.2024)
+    """
+
+    NORMAL = ":"
+    GOLDEN = "*"
+    FREESTYLE = "F"
+    RAP = "R"
+    RAP_GOLDEN = "G"
+
+
+class HeaderAttribute(NamedTuple):
+    """An attribute line, e.g. '#TITLE:Best Title Ever'. The attribute is saved as lowercase."""
+    attribute: str
+    value: str
+
+
+class Note(NamedTuple):
+    """A sing line, e.g. ': 0 4 8 Best '. The lyrics are kept as in the file, including `~`."""
+    note_type: NoteType
+    start_beat: int
+    length: int
+    pitch: int
+    lyrics: str
+
+
+class EndOfPhrase(NamedTuple):
+    """A line marking the end of a phrase, e.g. '- 6' or '- 6 8'."""
+    start_beat: int
+    end_beat: int | None = None
+
+
+class PlayerSwitch(NamedTuple):
+    """A player delimiter line, e.g. 'P1'. The following notes are sung by this player."""
+    player: int
+
+
+class EndOfFile(NamedTuple):
+    """The line 'E' or the end of the file, whichever comes first. Always the last event."""
+
+
+UltrastarEvent = Union[HeaderAttribute, Note, EndOfPhrase, PlayerSwitch, EndOfFile]
@@ -0,0 +1,216 @@
+"""Compact storage of the notes of an Ultrastar song.
+
+The notes are kept in parallel typed `array` columns instead of one Python object per note,
+so the notes of a whole library fit into a few bytes per note and can be saved as a binary blob.
+
+Examples
+--------
+Collect the notes while parsing the attributes and save them.
+
+>>> song_notes = SongNotes()
+>>> attr_dict = UltrastarFileParser.parse_file_for_ultrastar_song_attributes(path, song_notes=song_notes)
+>>> blob = song_notes.to_blob()
+
+Compute the duration of the song without opening its audio file.
+
+>>> get_song_duration_in_seconds(attr_dict, song_notes)
+214.5
+
+Load them again and compute statistics.
+
+>>> song_notes = SongNotes.from_blob(blob)
+>>> song_notes.pitch_range()
+(-2, 14)
+>>> song_notes.notes_per_second()
+2.7
+"""
+
+import struct
+import sys
+from array import array
+from typing import Iterable, Mapping, Tuple
+
+from .events import HeaderAttribute, Note, NoteType, PlayerSwitch, UltrastarEvent
+
+# note types are stored as a one byte flag, the index of the type in `NoteType`
+NOTE_TYPE_FLAGS = {note_type: flag for flag, note_type in enumerate(NoteType)}
+
+# magic, version, number of notes, bpm, gap in ms; followed by the columns in `SongNotes.COLUMNS` order
+_BLOB_HEADER = struct.Struct("<4sBIdd")
+_BLOB_MAGIC = b"USNT"
+_BLOB_VERSION = 1
+
+
+def _parse_number(value: str) -> float:
+    """Return a float from an Ultrastar header value, which may use a decimal comma."""
+    return float(value.replace(",", "."))
+
+
+class SongNotes:
+    """
+    The notes of an Ultrastar song in parallel typed columns.
+
+    Attributes
+    ----------
+    start_beats : array
+        The beat each note starts at (int32).
+    lengths : array
+        The length of each note in beats (int32).
+    pitches : array
+        The pitch of each note (int16).
+    note_types : array
+        The flag of the `NoteType` of each note (uint8), see `NOTE_TYPE_FLAGS`.
+    players : array
+        The player singing each note (uint8), 0 if the song has no player delimiters.
+    bpm : float
+        The beats per minute from the `#BPM` header, 0 if missing.
+    gap : float
+        The milliseconds before beat 0 from the `#GAP` header.
+    """
+
+    COLUMNS: Tuple[Tuple[str, str], ...] = (
+        ("start_beats", "i"),
+        ("lengths", "i"),
+        ("pitches", "h"),
+        ("note_types", "B"),
+        ("players", "B"),
+    )
+
+    __slots__ = tuple(name for name, _ in COLUMNS) + ("bpm", "gap", "_current_player")
+
+    def __init__(self, bpm: float = 0, gap: float = 0):
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array(typecode))
+        self.bpm = bpm
+        self.gap = gap
+        self._current_player = 0
+
+    def __len__(self) -> int:
+        return len(self.start_beats)
+
+    def add_event(self, event: UltrastarEvent) -> None:
+        """Add a note, or take the bpm, gap or current player from an event of the streaming parser."""
+        if type(event) is Note:
+            self.start_beats.append(event.start_beat)
+            self.lengths.append(event.length)
+            self.pitches.append(event.pitch)
+            self.note_types.append(NOTE_TYPE_FLAGS[event.note_type])
+            self.players.append(self._current_player)
+        elif type(event) is PlayerSwitch:
+            self._current_player = event.player
+        elif type(event) is HeaderAttribute:
+            try:
+                if event.attribute == "bpm":
+                    self.bpm = _parse_number(event.value)
+                elif event.attribute == "gap":
+                    self.gap = _parse_number(event.value)
+            except ValueError:
+                pass
+
+    @classmethod
+    def from_events(cls, events: Iterable[UltrastarEvent]) -> "SongNotes":
+        song_notes = cls()
+        for event in events:
+            song_notes.add_event(event)
+        return song_notes
+
+    def to_blob(self) -> bytes:
+        """Return the notes as a binary blob, which can be loaded again with `from_blob`."""
+        parts = [_BLOB_HEADER.pack(_BLOB_MAGIC, _BLOB_VERSION, len(self), self.bpm, self.gap)]
+        for name, _ in self.COLUMNS:
+            column = getattr(self, name)
+            if sys.byteorder == "big":
+                column = array(column.typecode, column)
+                column.byteswap()
+            parts.append(column.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_blob(cls, blob: bytes) -> "SongNotes":
+        """Return the notes saved in a binary blob created by `to_blob`.
+
+        Raises
+        ------
+        ValueError
+            If the blob was not created by `to_blob`.
+        """
+        try:
+            magic, version, count, bpm, gap = _BLOB_HEADER.unpack_from(blob)
+        except struct.error as e:
+            raise ValueError("Blob is too short for song notes") from e
+        if magic != _BLOB_MAGIC or version != _BLOB_VERSION:
+            raise ValueError("Blob does not contain song notes")
+        song_notes = cls(bpm=bpm, gap=gap)
+        offset = _BLOB_HEADER.size
+        for name, typecode in cls.COLUMNS:
+            column = getattr(song_notes, name)
+            end = offset + count * column.itemsize
+            if end > len(blob):
+                raise ValueError("Blob is too short for song notes")
+            column.frombytes(blob[offset:end])
+            if sys.byteorder == "big":
+                column.byteswap()
+            offset = end
+        return song_notes
+
+    def last_beat(self) -> int | None:
+        """Return the beat the last note ends at, None for a song without notes."""
+        if not self.start_beats:
+            return None
+        return max(map(int.__add__, self.start_beats, self.lengths))
+
+    def pitch_range(self) -> Tuple[int, int] | None:
+        """Return the lowest and the highest pitch, None for a song without notes."""
+        if not self.pitches:
+            return None
+        return min(self.pitches), max(self.pitches)
+
+    def beats_to_seconds(self, beats: float) -> float:
+        """Return the duration of a number of beats, an Ultrastar beat is a quarter of a `#BPM` beat."""
+        return beats * 60 / (self.bpm * 4)
+
+    def singing_duration_in_seconds(self) -> float | None:
+        """Return the seconds from the start of the first to the end of the last note."""
+        if not self.start_beats or self.bpm <= 0:
+            return None
+        return self.beats_to_seconds(self.last_beat() - min(self.start_beats))
+
+    def notes_per_second(self) -> float | None:
+        """Return the number of notes per second of singing, None if it cannot be computed."""
+        duration = self.singing_duration_in_seconds()
+        if not duration:
+            return None
+        return len(self) / duration
+
+    def note_type_share(self, *note_types: NoteType) -> float | None:
+        """Return the share of notes having one of the given types, None for a song without notes."""
+        if not self.note_types:
+            return None
+        flags = self.note_types.tobytes()
+        return sum(flags.count(NOTE_TYPE_FLAGS[note_type]) for note_type in note_types) / len(flags)
+
+    def golden_note_share(self) -> float | None:
+        return self.note_type_share(NoteType.GOLDEN, NoteType.RAP_GOLDEN)
+
+    def rap_note_share(self) -> float | None:
+        return self.note_type_share(NoteType.RAP, NoteType.RAP_GOLDEN)
+
+
+def get_song_duration_in_seconds(attr_dict: Mapping[str, str], song_notes: SongNotes | None) -> float | None:
+    """Return the seconds a song is played, computed from its header and notes instead of its audio file.
+
+    Playback starts `#START` seconds into the audio and stops at `#END` milliseconds. Without `#END` it stops
+    with the last note, which ends `#GAP` milliseconds plus the beats up to its end into the audio.
+    Returns None if neither `#END` nor the notes and a `#BPM` are available.
+    """
+    try:
+        start = _parse_number(attr_dict.get("start", "0"))
+    except ValueError:
+        start = 0
+    try:
+        end = _parse_number(attr_dict["end"]) / 1000
+    except (KeyError, ValueError):
+        if song_notes is None or not song_notes or song_notes.bpm <= 0:
+            return None
+        end = song_notes.gap / 1000 + song_notes.beats_to_seconds(song_notes.last_beat())
+    return max(end - start, 0)
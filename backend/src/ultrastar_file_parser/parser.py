@@ -4,7 +4,7 @@ Examples
 --------
 Get the paths of .txt files.
 
->>> path_list = UltrastarFileParser.get_song_file_paths(".")
+>>> path_list = list(UltrastarFileParser.iter_song_file_paths(".", check_header=False))
 ["./ultrastarfile_1.txt", "./ultrastarfile_2.txt", "./notanultrastarfile.txt"]
 
 Parse the files for Ultrastar attributes.
@@ -20,13 +20,43 @@ UltrastarMatchingError: Line does not match any Ultrastar file format: This is n
 
 """
 
+import codecs
+import fnmatch
+import io
 import os
 import re
-import tokenize
-from typing import Dict, List
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple
 
+from .events import EndOfFile, EndOfPhrase, HeaderAttribute, Note, NoteType, PlayerSwitch, UltrastarEvent
 from .exceptions import UltrastarMatchingError
-from .schemas import UltrastarFileRegexMatcher
+from .notes import SongNotes
+from .schemas import LINE_FIRST_CHARS, UltrastarFileRegexMatcher
+
+# Longer lines are read in chunks, a chunk of an overlong line does not match the Ultrastar format.
+MAX_LINE_LENGTH = 64 * 1024
+
+# Enough bytes to contain the header including a `#ENCODING` line.
+ENCODING_DETECTION_SIZE = 64 * 1024
+
+# utf-32 first, its little endian byte order mark starts with the one of utf-16
+_BOM_ENCODINGS: Tuple[Tuple[bytes, str], ...] = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+_ENCODING_HEADER = re.compile(rb"^#ENCODING:[ \t]*([\w-]+)", re.IGNORECASE | re.MULTILINE)
+
+_NOTE_TYPES: Dict[str, NoteType] = {note_type.value: note_type for note_type in NoteType}
+
+# Compiled once at import: maps the first character of a line to its only possible format and pattern.
+_LINE_PATTERNS_BY_FIRST_CHAR: Dict[str, Tuple[UltrastarFileRegexMatcher, re.Pattern]] = {
+    first_char: (UltrastarFileRegexMatcher[line_fields.name], re.compile(line_fields.value))
+    for line_fields, first_chars in LINE_FIRST_CHARS.items()
+    for first_char in first_chars
+}
 
 
 class UltrastarFileParser:
@@ -35,68 +65,156 @@ class UltrastarFileParser:
 
     Methods
     ----------
-    def get_song_file_paths(input_dir: str) -> List[str]
-        Return all file paths starting from a given dir path that lead to a .txt file.
+    def iter_song_file_paths(cls, input_dir: str, ...) -> Iterator[str]
+        Yield the paths of Ultrastar files starting from a given dir path, while walking the dir tree.
+
+    def iter_file_events(cls, file_path: str, encoding: str = None) -> Iterator[UltrastarEvent]
+        Yield an event for every line of the Ultrastar file at the given path.
 
     def parse_file_for_ultrastar_song_attributes(cls, file_path: str) -> Dict[str, str]
         Return a dictionary with Attribute - Value pairs from an Ultrastar File.
     """
 
     @staticmethod
-    def _get_lyrics_from_sing_line(line: str) -> str:
-        """Return lyrics from line that was identified as a sing line.
+    def _classify_line(line: str) -> Tuple[UltrastarFileRegexMatcher, re.Match] | None:
+        """Return matching line format and the match holding its fields for an Ultrastarfile line.
 
-        Return lyrics from a sing line cleaned from `~` and `\n`.
+        The format is looked up by the first character of the line, so only one precompiled pattern is tried.
         """
-        _, lyrics = re.split(pattern=UltrastarFileRegexMatcher.SING_LINE.value, string=line, maxsplit=1)
-        lyrics = lyrics.replace("~", "")
-        return lyrics.replace("\n", "")
+        candidate = _LINE_PATTERNS_BY_FIRST_CHAR.get(line[:1])
+        if candidate is None:
+            return None
+        line_format, pattern = candidate
+        match = pattern.match(line)
+        if match is None:
+            return None
+        return line_format, match
 
     @staticmethod
-    def _match_line_format(line: str) -> UltrastarFileRegexMatcher | None:
-        """Return matching line format for an Ultrastarfile line."""
-        for regex in UltrastarFileRegexMatcher:
-            if re.search(regex.value, line):
-                return UltrastarFileRegexMatcher(regex)
-        return None
+    def detect_encoding(head: bytes, is_complete: bool = False) -> str:
+        """Return the encoding of an Ultrastar file from its first bytes.
 
-    @staticmethod
-    def _get_attr_and_value_from_line(attribute_line: str) -> (str, str):
-        """Return attribute and value from a line that was identified as an attribute line.
+        A byte order mark wins, then the encoding named in the `#ENCODING` header, if the head decodes with it.
+        Otherwise the head is decoded with utf-8 and cp1252, falling back to latin-1 which decodes anything.
+
+        Parameters
+        ----------
+        head : bytes
+            The first bytes of the file.
+        is_complete : bool, optional
+            Whether the head is the whole file, otherwise a multibyte character may be cut off at its end.
 
-        Return attribute and value from a line that was identified as an attribute line.
-        Attributes are saved as lowercase.
+        Returns
+        -------
+        encoding : str
+            The name of a Python codec.
         """
-        attr, value = attribute_line.split(":", 1)
-        return attr.lstrip("#").lower(), value.replace("\n", "").strip()
+        for bom, encoding in _BOM_ENCODINGS:
+            if head.startswith(bom):
+                return encoding
 
-    @staticmethod
-    def _get_file_encoding(file_path: str) -> str:
-        """Return encoding of a file at a given path."""
-        with open(file_path, "rb") as file:
+        candidates = ["utf-8", "cp1252"]
+        header_match = _ENCODING_HEADER.search(head)
+        if header_match:
             try:
-                encoding = tokenize.detect_encoding(file.readline)[0]
-            except SyntaxError:
-                encoding = "utf-8"
-        return encoding
+                candidates.insert(0, codecs.lookup(header_match[1].decode("ascii")).name)
+            except (LookupError, UnicodeDecodeError):
+                pass
+        for encoding in candidates:
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(head, final=is_complete)
+            except UnicodeDecodeError:
+                continue
+            return encoding
+        return "latin-1"
+
+    @classmethod
+    def open_file(cls, file_path: str, encoding: str = None) -> TextIO:
+        """Return the Ultrastar file at the given path opened for reading text.
+
+        Without an encoding it is detected from the first bytes with `detect_encoding`.
+        The file is opened only once, the detected encoding is available as the `encoding` of the returned file.
+        A byte after the first bytes may not fit the detected encoding, reading it raises a UnicodeDecodeError then.
+        """
+        binary_file = open(file_path, "rb")
+        try:
+            return cls._wrap_binary_file(binary_file, encoding)
+        except BaseException:
+            binary_file.close()
+            raise
+
+    @classmethod
+    def open_bytes(cls, content: bytes, encoding: str = None) -> TextIO:
+        """Return the content of an Ultrastar file that was already read as a file for reading text.
+
+        The encoding is handled as in `open_file`, so a file is read from disk only once for all of its checks.
+        """
+        return cls._wrap_binary_file(io.BytesIO(content), encoding)
+
+    @classmethod
+    def _wrap_binary_file(cls, binary_file: BinaryIO, encoding: str = None) -> TextIO:
+        if not encoding:
+            head = binary_file.read(ENCODING_DETECTION_SIZE)
+            encoding = cls.detect_encoding(head, is_complete=len(head) < ENCODING_DETECTION_SIZE)
+            binary_file.seek(0)
+        return io.TextIOWrapper(binary_file, encoding=encoding)
+
+    @classmethod
+    def has_ultrastar_header(cls, file_path: str) -> bool:
+        """Return whether the file at the given path starts with a `#`, like every Ultrastar file.
+
+        Reads only the first bytes, so files like readmes or licenses are rejected before they are parsed.
+        """
+        with open(file_path, "rb") as file:
+            return cls.starts_with_ultrastar_header(file.read(8))
 
-    # https://stackoverflow.com/questions/3207219/how-do-i-list-all-files-of-a-directory
     @staticmethod
-    def get_song_file_paths(input_dir: str) -> List[str]:
-        """Return all file paths starting from a given dir path that lead to a .txt file.
+    def starts_with_ultrastar_header(head: bytes) -> bool:
+        """Return whether the first bytes of a file start with a `#`, see `has_ultrastar_header`."""
+        for bom, encoding in _BOM_ENCODINGS:
+            if head.startswith(bom):
+                return head.decode(encoding, errors="ignore").lstrip("\ufeff").startswith("#")
+        return head.startswith(b"#")
+
+    @classmethod
+    def iter_song_file_paths(cls,
+                             input_dir: str,
+                             include: Sequence[str] = ("*.txt",),
+                             exclude: Sequence[str] = (),
+                             max_depth: int | None = None,
+                             check_header: bool = True,
+                             on_error: Callable[[str, OSError], None] | None = None,
+                             root_dir: str | None = None) -> Iterator[str]:
+        """Yield the paths of Ultrastar files starting from a given dir path, while walking the dir tree.
 
-        This function returns a list of all file paths that lead to a .txt file.
-        It searches recursivly from the given starting dir for .txt files.
+        The tree is walked with `os.scandir` and the paths are yielded as soon as they are found.
+        Symlinked dirs are followed, each dir is visited only once, so symlink loops are not followed.
+        Dirs and files that cannot be read are skipped and passed to `on_error`.
 
         Parameters
         ----------
         input_dir : str
-            The path to the directory where the search for .txt files should start.
+            The path to the directory where the search should start.
+        include : Sequence[str], optional
+            Glob patterns, a file name has to match one of them.
+        exclude : Sequence[str], optional
+            Glob patterns for file and dir names or paths relative to `input_dir` that are skipped.
+            An excluded dir is not descended into.
+        max_depth : int, optional
+            How many levels of subdirs are searched, 0 only searches `input_dir` itself. Unlimited if not given.
+        check_header : bool, optional
+            Only yield files passing `has_ultrastar_header`.
+        on_error : Callable[[str, OSError], None], optional
+            Called with the path and the error of a dir that cannot be listed or an entry that cannot be read,
+            so a caller can tell a path that is gone from one that was skipped.
+        root_dir : str, optional
+            The dir `input_dir` is in, `exclude` and `max_depth` are measured from it instead of `input_dir`,
+            so walking a subdir yields the same files as walking all of `root_dir` does below it.
 
-        Returns
-        -------
-        song_paths : list
-            A list of str that are file paths leading to a .txt file.
+        Yields
+        ------
+        song_path : str
+            A file path leading to a probable Ultrastar file.
 
         Raises
         ------
@@ -105,20 +223,181 @@ class UltrastarFileParser:
         """
         if not os.path.exists(input_dir):
             raise FileNotFoundError(f"Could not find path: {input_dir}")
-        song_paths = [os.path.join(dir_path, file)
-                      for dir_path, dir_names, files in os.walk(input_dir)
-                      for file in files
-                      if file.endswith(".txt")]
-        return song_paths
+        return cls._walk_song_file_paths(input_dir, root_dir or input_dir, include, exclude, max_depth, check_header,
+                                         on_error)
 
     @classmethod
-    def parse_file_for_ultrastar_song_attributes(cls, file_path: str, encoding: str = None) -> Dict[str, str]:
+    def _walk_song_file_paths(cls,
+                              input_dir: str,
+                              root_dir: str,
+                              include: Sequence[str],
+                              exclude: Sequence[str],
+                              max_depth: int | None,
+                              check_header: bool,
+                              on_error: Callable[[str, OSError], None] | None) -> Iterator[str]:
+        """Yield the paths of Ultrastar files, see `iter_song_file_paths`."""
+        def is_excluded(name: str, path: str) -> bool:
+            relative_path = os.path.relpath(path, root_dir).replace(os.sep, "/")
+            return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+                       for pattern in exclude)
+
+        # a subdir is only walked if the walk of the root dir would have descended into it
+        relative_dir_names = [] if input_dir == root_dir else os.path.relpath(input_dir, root_dir).split(os.sep)
+        if max_depth is not None and len(relative_dir_names) > max_depth:
+            return
+        for depth, dir_name in enumerate(relative_dir_names, start=1):
+            if is_excluded(dir_name, os.path.join(root_dir, *relative_dir_names[:depth])):
+                return
+
+        root_stat = os.stat(input_dir)
+        visited_dirs = {(root_stat.st_dev, root_stat.st_ino)}
+        dirs_to_visit = [(input_dir, len(relative_dir_names))]
+        while dirs_to_visit:
+            dir_path, depth = dirs_to_visit.pop()
+            try:
+                entries = os.scandir(dir_path)
+            except OSError as e:
+                if on_error is not None:
+                    on_error(dir_path, e)
+                continue
+            subdirs = []
+            with entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                        if (is_dir
+                                and (max_depth is None or depth < max_depth)
+                                and not is_excluded(entry.name, entry.path)):
+                            entry_stat = entry.stat()
+                            if (entry_stat.st_dev, entry_stat.st_ino) not in visited_dirs:
+                                visited_dirs.add((entry_stat.st_dev, entry_stat.st_ino))
+                                subdirs.append((entry.path, depth + 1))
+                        elif (not is_dir
+                              and any(fnmatch.fnmatch(entry.name, pattern) for pattern in include)
+                              and not is_excluded(entry.name, entry.path)
+                              and (not check_header or cls.has_ultrastar_header(entry.path))):
+                            yield entry.path
+                    except OSError as e:
+                        if on_error is not None:
+                            on_error(entry.path, e)
+            # reversed, so dirs are visited in the order they were listed
+            dirs_to_visit.extend(reversed(subdirs))
+
+    @classmethod
+    def iter_line_events(cls, lines: Iterable[str]) -> Iterator[UltrastarEvent]:
+        """Yield an event for every line of an Ultrastar file, followed by a single `EndOfFile`.
+
+        Lines after the end of file line 'E' are not read.
+
+        Parameters
+        ----------
+        lines : Iterable[str]
+            The lines of an Ultrastar file, with or without trailing newline.
+
+        Yields
+        ------
+        event : UltrastarEvent
+            A `HeaderAttribute`, `Note`, `EndOfPhrase`, `PlayerSwitch` or `EndOfFile`.
+
+        Raises
+        ------
+        UltrastarMatchingError
+            If a line does not match the Ultrastar format.
+        """
+        for line in lines:
+            classified = cls._classify_line(line)
+            if classified is None:
+                raise UltrastarMatchingError(f"Line does not match any Ultrastar file format: {line}")
+            line_format, match = classified
+            if line_format is UltrastarFileRegexMatcher.SING_LINE:
+                note_type, start_beat, length, pitch, lyrics = match.groups()
+                yield Note(_NOTE_TYPES[note_type], int(start_beat), int(length), int(pitch), lyrics)
+            elif line_format is UltrastarFileRegexMatcher.END_OF_PHRASE:
+                start_beat, end_beat = match.groups()
+                yield EndOfPhrase(int(start_beat), int(end_beat) if end_beat else None)
+            elif line_format is UltrastarFileRegexMatcher.ATTRIBUTE:
+                yield HeaderAttribute(match["attribute"].lower(), match["value"].strip())
+            elif line_format is UltrastarFileRegexMatcher.PLAYER_DELIMITER:
+                yield PlayerSwitch(int(match["player"]))
+            elif line_format is UltrastarFileRegexMatcher.END_OF_FILE:
+                break
+        yield EndOfFile()
+
+    @classmethod
+    def iter_file_events(cls, file_path: str, encoding: str = None) -> Iterator[UltrastarEvent]:
+        """Yield an event for every line of the Ultrastar file at the given path.
+
+        The file is read line by line and lines are read at most `MAX_LINE_LENGTH` characters at a time,
+        so memory stays constant even for huge or malformed files.
+        Parsing stops at the first line not matching the Ultrastar format.
+
+        Parameters
+        ----------
+        file_path : str
+            The path to the file to be parsed.
+        encoding: str, optional
+            The encoding for the file, detected with `detect_encoding` if not given.
+
+        Yields
+        ------
+        event : UltrastarEvent
+            A `HeaderAttribute`, `Note`, `EndOfPhrase`, `PlayerSwitch` or `EndOfFile`.
+
+        Raises
+        ------
+        UltrastarMatchingError
+            If a line in the file does not match the Ultrastar format.
+
+        See Also
+        -----
+        iter_line_events : Yields the events for lines from any iterable.
+        """
+        with cls.open_file(file_path, encoding) as file:
+            yield from cls.iter_text_file_events(file)
+
+    @classmethod
+    def iter_text_file_events(cls, file: TextIO) -> Iterator[UltrastarEvent]:
+        """Yield an event for every line of an opened Ultrastar file, see `iter_file_events`."""
+        yield from cls.iter_line_events(iter(lambda: file.readline(MAX_LINE_LENGTH), ""))
+
+    @classmethod
+    def collect_ultrastar_song_attributes(cls,
+                                          events: Iterable[UltrastarEvent],
+                                          song_notes: SongNotes | None = None) -> Dict[str, str]:
+        """Return a dictionary with Attribute - Value pairs from the events of an Ultrastar file.
+
+        See `parse_file_for_ultrastar_song_attributes`, which collects the events of a file at a given path.
+        """
+        ultrastar_song_attributes: Dict[str, str] = {}
+        lyrics_parts: List[str] = []
+        for event in events:
+            if song_notes is not None:
+                song_notes.add_event(event)
+            if type(event) is Note:
+                if event.lyrics:
+                    lyrics_parts.append(event.lyrics.replace("~", ""))
+            elif type(event) is HeaderAttribute:
+                ultrastar_song_attributes[event.attribute] = event.value
+            elif type(event) is EndOfPhrase:
+                if lyrics_parts and not lyrics_parts[-1].endswith(" "):
+                    lyrics_parts.append(" ")
+
+        ultrastar_song_attributes["lyrics"] = "".join(lyrics_parts)
+
+        return ultrastar_song_attributes
+
+    @classmethod
+    def parse_file_for_ultrastar_song_attributes(cls,
+                                                 file_path: str,
+                                                 encoding: str = None,
+                                                 song_notes: SongNotes | None = None) -> Dict[str, str]:
         """Return a dictionary with Attribute - Value pairs from an Ultrastar File.
 
         Parses the file at the given path for lines matching the Ultrastar file format.
         Lines matching the attribute format are saved with the attribute as key and the value as value.
         Lines matching the sing_line format are appended to the value at the key `lyrics`.
         Lines matching the player_delimiter format are currently ignored.
+        This is built on top of `iter_file_events` and `collect_ultrastar_song_attributes`.
 
         Parameters
         ----------
@@ -126,6 +405,8 @@ class UltrastarFileParser:
             The path to the file to be parsed.
         encoding: str, optional
             The encoding for the file.
+        song_notes: SongNotes, optional
+            Collects the notes of the file in the same pass.
 
         Returns
         -------
@@ -142,26 +423,4 @@ class UltrastarFileParser:
         ultrastar_file_parser.schemas.UltrastarFileRegexMatcher :
             The RegEx matching the Ultrastar line format.
         """
-        ultrastar_song_attributes: Dict[str, str] = {}
-        lyrics = ""
-        if not encoding:
-            encoding = cls._get_file_encoding(file_path)
-        with open(file_path, "r", encoding=encoding) as file:
-            for line in file:
-                regex_match = cls._match_line_format(line)
-                if regex_match is None:
-                    raise UltrastarMatchingError(f"Line does not match any Ultrastar file format: {line}")
-                if regex_match is UltrastarFileRegexMatcher.ATTRIBUTE:
-                    attr, value = cls._get_attr_and_value_from_line(line)
-                    ultrastar_song_attributes[attr] = value
-                elif regex_match is UltrastarFileRegexMatcher.SING_LINE:
-                    lyrics += cls._get_lyrics_from_sing_line(line)
-                elif regex_match is UltrastarFileRegexMatcher.END_OF_PHRASE:
-                    if lyrics and not lyrics.endswith(" "):
-                        lyrics += " "
-                elif regex_match is UltrastarFileRegexMatcher.PLAYER_DELIMITER:
-                    pass
-
-        ultrastar_song_attributes["lyrics"] = lyrics
-
-        return ultrastar_song_attributes
+        return cls.collect_ultrastar_song_attributes(cls.iter_file_events(file_path, encoding), song_notes)
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Dict
 
 
 class UltrastarFileRegexMatcher(Enum):
@@ -34,3 +35,45 @@ class UltrastarFileRegexMatcher(Enum):
     END_OF_PHRASE: str = r"^- \d+ ?\d*$"
     END_OF_FILE: str = r"^E$"
     SING_LINE: str = r"^[:*FRG] -?\d+ -?\d+ -?\d+ "
+
+
+class UltrastarFileLineFields(Enum):
+    """
+    A helper class used to classify an Ultrastar line and extract its fields with a single match.
+
+    The patterns are anchored by `re.match` and are only tried for lines starting with one of the
+    characters listed in `LINE_FIRST_CHARS`, so every line is matched against exactly one pattern.
+
+    Attributes
+    ----------
+    ATTRIBUTE : str
+        Captures `attribute` and `value`, e.g. '#TITLE:Best Title Ever'.
+    PLAYER_DELIMITER : str
+        Captures `player`, e.g. 'P1'.
+    END_OF_PHRASE : str
+        Captures `start_beat` and the optional `end_beat`, e.g. '- 5' or '- 5 8'.
+    END_OF_FILE : str
+        Captures nothing, e.g. 'E'.
+    SING_LINE : str
+        Captures `note_type`, `start_beat`, `length`, `pitch` and `lyrics`, e.g. ': 0 1 8 Normal'.
+
+    See Also
+    --------
+    UltrastarFileRegexMatcher : The RegEx only matching the Ultrastar line format.
+    """
+
+    ATTRIBUTE: str = r"#(?P<attribute>\w+):(?P<value>.*)"
+    PLAYER_DELIMITER: str = r"P(?P<player>\d+)$"
+    END_OF_PHRASE: str = r"- (?P<start_beat>\d+) ?(?P<end_beat>\d*)$"
+    END_OF_FILE: str = r"E$"
+    SING_LINE: str = r"(?P<note_type>[:*FRG]) (?P<start_beat>-?\d+) (?P<length>-?\d+) (?P<pitch>-?\d+) (?P<lyrics>.*)"
+
+
+# The characters a line of each format can start with.
+LINE_FIRST_CHARS: Dict[UltrastarFileLineFields, str] = {
+    UltrastarFileLineFields.ATTRIBUTE: "#",
+    UltrastarFileLineFields.PLAYER_DELIMITER: "P",
+    UltrastarFileLineFields.END_OF_PHRASE: "-",
+    UltrastarFileLineFields.END_OF_FILE: "E",
+    UltrastarFileLineFields.SING_LINE: ":*FRG",
+}
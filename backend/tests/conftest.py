@@ -1,4 +1,5 @@
 from datetime import timedelta, datetime
+from pathlib import Path
 from typing import Dict, Any
 from unittest.mock import patch
 
@@ -9,8 +10,9 @@ from src.app.auth.utils import get_password_hash
 from src.app.dependencies import get_async_session
 from src.app.main import app
 from src.app.queue.schemas import QueueEntry, ProcessedQueueEntry
-from src.app.songs.models import UltrastarSong
+from src.app.songs.models import UltrastarSong, UltrastarSongNotes
 from src.app.songs.schemas import UltrastarSongBase
+from src.ultrastar_file_parser import EndOfPhrase, HeaderAttribute, Note, NoteType, SongNotes
 
 
 @pytest.fixture(scope="session")
@@ -56,6 +58,16 @@ def song_without_audio_duration_base() -> UltrastarSongBase:
                              lyrics="They called me the Leather Apron, they called me Smiling Jack")
 
 
+@pytest.fixture()
+def song1_notes(song1) -> UltrastarSongNotes:
+    song_notes = SongNotes.from_events([HeaderAttribute("bpm", "300"),
+                                        Note(NoteType.NORMAL, 0, 4, 5, "And "),
+                                        Note(NoteType.GOLDEN, 5, 4, 12, "we "),
+                                        Note(NoteType.RAP, 10, 2, -3, "bring "),
+                                        EndOfPhrase(14)])
+    return UltrastarSongNotes(song_id=song1.id, data=song_notes.to_blob())
+
+
 @pytest.fixture()
 def song1_base_api_wrap(song1_base) -> Dict[str, Any]:
     song1_dict = song1_base.model_dump()
@@ -219,6 +231,24 @@ def token() -> dict[str, str]:
         "token_type": "bearer"}
 
 
+"""song files"""
+
+
+@pytest.fixture()
+def write_song_file():
+    def write(file_path: Path, song_base: UltrastarSongBase, encoding: str = "utf-8") -> str:
+        """Write an Ultrastar file with a note for each word of the lyrics of a song and return its path."""
+        *words, last_word = song_base.lyrics.split(" ")
+        lines = [f"#TITLE:{song_base.title}", f"#ARTIST:{song_base.artist}", "#MP3:song.mp3", "#BPM:300", "#GAP:0"]
+        lines += [f": {index * 4} 3 5 {word} " for index, word in enumerate(words)]
+        lines += [f"* {len(words) * 4} 3 7 {last_word}", f"- {len(words) * 4 + 4}", "E"]
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text("\n".join(lines) + "\n", encoding=encoding)
+        return str(file_path)
+
+    return write
+
+
 """mock_db"""
 
 
@@ -232,10 +262,13 @@ def mock_db_query_get_songs():
 
 @pytest.fixture()
 def mock_db_query_get_song_by_id():
+    from src.app.main import song_cache
+    song_cache.clear()
     patcher = patch('src.app.songs.crud.get_song_by_id')
     mock = patcher.start()
     yield mock
     patcher.stop()
+    song_cache.clear()
 
 
 @pytest.fixture()
@@ -254,6 +287,39 @@ def mock_db_query_get_songs_by_criteria():
     patcher.stop()
 
 
+@pytest.fixture()
+def mock_db_query_get_song_notes():
+    patcher = patch('src.app.songs.crud.get_song_notes')
+    mock = patcher.start()
+    yield mock
+    patcher.stop()
+
+
+@pytest.fixture()
+def mock_db_query_search_songs():
+    patcher = patch('src.app.songs.crud.search_songs')
+    mock = patcher.start()
+    yield mock
+    patcher.stop()
+
+
+@pytest.fixture()
+def song_search_index(song1, song2, song3):
+    from src.app.main import song_search_index
+    for song in (song1, song2, song3):
+        song_search_index.add(song.id, song.title, song.artist)
+    yield song_search_index
+    song_search_index.clear()
+
+
+@pytest.fixture()
+def song_suggest_index(song1, song2, song3):
+    from src.app.main import song_suggest_index
+    song_suggest_index.rebuild((song.id, song.title, song.artist) for song in (song1, song2, song3))
+    yield song_suggest_index
+    song_suggest_index.clear()
+
+
 @pytest.fixture()
 def mock_db_query_get_user_by_username():
     patcher = patch('src.app.auth.crud.get_user_by_username')
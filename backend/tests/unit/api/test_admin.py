@@ -1,8 +1,9 @@
 from datetime import timedelta
 
+import pytest
 from fastapi import status
 from src.app.dependencies import is_admin
-from src.app.main import app, queue_service
+from src.app.main import app, ingestion_progress, queue_service, song_cache
 from src.app.queue.config import QueueBaseSettings
 
 from ...test_main import clean_queue_test_setup, overrides_is_admin_as_false
@@ -26,7 +27,8 @@ def test_add_entry_to_queue_with_closed_queue(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
 
     app.dependency_overrides.pop(is_admin)
     clean_queue_test_setup(client)
@@ -51,7 +53,8 @@ def test_add_entry_to_queue_with_recently_added_song(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
 
     app.dependency_overrides.pop(is_admin)
     clean_queue_test_setup(client)
@@ -73,7 +76,8 @@ def test_add_entry_to_queue_with_song_already_in_queue(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue, entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 270.0}
 
     app.dependency_overrides.pop(is_admin)
     clean_queue_test_setup(client)
@@ -101,7 +105,8 @@ def test_add_entry_to_queue_with_song_already_sung_max_times(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
 
     app.dependency_overrides.pop(is_admin)
     clean_queue_test_setup(client)
@@ -127,7 +132,8 @@ def test_add_entry_to_queue_with_song_sung_recently(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
 
     app.dependency_overrides.pop(is_admin)
     clean_queue_test_setup(client)
@@ -282,6 +288,49 @@ def test_mark_entry_at_index_as_processed_without_admin_privileges(client, entry
     clean_queue_test_setup(client)
 
 
+"""test /mark-entry-as-processed"""
+
+
+def test_mark_entry_as_processed_with_entry_not_in_queue(client, entry1_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    entry_id = queue_service.entry_ids[0]
+    queue_service.remove_entry_by_id(entry_id)
+
+    response = client.put("/admin/mark-entry-as-processed", params={"entry_id": entry_id})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": f"There is no entry with id {entry_id} in the queue"}
+    assert queue_service._processed_entries == []
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+def test_mark_entry_as_processed_with_multiple_entries_in_queue(client,
+                                                               entry1_in_queue,
+                                                               entry2_in_queue,
+                                                               entry3_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+    entry_id = queue_service.entry_ids[1]
+
+    response = client.put("/admin/mark-entry-as-processed", params={"entry_id": entry_id})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"message": f"Marked as processed: {entry2_in_queue.song.title} by "
+                                          f"{entry2_in_queue.song.artist}"}
+    assert queue_service.queue == [entry1_in_queue, entry3_in_queue]
+    assert [entry.song for entry in queue_service.processed_entries] == [entry2_in_queue.song]
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
 """test /remove-entry"""
 
 
@@ -372,6 +421,45 @@ def test_remove_entry_from_queue_without_admin_privileges(client, entry1_in_queu
     clean_queue_test_setup(client)
 
 
+"""test /remove-entry-by-id"""
+
+
+def test_remove_entry_from_queue_by_id(client, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+    entry_id = queue_service.entry_ids[2]
+
+    response = client.delete("/admin/remove-entry-by-id", params={"entry_id": entry_id})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"message": f"Deleted: {entry3_in_queue.song.title} by {entry3_in_queue.song.artist}"}
+    assert queue_service.queue == [entry1_in_queue, entry2_in_queue]
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+def test_remove_entry_from_queue_by_id_twice(client, entry1_in_queue, entry2_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    entry_id = queue_service.entry_ids[0]
+    client.delete("/admin/remove-entry-by-id", params={"entry_id": entry_id})
+
+    response = client.delete("/admin/remove-entry-by-id", params={"entry_id": entry_id})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": f"There is no entry with id {entry_id} in the queue"}
+    assert queue_service.queue == [entry2_in_queue]
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
 """test /move-entry-from-index-to-index"""
 
 
@@ -475,6 +563,63 @@ def test_move_entry_from_index_to_index_move_entry_from_index_out_of_bounds(clie
     clean_queue_test_setup(client)
 
 
+"""test /move-entry-before-entry"""
+
+
+def test_move_entry_before_entry(client, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+    entry1_id, _, entry3_id = queue_service.entry_ids
+
+    response = client.patch("/admin/move-entry-before-entry",
+                            params={"entry_id": entry3_id, "before_entry_id": entry1_id})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"message": f"Moved: {entry3_in_queue.song.title} by {entry3_in_queue.song.artist}"}
+    assert queue_service.queue == [entry3_in_queue, entry1_in_queue, entry2_in_queue]
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+def test_move_entry_before_entry_to_end_of_queue(client, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+
+    response = client.patch("/admin/move-entry-before-entry", params={"entry_id": queue_service.entry_ids[0]})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert queue_service.queue == [entry2_in_queue, entry3_in_queue, entry1_in_queue]
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+def test_move_entry_before_entry_not_in_queue(client, entry1_in_queue, entry2_in_queue):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    entry1_id, entry2_id = queue_service.entry_ids
+    queue_service.remove_entry_by_id(entry1_id)
+
+    response = client.patch("/admin/move-entry-before-entry",
+                            params={"entry_id": entry2_id, "before_entry_id": entry1_id})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": f"There is no entry with id {entry1_id} in the queue"}
+    assert queue_service.queue == [entry2_in_queue]
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
 """test /clear-queue"""
 
 
@@ -1009,3 +1154,93 @@ def test_set_queue_is_open_without_admin_privileges(client):
 
     app.dependency_overrides.pop(is_admin)
     clean_queue_test_setup(client)
+
+
+"""test /get-ingestion-progress"""
+
+
+def test_get_ingestion_progress_while_running(client):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    ingestion_progress.start()
+    ingestion_progress.started_at -= timedelta(seconds=10)
+    ingestion_progress.discovered = 10
+    ingestion_progress.unchanged = 4
+    ingestion_progress.parsed = 2
+    ingestion_progress.failed = 1
+    ingestion_progress.inserted = 1
+
+    response = client.get("/admin/get-ingestion-progress")
+
+    assert response.status_code == status.HTTP_200_OK
+    progress = response.json()
+    assert progress["running"] is True
+    assert (progress["discovered"], progress["unchanged"], progress["parsed"], progress["failed"],
+            progress["inserted"]) == (10, 4, 2, 1, 1)
+    assert progress["files_per_second"] == pytest.approx(0.2, rel=0.01)
+    assert progress["eta_seconds"] == pytest.approx(20, rel=0.01)
+
+    ingestion_progress.finish()
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+def test_get_ingestion_progress_without_admin_privileges(client):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = overrides_is_admin_as_false
+
+    response = client.get("/admin/get-ingestion-progress")
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {"detail": "Not enough privileges"}
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+"""test /get-song-cache-statistics"""
+
+
+def test_get_song_cache_statistics_after_miss_and_hit(client, song1, mock_db_query_get_song_by_id):
+    clean_queue_test_setup(client)
+    app.dependency_overrides[is_admin] = lambda: True
+    mock_db_query_get_song_by_id.return_value = song1
+    song_cache.hits = song_cache.misses = 0
+    client.get(f"/songs/{song1.id}")
+    client.get(f"/songs/{song1.id}")
+
+    response = client.get("/admin/get-song-cache-statistics")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"hits": 1, "misses": 1, "size": 1, "max_size": song_cache.max_size, "hit_rate": 0.5}
+
+    app.dependency_overrides.pop(is_admin)
+    clean_queue_test_setup(client)
+
+
+"""test /clear-song-cache"""
+
+
+def test_clear_song_cache(client, song1, mock_db_query_get_song_by_id):
+    app.dependency_overrides[is_admin] = lambda: True
+    mock_db_query_get_song_by_id.return_value = song1
+    client.get(f"/songs/{song1.id}")
+
+    response = client.delete("/admin/clear-song-cache")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"message": "Song cache cleared"}
+    assert song1.id not in song_cache
+
+    app.dependency_overrides.pop(is_admin)
+
+
+def test_clear_song_cache_without_admin_privileges(client):
+    app.dependency_overrides[is_admin] = overrides_is_admin_as_false
+
+    response = client.delete("/admin/clear-song-cache")
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {"detail": "Not enough privileges"}
+
+    app.dependency_overrides.pop(is_admin)
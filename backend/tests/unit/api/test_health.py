@@ -0,0 +1,62 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from src.app.main import ingestion_progress, startup_progress, sync_and_watch_library
+
+"""test /ready"""
+
+
+@pytest.fixture()
+def library_synced():
+    startup_progress.library_synced = True
+    yield
+    startup_progress.reset()
+
+
+def test_get_readiness_while_library_is_synced_on_startup(client):
+    sync_released = asyncio.Event()
+
+    async def fake_populate_database():
+        await sync_released.wait()
+
+    async def sync_on_startup():
+        sync_task = asyncio.create_task(sync_and_watch_library(asyncio.Event()))
+        await asyncio.sleep(0)
+        response_while_syncing = client.get("/ready")
+        sync_released.set()
+        await sync_task
+        return response_while_syncing, client.get("/ready")
+
+    with patch("src.app.main.populate_database", fake_populate_database):
+        response_while_syncing, response_after_sync = asyncio.run(sync_on_startup())
+
+    assert response_while_syncing.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response_while_syncing.json() == {"library_synced": False, "ready": False, "library_sync_running": True}
+    assert response_after_sync.status_code == status.HTTP_200_OK
+    assert response_after_sync.json() == {"library_synced": True, "ready": True, "library_sync_running": False}
+
+    startup_progress.reset()
+
+
+def test_get_readiness_after_failed_library_sync(client):
+    with patch("src.app.main.populate_database", side_effect=OSError("Song dir unmounted")):
+        asyncio.run(sync_and_watch_library(asyncio.Event()))
+
+    response = client.get("/ready")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"library_synced": True, "ready": True, "library_sync_running": False}
+    assert ingestion_progress.error == "Song dir unmounted"
+
+    startup_progress.reset()
+
+
+def test_get_readiness_after_library_is_synced(client, library_synced):
+    ingestion_progress.finish()
+
+    response = client.get("/ready")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"library_synced": True, "ready": True, "library_sync_running": False}
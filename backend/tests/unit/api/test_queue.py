@@ -24,7 +24,8 @@ def test_get_queue_with_one_entry(client, entry1_in_queue, entry1_in_queue_api_w
     response = client.get("/queue/")
 
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [entry1_in_queue_api_wrap]
+    entry1_id, = queue_service.entry_ids
+    assert response.json() == [{**entry1_in_queue_api_wrap, "id": entry1_id, "time_until_start": 0.0}]
 
     clean_queue_test_setup(client)
 
@@ -44,7 +45,39 @@ def test_get_queue_with_multiple_entries(client,
     response = client.get("/queue/")
 
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [entry1_in_queue_api_wrap, entry2_in_queue_api_wrap, entry3_in_queue_api_wrap]
+    entry1_id, entry2_id, entry3_id = queue_service.entry_ids
+    duration1 = entry1_in_queue.song.audio_duration.total_seconds()
+    duration2 = entry2_in_queue.song.audio_duration.total_seconds()
+    assert response.json() == [{**entry1_in_queue_api_wrap, "id": entry1_id, "time_until_start": 0.0},
+                               {**entry2_in_queue_api_wrap, "id": entry2_id, "time_until_start": duration1},
+                               {**entry3_in_queue_api_wrap, "id": entry3_id,
+                                "time_until_start": duration1 + duration2}]
+
+    clean_queue_test_setup(client)
+
+
+def test_get_queue_after_moving_and_removing_entries(client,
+                                                    entry1_in_queue,
+                                                    entry2_in_queue,
+                                                    entry3_in_queue,
+                                                    entry1_in_queue_api_wrap,
+                                                    entry3_in_queue_api_wrap):
+    clean_queue_test_setup(client)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+    queue_service.move_entry_from_index_to_index(2, 0)
+    queue_service.remove_entry_by_index(2)
+
+    response = client.get("/queue/")
+
+    assert response.status_code == status.HTTP_200_OK
+    entry3_id, entry1_id = queue_service.entry_ids
+    duration3 = entry3_in_queue.song.audio_duration.total_seconds()
+    assert response.json() == [{**entry3_in_queue_api_wrap, "id": entry3_id, "time_until_start": 0.0},
+                               {**entry1_in_queue_api_wrap, "id": entry1_id, "time_until_start": duration3}]
+    assert queue_service.time_until_entry_at_index(1).total_seconds() == duration3
+    assert queue_service.time_until_entry(entry1_id).total_seconds() == duration3
 
     clean_queue_test_setup(client)
 
@@ -192,6 +225,43 @@ def test_get_time_until_end_of_queue_with_song_without_audio_duration(client,
     clean_queue_test_setup(client)
 
 
+"""test /get-time-until-entry"""
+
+
+def test_get_time_until_entry_after_moving_entries(client, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    clean_queue_test_setup(client)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+    entry1_id, entry2_id, entry3_id = queue_service.entry_ids
+    queue_service.move_entry_before_entry(entry3_id, entry1_id)
+
+    responses = [client.get("/queue/get-time-until-entry", params={"entry_id": entry_id})
+                 for entry_id in [entry3_id, entry1_id, entry2_id]]
+
+    assert [response.status_code for response in responses] == [status.HTTP_200_OK] * 3
+    assert [response.json() for response in responses] == [
+        0,
+        entry3_in_queue.song.audio_duration.total_seconds(),
+        (entry3_in_queue.song.audio_duration + entry1_in_queue.song.audio_duration).total_seconds()]
+
+    clean_queue_test_setup(client)
+
+
+def test_get_time_until_entry_not_in_queue(client, entry1_in_queue):
+    clean_queue_test_setup(client)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    entry_id, = queue_service.entry_ids
+    queue_service.mark_entry_as_processed(entry_id)
+
+    response = client.get("/queue/get-time-until-entry", params={"entry_id": entry_id})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": f"There is no entry with id {entry_id} in the queue"}
+
+    clean_queue_test_setup(client)
+
+
 """test /add-entry"""
 
 
@@ -227,9 +297,24 @@ def test_add_entry_to_queue_with_correct_song_details(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
+
+    clean_queue_test_setup(client)
+
 
+def test_add_entry_to_queue_reads_song_from_cache(client,
+                                                 song1,
+                                                 entry1_in_queue,
+                                                 mock_db_query_get_song_by_id):
     clean_queue_test_setup(client)
+    mock_db_query_get_song_by_id.return_value = song1
+
+    for _ in range(2):
+        client.post("/queue/add-entry", params={"requested_song_id": song1.id, "singer": entry1_in_queue.singer})
+        clean_queue_test_setup(client)
+
+    mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
 
 
 def test_add_entry_to_queue_with_song_not_in_database(client,
@@ -310,7 +395,8 @@ def test_add_entry_to_queue_with_song_added_a_while_ago(client,
     mock_db_query_get_song_by_id.assert_called_once_with(None, song1.id)
     assert queue_service.queue == [entry1_in_queue]
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == entry1_in_queue_api_wrap
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
 
     clean_queue_test_setup(client)
 
@@ -333,6 +419,49 @@ def test_add_entry_to_queue_with_song_already_in_queue(client,
     clean_queue_test_setup(client)
 
 
+def test_add_entry_to_queue_returns_id_of_entry(client,
+                                               song1,
+                                               entry1_in_queue,
+                                               entry2_in_queue,
+                                               mock_db_query_get_song_by_id):
+    clean_queue_test_setup(client)
+    mock_db_query_get_song_by_id.return_value = song1
+    queue_service.add_entry_at_end(entry2_in_queue)
+
+    response = client.post("/queue/add-entry",
+                           params={"requested_song_id": song1.id, "singer": entry1_in_queue.singer})
+    time_response = client.get("/queue/get-time-until-entry", params={"entry_id": response.json()["id"]})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["id"] == queue_service.entry_ids[1]
+    assert response.json()["time_until_start"] == entry2_in_queue.song.audio_duration.total_seconds()
+    assert time_response.json() == entry2_in_queue.song.audio_duration.total_seconds()
+
+    clean_queue_test_setup(client)
+
+
+def test_add_entry_to_queue_with_song_removed_from_queue(client,
+                                                        song1,
+                                                        entry1_in_queue,
+                                                        entry1_in_queue_api_wrap,
+                                                        mock_db_query_get_song_by_id):
+    clean_queue_test_setup(client)
+    mock_db_query_get_song_by_id.return_value = song1
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.move_entry_from_index_to_index(0, 0)
+    queue_service.remove_entry_by_index(0)
+
+    response = client.post("/queue/add-entry",
+                           params={"requested_song_id": song1.id, "singer": entry1_in_queue.singer})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == entry1_in_queue_api_wrap | {"id": queue_service.entry_ids[-1],
+                                                           "time_until_start": 0.0}
+    assert queue_service.queue == [entry1_in_queue]
+
+    clean_queue_test_setup(client)
+
+
 def test_add_entry_to_queue_with_song_aready_sung_max_times(client,
                                                             song1,
                                                             entry1_in_queue,
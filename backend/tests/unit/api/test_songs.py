@@ -1,8 +1,15 @@
+import pytest
 from fastapi import status
+from src.app.songs import crud
+from src.app.songs.schemas import UltrastarSongSearchResult
 
 """test /"""
 
 
+def without_lyrics(song_api_wrap):
+    return {key: value for key, value in song_api_wrap.items() if key != "lyrics"}
+
+
 def test_get_songs_with_no_song(client, mock_db_query_get_songs):
     mock_db_query_get_songs.return_value = []
 
@@ -18,9 +25,9 @@ def test_get_songs_with_single_song(client, mock_db_query_get_songs, song1, song
 
     response = client.get("/songs/")
 
-    mock_db_query_get_songs.assert_called_once()
+    mock_db_query_get_songs.assert_called_once_with(None, None, 101)
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [song1_api_wrap]
+    assert response.json() == {"songs": [without_lyrics(song1_api_wrap)], "next_cursor": None}
 
 
 def test_get_songs_with_multiple_songs(client,
@@ -37,7 +44,49 @@ def test_get_songs_with_multiple_songs(client,
 
     mock_db_query_get_songs.assert_called_once()
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [song1_api_wrap, song2_api_wrap, song3_api_wrap]
+    assert response.json() == {"songs": [without_lyrics(song1_api_wrap),
+                                         without_lyrics(song2_api_wrap),
+                                         without_lyrics(song3_api_wrap)],
+                               "next_cursor": None}
+
+
+def test_get_songs_with_next_page(client, mock_db_query_get_songs, song1, song2, song3, song1_api_wrap,
+                                  song2_api_wrap):
+    mock_db_query_get_songs.return_value = [song1, song2, song3]
+
+    response = client.get("/songs/", params={"limit": 2})
+
+    mock_db_query_get_songs.assert_called_once_with(None, None, 3)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"songs": [without_lyrics(song1_api_wrap), without_lyrics(song2_api_wrap)],
+                               "next_cursor": crud.encode_song_cursor(song2)}
+
+
+def test_get_songs_after_cursor(client, mock_db_query_get_songs, song2, song3, song3_api_wrap):
+    mock_db_query_get_songs.return_value = [song3]
+
+    response = client.get("/songs/", params={"after": crud.encode_song_cursor(song2), "limit": 2})
+
+    mock_db_query_get_songs.assert_called_once_with(None, (song2.title, song2.artist, song2.id), 3)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"songs": [without_lyrics(song3_api_wrap)], "next_cursor": None}
+
+
+def test_get_songs_after_last_song(client, mock_db_query_get_songs, song3):
+    mock_db_query_get_songs.return_value = []
+
+    response = client.get("/songs/", params={"after": crud.encode_song_cursor(song3)})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"songs": [], "next_cursor": None}
+
+
+def test_get_songs_with_invalid_cursor(client, mock_db_query_get_songs):
+    response = client.get("/songs/", params={"after": "not-a-cursor"})
+
+    mock_db_query_get_songs.assert_not_called()
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Invalid cursor: not-a-cursor"}
 
 
 """test /{song_id}"""
@@ -128,3 +177,132 @@ def test_get_songs_by_criteria_with_matching_title_and_artist(client,
     mock_db_query_get_songs_by_criteria.assert_called_once_with(None, song1.title, song1.artist)
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == [song1_api_wrap]
+
+
+"""test /{song_id}/note-statistics"""
+
+
+def test_get_song_note_statistics_without_notes(client, mock_db_query_get_song_notes, song1):
+    mock_db_query_get_song_notes.return_value = None
+
+    response = client.get(f"/songs/{song1.id}/note-statistics")
+
+    mock_db_query_get_song_notes.assert_called_once_with(None, song1.id)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Requested song id has no notes in database"}
+
+
+def test_get_song_note_statistics_with_notes(client, mock_db_query_get_song_notes, song1, song1_notes):
+    mock_db_query_get_song_notes.return_value = song1_notes
+
+    response = client.get(f"/songs/{song1.id}/note-statistics")
+
+    mock_db_query_get_song_notes.assert_called_once_with(None, song1.id)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"note_count": 3,
+                               "lowest_pitch": -3,
+                               "highest_pitch": 12,
+                               "notes_per_second": 5.0,
+                               "golden_note_share": 1 / 3,
+                               "rap_note_share": 1 / 3}
+
+
+"""test /search"""
+
+
+def test_search_songs_with_no_matching_song(client, mock_db_query_search_songs):
+    mock_db_query_search_songs.return_value = []
+
+    response = client.get("/songs/search", params={"query": "Heino"})
+
+    mock_db_query_search_songs.assert_called_once_with(None, "Heino", 20)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Could not find songs matching the search query"}
+
+
+def test_search_songs_with_matching_lyrics(client, mock_db_query_search_songs, song1):
+    lyrics_snippet = "And we bring <mark>fire</mark>, sing <mark>fire</mark>…"
+    mock_db_query_search_songs.return_value = [UltrastarSongSearchResult(id=song1.id,
+                                                                         title=song1.title,
+                                                                         artist=song1.artist,
+                                                                         lyrics_snippet=lyrics_snippet)]
+
+    response = client.get("/songs/search", params={"query": "fire", "limit": 5})
+
+    mock_db_query_search_songs.assert_called_once_with(None, "fire", 5)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"id": song1.id,
+                                "title": song1.title,
+                                "artist": song1.artist,
+                                "lyrics_snippet": lyrics_snippet}]
+
+
+def test_search_songs_with_limit_out_of_range(client, mock_db_query_search_songs):
+    response = client.get("/songs/search", params={"query": "fire", "limit": 0})
+
+    mock_db_query_search_songs.assert_not_called()
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+"""test /fuzzy-search"""
+
+
+def test_fuzzy_search_songs_with_misspelled_artist(client, song_search_index, song1, song2):
+    response = client.get("/songs/fuzzy-search", params={"query": "powerwolff"})
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert [result["id"] for result in results] == [song1.id, song2.id]
+    assert results[0] == {"id": song1.id, "title": song1.title, "artist": song1.artist,
+                          "similarity": pytest.approx(9 / 11)}
+
+
+def test_fuzzy_search_songs_with_misspelled_title(client, song_search_index, song3):
+    response = client.get("/songs/fuzzy-search", params={"query": "hallelulah", "limit": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["id"] for result in response.json()] == [song3.id]
+
+
+def test_fuzzy_search_songs_below_threshold(client, song_search_index):
+    response = client.get("/songs/fuzzy-search", params={"query": "hallelulah", "threshold": 0.9})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Could not find songs similar to the search query"}
+
+
+def test_fuzzy_search_songs_with_threshold_out_of_range(client, song_search_index):
+    response = client.get("/songs/fuzzy-search", params={"query": "powerwolf", "threshold": 0})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+"""test /suggest"""
+
+
+def test_suggest_songs_with_prefix_of_title_and_artist(client, song_suggest_index, song1, song3):
+    response = client.get("/songs/suggest", params={"prefix": "l"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"text": song3.artist, "field": "artist"}]
+
+
+def test_suggest_songs_with_prefix_of_later_word(client, song_suggest_index, song1, song2, song3):
+    response = client.get("/songs/suggest", params={"prefix": "sto", "field": "title"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"text": song2.title, "field": "title"}]
+
+
+def test_suggest_songs_ranks_start_of_text_first(client, song_suggest_index, song1, song2, song3):
+    response = client.get("/songs/suggest", params={"prefix": "f", "limit": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"text": song1.title, "field": "title"}]
+
+
+def test_suggest_songs_without_match(client, song_suggest_index):
+    response = client.get("/songs/suggest", params={"prefix": "heino"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
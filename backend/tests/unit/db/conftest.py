@@ -0,0 +1,136 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List
+from unittest.mock import patch
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.app.config import settings
+from src.app.songs import crud
+from src.app.songs.models import UltrastarSong
+from src.app.songs.schemas import IngestionProgress, UltrastarSongBase
+from src.app.songs.service import sync_song_dir
+
+
+class SongDatabase:
+    """
+    A database file of a single test.
+
+    Every call runs in an event loop of its own, so every call opens the database with a new engine.
+
+    Methods
+    ----------
+    def add_songs(self, song_bases: Iterable[UltrastarSongBase]) -> None
+        Add songs one by one, as `crud.add_song` does.
+
+    def run(self, crud_call: Callable[[AsyncSession], Awaitable[Any]]) -> Any
+        Return the result of a crud call in a new session.
+
+    def get_query_plans(self, crud_call: Callable[[AsyncSession], Awaitable[Any]]) -> List[str]
+        Run a crud call in a new session and return the query plans of the SELECT statements it executed.
+
+    def sync_song_dir(self, dir_path: str) -> IngestionProgress
+        Sync the songs below a dir with the database and return the progress of the sync.
+
+    def run_sync(self, sync: Awaitable[Any]) -> Any
+        Return the result of a coroutine syncing songs with the database, e.g. the library watcher.
+    """
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+
+    @asynccontextmanager
+    async def open_engine(self) -> AsyncIterator[AsyncEngine]:
+        engine = create_async_engine(self.database_url)
+        try:
+            yield engine
+        finally:
+            await engine.dispose()
+
+    @asynccontextmanager
+    async def open_session(self) -> AsyncIterator[AsyncSession]:
+        async with self.open_engine() as engine:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                yield session
+
+    def add_songs(self, song_bases: Iterable[UltrastarSongBase]) -> None:
+        async def add_songs(session: AsyncSession) -> None:
+            for song_base in song_bases:
+                await crud.add_song(session, UltrastarSong(**song_base.model_dump()))
+
+        self.run(add_songs)
+
+    def run(self, crud_call: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        async def run() -> Any:
+            async with self.open_session() as session:
+                return await crud_call(session)
+
+        return asyncio.run(run())
+
+    def get_query_plans(self, crud_call: Callable[[AsyncSession], Awaitable[Any]]) -> List[str]:
+        statements = []
+
+        def capture_statement(connection, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        async def run() -> List[str]:
+            async with self.open_engine() as engine:
+                event.listen(engine.sync_engine, "before_cursor_execute", capture_statement)
+                async with AsyncSession(engine) as session:
+                    await crud_call(session)
+                event.remove(engine.sync_engine, "before_cursor_execute", capture_statement)
+
+                plans = []
+                async with engine.connect() as connection:
+                    for statement, parameters in statements:
+                        result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                        plans.append("\n".join(row[-1] for row in result.all()))
+                return plans
+
+        return asyncio.run(run())
+
+    def sync_song_dir(self, dir_path: str) -> IngestionProgress:
+        progress = IngestionProgress()
+        self.run_sync(sync_song_dir(dir_path, progress=progress))
+        return progress
+
+    def run_sync(self, sync: Awaitable[Any]) -> Any:
+        async def get_async_session() -> AsyncIterator[AsyncSession]:
+            async with self.open_session() as session:
+                yield session
+
+        # the song files of the tests have no audio files and there is no parse cache to hit
+        with (patch.multiple(settings, SONG_DURATION_SOURCE="notes", INGESTION_WORKERS=1, PARSE_CACHE_PATH=None),
+              patch("src.app.songs.service.get_async_session", get_async_session)):
+            return asyncio.run(sync)
+
+
+@pytest.fixture()
+def song_database(tmp_path) -> SongDatabase:
+    """A database with the tables of the models."""
+    song_database = SongDatabase(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+
+    async def create_tables() -> None:
+        async with song_database.open_engine() as engine:
+            async with engine.begin() as connection:
+                await connection.run_sync(SQLModel.metadata.create_all)
+
+    asyncio.run(create_tables())
+    return song_database
+
+
+@pytest.fixture()
+def migrated_song_database(tmp_path) -> SongDatabase:
+    """A database migrated by alembic, with the full-text index and its triggers."""
+    database_url = f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}"
+    alembic_cfg = Config()
+    alembic_cfg.set_main_option("script_location", "src/alembic")
+    alembic_cfg.attributes["database_url"] = database_url
+    command.upgrade(alembic_cfg, "head")
+    return SongDatabase(database_url)
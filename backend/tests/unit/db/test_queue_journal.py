@@ -0,0 +1,199 @@
+import multiprocessing
+import sqlite3
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from src.app.queue.exceptions import CantAddEntryError, QueueJournalConflictError
+from src.app.queue.journal import QueueJournal
+from src.app.queue.schemas import QueueEntry
+from src.app.queue.service import QueueService
+
+
+class CommitFailingConnection:
+    """A connection to a journal whose next commit fails, as when the disk is full."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self._commit_failed = False
+
+    def __getattr__(self, name: str):
+        return getattr(self._connection, name)
+
+    def execute(self, statement: str, *args):
+        if statement == "COMMIT" and not self._commit_failed:
+            self._commit_failed = True
+            raise sqlite3.OperationalError("database or disk is full")
+        return self._connection.execute(statement, *args)
+
+
+def reopen_queue_service(journal_path: str, snapshot_every: int = 1000) -> QueueService:
+    """Return a new queue service recovered from the journal, as after a restart."""
+    queue_service = QueueService()
+    queue_service.open_journal(QueueJournal(journal_path, snapshot_every))
+    return queue_service
+
+
+def test_queue_is_recovered_from_journal(tmp_path, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    queue_service = reopen_queue_service(journal_path)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry3_in_queue)
+    queue_service.move_entry_from_index_to_index(2, 0)
+    queue_service.mark_entry_at_index_as_processed(1)
+    queue_service.max_times_song_can_be_sung = 5
+    queue_service.queue_is_open = False
+
+    recovered = reopen_queue_service(journal_path)
+
+    assert recovered.queue == [entry3_in_queue, entry2_in_queue]
+    assert recovered.entry_ids == queue_service.entry_ids
+    assert recovered.processed_entries == queue_service.processed_entries
+    assert recovered.time_until_end_of_queue() == queue_service.time_until_end_of_queue()
+    assert recovered.is_song_in_processed_entries(entry1_in_queue.song)
+    assert recovered.max_times_song_can_be_sung == 5
+    assert not recovered.queue_is_open
+    assert recovered.time_between_same_song == queue_service.time_between_same_song
+
+
+def test_queue_is_recovered_from_snapshot_and_changes_after_it(tmp_path, entry1_in_queue, entry2_in_queue,
+                                                               entry_without_audio_duration_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    queue_service = reopen_queue_service(journal_path, snapshot_every=2)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    queue_service.add_entry_at_end(entry2_in_queue)
+    queue_service.add_entry_at_end(entry_without_audio_duration_in_queue)
+    queue_service.remove_entry_by_id(queue_service.entry_ids[0])
+    queue_service.time_between_same_song = timedelta(minutes=5)
+
+    assert len(queue_service._journal) < 2
+    recovered = reopen_queue_service(journal_path)
+
+    assert recovered.queue == [entry2_in_queue, entry_without_audio_duration_in_queue]
+    assert recovered.entry_ids == queue_service.entry_ids
+    assert recovered.time_between_same_song == timedelta(minutes=5)
+
+
+def test_entry_ids_are_not_reused_after_recovery(tmp_path, entry1_in_queue, entry2_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    queue_service = reopen_queue_service(journal_path)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    removed_entry_id, = queue_service.entry_ids
+    queue_service.clear_queue()
+    queue_service.close_journal()
+
+    recovered = reopen_queue_service(journal_path)
+    recovered.add_entry_at_end(entry2_in_queue)
+
+    assert recovered.entry_ids[0] > removed_entry_id
+
+
+def test_workers_sharing_journal_see_one_queue(tmp_path, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    worker1 = reopen_queue_service(journal_path)
+    worker2 = reopen_queue_service(journal_path)
+
+    worker1.add_entry_at_end(entry1_in_queue)
+    worker2.add_entry_at_end(entry2_in_queue)
+    worker1.add_entry_at_end(entry3_in_queue)
+    worker2.remove_entry_by_id(worker2.entry_ids[0])
+    worker1.sync()
+
+    assert worker1.queue == worker2.queue == [entry2_in_queue, entry3_in_queue]
+    assert worker1.entry_ids == worker2.entry_ids
+    assert worker1.time_until_end_of_queue() == worker2.time_until_end_of_queue()
+
+
+def test_worker_catches_up_with_snapshot_of_other_worker(tmp_path, entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    worker1 = reopen_queue_service(journal_path, snapshot_every=1)
+    worker2 = reopen_queue_service(journal_path, snapshot_every=1)
+
+    worker1.add_entry_at_end(entry1_in_queue)
+    worker1.add_entry_at_end(entry2_in_queue)
+    worker1.add_entry_at_end(entry3_in_queue)
+    worker2.sync()
+
+    assert worker2.queue == worker1.queue
+    assert worker2.entry_ids == worker1.entry_ids
+
+
+def test_change_rolled_back_does_not_skip_change_of_other_worker(tmp_path, entry1_in_queue, entry2_in_queue,
+                                                                  entry3_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    worker1 = reopen_queue_service(journal_path)
+    worker2 = reopen_queue_service(journal_path)
+    worker1.add_entry_at_end(entry1_in_queue)
+
+    with (patch.object(worker1, "_add_entry", side_effect=RuntimeError("out of memory")),
+          pytest.raises(RuntimeError)):
+        worker1.add_entry_at_end(entry3_in_queue)
+    worker2.add_entry_at_end(entry2_in_queue)
+    worker1.sync()
+
+    assert worker1.queue == [entry1_in_queue, entry2_in_queue]
+    assert worker1.queue == worker2.queue
+
+
+def test_change_is_undone_when_journal_cannot_commit_it(tmp_path, entry1_in_queue, entry2_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    queue_service = reopen_queue_service(journal_path)
+    queue_service.add_entry_at_end(entry1_in_queue)
+    journal = queue_service._journal
+
+    with (patch.object(journal, "_connection", CommitFailingConnection(journal._connection)),
+          pytest.raises(sqlite3.OperationalError)):
+        queue_service.add_entry_at_end(entry2_in_queue)
+    with (patch.object(journal, "_connection", CommitFailingConnection(journal._connection)),
+          pytest.raises(sqlite3.OperationalError)):
+        queue_service.queue_is_open = False
+    recovered = reopen_queue_service(journal_path)
+
+    assert queue_service.queue == recovered.queue == [entry1_in_queue]
+    assert queue_service.entry_ids == recovered.entry_ids
+    assert queue_service.time_until_end_of_queue() == recovered.time_until_end_of_queue()
+    assert not queue_service.is_song_in_queue(entry2_in_queue.song)
+    assert queue_service.queue_is_open
+    assert queue_service.add_entry_at_end(entry2_in_queue).id == 2
+
+
+def test_append_after_change_of_other_worker_conflicts(tmp_path):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    journal1 = QueueJournal(journal_path)
+    journal2 = QueueJournal(journal_path)
+    journal1.append(1, "clear_queue", {})
+
+    with pytest.raises(QueueJournalConflictError):
+        journal2.append(1, "clear_processed_entries", {})
+
+
+def try_add_entry_in_worker(journal_path: str, entry: QueueEntry, barrier, results) -> None:
+    """Add an entry in a worker process of its own, at the same time as the other workers."""
+    queue_service = reopen_queue_service(journal_path)
+    barrier.wait()
+    try:
+        queue_service.try_add_entry(entry)
+    except CantAddEntryError:
+        results.put("rejected")
+    else:
+        results.put("added")
+
+
+def test_same_song_is_added_once_by_two_workers(tmp_path, entry1_in_queue):
+    journal_path = str(tmp_path / "queue_journal.sqlite")
+    reopen_queue_service(journal_path).close_journal()
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(2)
+    results = context.Queue()
+    workers = [context.Process(target=try_add_entry_in_worker, args=(journal_path, entry1_in_queue, barrier, results))
+               for _ in range(2)]
+
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    assert sorted(results.get(timeout=1) for _ in workers) == ["added", "rejected"]
+    assert reopen_queue_service(journal_path).queue == [entry1_in_queue]
@@ -0,0 +1,43 @@
+from typing import List
+
+import pytest
+from sqlalchemy import inspect
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.app.songs import crud
+from src.app.songs.models import UltrastarSong
+
+
+async def get_pages(session: AsyncSession, limit: int) -> List[List[UltrastarSong]]:
+    """Return all pages of songs, following the cursor of each page."""
+    pages = []
+    after = None
+    while page := await crud.get_songs(session, after, limit):
+        pages.append(page)
+        after = crud.decode_song_cursor(crud.encode_song_cursor(page[-1]))
+    return pages
+
+
+def test_get_songs_pages_through_all_songs(song_database, song1_base, song2_base, song3_base,
+                                           song_without_audio_duration_base):
+    song_database.add_songs([song1_base, song2_base, song3_base, song_without_audio_duration_base])
+
+    pages = song_database.run(lambda session: get_pages(session, limit=3))
+
+    assert [[song.title for song in page] for page in pages] == [
+        [song_without_audio_duration_base.title, song1_base.title, song3_base.title],
+        [song2_base.title]
+    ]
+
+
+def test_get_songs_does_not_load_lyrics(song_database, song1_base):
+    song_database.add_songs([song1_base])
+
+    pages = song_database.run(lambda session: get_pages(session, limit=1))
+
+    assert inspect(pages[0][0]).unloaded == {"lyrics"}
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WzFd", "eyJ0aXRsZSI6IDF9"])
+def test_decode_song_cursor_with_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_song_cursor(cursor)
@@ -0,0 +1,76 @@
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.app.songs import crud
+from src.app.songs.schemas import UltrastarSongBase
+
+
+@pytest.fixture()
+def song1_key_variant_base(song1_base) -> UltrastarSongBase:
+    return UltrastarSongBase(title=f" {song1_base.title.upper()}",
+                             artist=song1_base.artist.lower(),
+                             audio_duration=song1_base.audio_duration,
+                             lyrics=song1_base.lyrics)
+
+
+def test_get_songs_is_sorted_by_index(song_database):
+    plans = song_database.get_query_plans(crud.get_songs)
+
+    assert len(plans) == 1
+    assert "USING INDEX ix_ultrastarsong_title_artist" in plans[0]
+    assert "TEMP B-TREE" not in plans[0]
+
+
+def test_get_songs_after_cursor_seeks_index(song_database, song1):
+    after = (song1.title, song1.artist, song1.id)
+    plans = song_database.get_query_plans(lambda session: crud.get_songs(session, after, 100))
+
+    assert len(plans) == 1
+    assert "SEARCH ultrastarsong USING INDEX ix_ultrastarsong_title_artist ((title,artist)>(?,?))" in plans[0]
+    assert "TEMP B-TREE" not in plans[0]
+
+
+def test_get_songs_by_criteria_with_title_and_artist_searches_index(song_database, song1):
+    plans = song_database.get_query_plans(lambda session: crud.get_songs_by_criteria(session, song1.title,
+                                                                                     song1.artist))
+
+    assert len(plans) == 1
+    assert ("SEARCH ultrastarsong USING INDEX uq_ultrastarsong_normalized_title_artist "
+            "(normalized_title=? AND normalized_artist=?)") in plans[0]
+
+
+@pytest.mark.parametrize("criteria, index, column",
+                         [({"title": "Fire"}, "uq_ultrastarsong_normalized_title_artist", "normalized_title"),
+                          ({"artist": "Wolf"}, "ix_ultrastarsong_normalized_artist", "normalized_artist")])
+def test_get_songs_by_criteria_with_title_or_artist_searches_index(song_database, criteria, index, column):
+    plans = song_database.get_query_plans(lambda session: crud.get_songs_by_criteria(session, **criteria))
+
+    assert len(plans) == 1
+    assert f"SEARCH ultrastarsong USING INDEX {index} ({column}>? AND {column}<?)" in plans[0]
+    assert "SCAN ultrastarsong" not in plans[0]
+
+
+def test_get_song_id_by_key_searches_unique_index(song_database, song1):
+    key = crud.get_song_key(song1.title, song1.artist)
+    plans = song_database.get_query_plans(lambda session: crud.get_song_id_by_key(session, key))
+
+    assert len(plans) == 1
+    assert "SEARCH ultrastarsong USING COVERING INDEX uq_ultrastarsong_normalized_title_artist" in plans[0]
+
+
+def test_add_songs_if_not_in_db_relies_on_unique_index(song_database, song1_base, song1_key_variant_base):
+    song_ids_by_key = {}
+    inserted_songs = []
+
+    async def add_songs_twice(session: AsyncSession) -> None:
+        inserted_songs.extend(await crud.add_songs_if_not_in_db(session, [song1_base], song_ids_by_key))
+        # a stale key map, e.g. of a sync that started before the song was added
+        stale_song_ids_by_key = {}
+        inserted_songs.extend(await crud.add_songs_if_not_in_db(session, [song1_key_variant_base],
+                                                                stale_song_ids_by_key))
+        song_ids_by_key.update(stale_song_ids_by_key)
+
+    plans = song_database.get_query_plans(add_songs_twice)
+
+    assert inserted_songs == [song1_base]
+    assert song_ids_by_key == {crud.get_song_key(song1_base.title, song1_base.artist): 1}
+    assert all("USING COVERING INDEX uq_ultrastarsong_normalized_title_artist" in plan for plan in plans)
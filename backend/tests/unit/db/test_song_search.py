@@ -0,0 +1,113 @@
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.app.songs import crud
+from src.app.songs.schemas import UltrastarSongBase
+
+
+def test_search_songs_ranks_title_above_lyrics(migrated_song_database, song1_base, song2_base):
+    storm_in_lyrics_base = UltrastarSongBase(title="Army of the Night",
+                                             artist="Powerwolf",
+                                             lyrics="Ride the storm, the storm, the storm of the night")
+    migrated_song_database.add_songs([song1_base, storm_in_lyrics_base, song2_base])
+
+    results = migrated_song_database.run(lambda session: crud.search_songs(session, "storm"))
+
+    assert [result.title for result in results] == [song2_base.title, storm_in_lyrics_base.title]
+    assert results[1].lyrics_snippet.count(crud.SNIPPET_MARK_START) == 3
+
+
+def test_search_songs_returns_title_and_artist_without_lyrics(migrated_song_database, song1_base):
+    migrated_song_database.add_songs([song1_base])
+
+    results = migrated_song_database.run(lambda session: crud.search_songs(session, "fire"))
+
+    assert [result.model_dump() for result in results] == [{"id": 1,
+                                                             "title": song1_base.title,
+                                                             "artist": song1_base.artist,
+                                                             "lyrics_snippet": "And we bring <mark>fire</mark>, "
+                                                                               "sing <mark>fire</mark>, "
+                                                                               "scream <mark>fire</mark> and forgive"}]
+
+
+def test_search_songs_with_prefix_of_lyrics(migrated_song_database, song1_base, song2_base, song3_base):
+    migrated_song_database.add_songs([song1_base, song2_base, song3_base])
+
+    results = migrated_song_database.run(lambda session: crud.search_songs(session, "cripp sinn"))
+
+    assert [result.title for result in results] == [song3_base.title]
+    assert results[0].lyrics_snippet == ("The saints are <mark>crippled</mark> on this <mark>sinners</mark> night, "
+                                         "lost are the lambs with no guiding light")
+
+
+def test_search_songs_with_title_match_has_no_lyrics_snippet(migrated_song_database, song1_base, song3_base):
+    migrated_song_database.add_songs([song1_base, song3_base])
+
+    results = migrated_song_database.run(lambda session: crud.search_songs(session, "Hardrock Lordi"))
+
+    assert [result.title for result in results] == [song3_base.title]
+    assert results[0].lyrics_snippet is None
+
+
+def test_search_songs_with_query_syntax_characters(migrated_song_database, song1_base):
+    migrated_song_database.add_songs([song1_base])
+
+    results = migrated_song_database.run(lambda session: crud.search_songs(session, 'Fire & "Forgive*'))
+
+    assert [result.title for result in results] == [song1_base.title]
+
+
+def test_search_songs_after_song_was_removed(migrated_song_database, song1_base):
+    migrated_song_database.add_songs([song1_base])
+
+    async def remove_song(session: AsyncSession) -> None:
+        await session.delete(await crud.get_song_by_id(session, 1))
+        await session.commit()
+
+    migrated_song_database.run(remove_song)
+
+    assert migrated_song_database.run(lambda session: crud.search_songs(session, "fire")) == []
+
+
+def test_get_songs_by_criteria_ignores_case_and_diacritics(migrated_song_database, song1_base, song3_base):
+    motorhead_base = UltrastarSongBase(title="Ace of Spades", artist="Motörhead")
+    migrated_song_database.add_songs([song1_base, motorhead_base, song3_base])
+
+    songs = migrated_song_database.run(lambda session: crud.get_songs_by_criteria(session, artist="MOTORHEAD"))
+
+    assert [song.title for song in songs] == [motorhead_base.title]
+
+
+def test_get_songs_by_criteria_with_title_and_artist_ignores_punctuation(migrated_song_database, song1_base):
+    migrated_song_database.add_songs([song1_base])
+
+    songs = migrated_song_database.run(lambda session: crud.get_songs_by_criteria(session, title="fire forgive",
+                                                                                  artist="powerwolf"))
+
+    assert [song.title for song in songs] == [song1_base.title]
+
+
+def test_get_songs_by_criteria_with_start_of_title(migrated_song_database, song1_base, song3_base):
+    migrated_song_database.add_songs([song1_base, song3_base])
+
+    songs_by_start = migrated_song_database.run(lambda session: crud.get_songs_by_criteria(session, title="fire &"))
+    songs_by_word = migrated_song_database.run(lambda session: crud.get_songs_by_criteria(session, title="forgive"))
+
+    assert [song.title for song in songs_by_start] == [song1_base.title]
+    assert songs_by_word == []
+
+
+def test_add_songs_if_not_in_db_skips_song_with_same_normalized_title_and_artist(migrated_song_database):
+    beyonce_base = UltrastarSongBase(title="Crazy in Love", artist="Beyoncé")
+    beyonce_variant_base = UltrastarSongBase(title="Crazy in love!", artist=" BEYONCE")
+
+    async def add_songs(session: AsyncSession) -> list[UltrastarSongBase]:
+        inserted_songs = await crud.add_songs_if_not_in_db(session, [beyonce_base], {})
+        inserted_songs += await crud.add_songs_if_not_in_db(session, [beyonce_variant_base], {})
+        await session.commit()
+        return inserted_songs
+
+    inserted_songs = migrated_song_database.run(add_songs)
+    songs = migrated_song_database.run(lambda session: crud.get_songs_by_criteria(session, title="crazy in love",
+                                                                                  artist="beyonce"))
+
+    assert inserted_songs == [beyonce_base]
+    assert [song.artist for song in songs] == [beyonce_base.artist]
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, List
+from unittest.mock import patch
+
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.app.config import settings
+from src.app.songs import crud
+from src.app.songs.ingestion import parse_song_file
+from src.app.songs.schemas import UltrastarSongBase
+from src.app.songs.service import is_song_file_unchanged, sync_song_dir
+from src.app.songs.watcher import watch_song_dir
+from watchfiles import Change
+
+
+async def get_song_titles(session: AsyncSession) -> List[str]:
+    return sorted(song.title for song in await crud.get_songs(session, None, 100))
+
+
+def test_sync_song_dir_skips_unchanged_files(tmp_path, song_database, write_song_file, song1_base, song2_base):
+    song_dir = tmp_path / "songs"
+    write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    write_song_file(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    first_sync = song_database.sync_song_dir(str(song_dir))
+
+    second_sync = song_database.sync_song_dir(str(song_dir))
+
+    assert (first_sync.discovered, first_sync.parsed, first_sync.inserted) == (2, 2, 2)
+    assert (second_sync.discovered, second_sync.unchanged, second_sync.parsed, second_sync.inserted) == (2, 2, 0, 0)
+    assert song_database.run(get_song_titles) == [song1_base.title, song2_base.title]
+
+
+def test_sync_song_dir_parses_file_with_changed_mtime_or_size(tmp_path, song_database, write_song_file,
+                                                              song1_base, song2_base):
+    song_dir = tmp_path / "songs"
+    file_path = write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    song_database.sync_song_dir(str(song_dir))
+    file_stat = os.stat(file_path)
+
+    os.utime(file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+    touched_sync = song_database.sync_song_dir(str(song_dir))
+    write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song2_base)
+    changed_sync = song_database.sync_song_dir(str(song_dir))
+
+    assert (touched_sync.unchanged, touched_sync.parsed) == (0, 1)
+    assert (changed_sync.unchanged, changed_sync.parsed) == (0, 1)
+    assert song_database.run(get_song_titles) == [song2_base.title]
+
+
+def test_sync_song_dir_removes_songs_of_deleted_files(tmp_path, song_database, write_song_file,
+                                                      song1_base, song2_base):
+    song_dir = tmp_path / "songs"
+    file_path = write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    write_song_file(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    song_database.sync_song_dir(str(song_dir))
+
+    os.remove(file_path)
+    sync = song_database.sync_song_dir(str(song_dir))
+
+    assert (sync.discovered, sync.unchanged) == (1, 1)
+    assert song_database.run(get_song_titles) == [song2_base.title]
+    assert [song_file.path for song_file in song_database.run(crud.get_song_files)] == [
+        str(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt")]
+
+
+def test_sync_song_dir_keeps_songs_of_dir_that_cannot_be_listed(tmp_path, song_database, write_song_file,
+                                                                song1_base, song2_base):
+    song_dir = tmp_path / "songs"
+    write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    write_song_file(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    song_database.sync_song_dir(str(song_dir))
+    unreadable_dir = str(song_dir / "Powerwolf - Fire & Forgive")
+    scandir = os.scandir
+
+    def fake_scandir(dir_path):
+        if dir_path == unreadable_dir:
+            raise PermissionError(13, "Permission denied", dir_path)
+        return scandir(dir_path)
+
+    with patch("src.ultrastar_file_parser.parser.os.scandir", fake_scandir):
+        sync = song_database.sync_song_dir(str(song_dir))
+
+    assert (sync.discovered, sync.unchanged) == (1, 1)
+    assert song_database.run(get_song_titles) == [song1_base.title, song2_base.title]
+    assert len(song_database.run(crud.get_song_files)) == 2
+
+
+def test_sync_song_dir_adds_songs_in_batches_once_per_key(tmp_path, monkeypatch, song_database, write_song_file,
+                                                          song1_base, song2_base, song3):
+    monkeypatch.setattr("src.app.songs.service.INGESTION_BATCH_SIZE", 2)
+    song_dir = tmp_path / "songs"
+    write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    write_song_file(song_dir / "Powerwolf - Fire & Forgive (Duet)" / "song.txt",
+                    song1_base.model_copy(update={"artist": "POWERWOLF "}))
+    write_song_file(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    write_song_file(song_dir / "Lordi - Hardrock Hallelujah" / "song.txt", song3)
+    song3 = song_database.run(lambda session: crud.add_song(session, song3))
+
+    sync = song_database.sync_song_dir(str(song_dir))
+
+    song_ids_by_path = {os.path.basename(os.path.dirname(song_file.path)): song_file.song_id
+                        for song_file in song_database.run(crud.get_song_files)}
+    assert sync.inserted == 2
+    assert song_database.run(get_song_titles) == [song1_base.title, song3.title, song2_base.title]
+    assert song_ids_by_path["Powerwolf - Fire & Forgive"] == song_ids_by_path["Powerwolf - Fire & Forgive (Duet)"]
+    assert song_ids_by_path["Lordi - Hardrock Hallelujah"] == song3.id
+    assert len(set(song_ids_by_path.values())) == 3
+
+
+def test_sync_song_dir_commits_nothing_of_a_batch_that_fails(tmp_path, song_database, write_song_file,
+                                                             song1_base, song2_base):
+    song_dir = tmp_path / "songs"
+    file_path = write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    song_database.sync_song_dir(str(song_dir))
+    song_files = song_database.run(crud.get_song_files)
+
+    # no longer an Ultrastar file, so its song is removed in the same batch the new song is added in
+    with open(file_path, "w") as file:
+        file.write("Fire & Forgive by Powerwolf\n")
+    write_song_file(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    with (patch("src.app.songs.service.add_or_update_song_files", side_effect=RuntimeError("disk full")),
+          pytest.raises(RuntimeError)):
+        song_database.sync_song_dir(str(song_dir))
+
+    assert song_database.run(get_song_titles) == [song1_base.title]
+    assert song_database.run(crud.get_song_files) == song_files
+
+
+def test_watcher_syncs_the_files_a_full_sync_finds_below_a_song_folder(tmp_path, monkeypatch, song_database,
+                                                                        write_song_file,
+                                                                        song1_base, song2_base, song3_base):
+    song_dir = tmp_path / "songs"
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(song_dir))
+    monkeypatch.setattr(settings, "SONG_DIR_MAX_DEPTH", 2)
+    monkeypatch.setattr(settings, "SONG_DIR_EXCLUDE_PATTERNS", ["Powerwolf Pack/Bonus"])
+    write_song_file(song_dir / "Powerwolf Pack" / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    write_song_file(song_dir / "Powerwolf Pack" / "Bonus" / "song.txt", song2_base)
+    write_song_file(song_dir / "Powerwolf Pack" / "Lordi" / "Lordi - Hardrock Hallelujah" / "song.txt", song3_base)
+
+    async def fake_awatch(*args, **kwargs):
+        yield {(Change.added, str(song_dir / "Powerwolf Pack"))}
+
+    with patch("src.app.songs.watcher.awatch", fake_awatch):
+        song_database.run_sync(watch_song_dir(str(song_dir), quiet_seconds=0))
+    watched_song_files = song_database.run(crud.get_song_files)
+    sync = song_database.sync_song_dir(str(song_dir))
+
+    assert [song_file.path for song_file in watched_song_files] == [
+        str(song_dir / "Powerwolf Pack" / "Powerwolf - Fire & Forgive" / "song.txt")]
+    assert (sync.discovered, sync.unchanged) == (1, 1)
+    assert song_database.run(crud.get_song_files) == watched_song_files
+    assert song_database.run(get_song_titles) == [song1_base.title]
+
+
+async def get_longest_stall(awaitable: Awaitable) -> float:
+    """Return the longest time a coroutine ticking next to an awaitable had to wait for the event loop."""
+    task = asyncio.ensure_future(awaitable)
+    tick_times = [time.monotonic()]
+    while not task.done():
+        await asyncio.sleep(0.01)
+        tick_times.append(time.monotonic())
+    await task
+    return max(later - earlier for earlier, later in zip(tick_times, tick_times[1:]))
+
+
+def test_sync_song_dir_keeps_the_event_loop_running(tmp_path, song_database, write_song_file, song1_base):
+    song_dir = tmp_path / "songs"
+    for index in range(10):
+        write_song_file(song_dir / f"Powerwolf - Fire & Forgive {index}" / "song.txt",
+                        song1_base.model_copy(update={"title": f"{song1_base.title} {index}"}))
+
+    def slow_parse_song_file(*args):
+        time.sleep(0.05)
+        return parse_song_file(*args)
+
+    def slow_is_song_file_unchanged(*args):
+        time.sleep(0.05)
+        return is_song_file_unchanged(*args)
+
+    with patch("src.app.songs.ingestion.parse_song_file", slow_parse_song_file):
+        parse_stall = song_database.run_sync(get_longest_stall(sync_song_dir(str(song_dir))))
+    with patch("src.app.songs.service.is_song_file_unchanged", slow_is_song_file_unchanged):
+        walk_stall = song_database.run_sync(get_longest_stall(sync_song_dir(str(song_dir))))
+
+    # each of the syncs blocks for half a second in total
+    assert parse_stall < 0.2
+    assert walk_stall < 0.2
+    assert len(song_database.run(get_song_titles)) == 10
+
+
+def test_sync_song_dir_detects_encoding_of_file_saved_in_another_one(tmp_path, song_database, write_song_file):
+    song_dir = tmp_path / "songs"
+    song_base = UltrastarSongBase(title="Motörhead Café", artist="Beyoncé", lyrics="Café au lait")
+    write_song_file(song_dir / "Beyoncé - Motörhead Café" / "song.txt", song_base, "cp1252")
+    song_database.sync_song_dir(str(song_dir))
+
+    # decodes without error as cp1252 too, but to other characters
+    write_song_file(song_dir / "Beyoncé - Motörhead Café" / "song.txt", song_base, "utf-8")
+    sync = song_database.sync_song_dir(str(song_dir))
+
+    song_file, = song_database.run(crud.get_song_files)
+    assert sync.parsed == 1
+    assert song_file.encoding == "utf-8"
+    assert song_database.run(get_song_titles) == [song_base.title]
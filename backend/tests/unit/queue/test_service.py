@@ -0,0 +1,41 @@
+import random
+import sys
+import threading
+
+import pytest
+from src.app.queue.service import QueueService
+
+
+@pytest.fixture()
+def short_switch_interval():
+    """Switch between threads as often as possible, so a read without the lock would see a half made change."""
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(switch_interval)
+
+
+def test_queue_is_read_in_one_piece_while_entries_are_moved(short_switch_interval,
+                                                             entry1_in_queue, entry2_in_queue, entry3_in_queue):
+    queue_service = QueueService()
+    for _ in range(10):
+        for entry in [entry1_in_queue, entry2_in_queue, entry3_in_queue]:
+            queue_service.add_entry_at_end(entry)
+    entry_ids = queue_service.entry_ids
+    moved = threading.Event()
+
+    def move_entries() -> None:
+        rng = random.Random(42)
+        for _ in range(5000):
+            queue_service.move_entry_before_entry(rng.choice(entry_ids), rng.choice(entry_ids + [None]))
+        moved.set()
+
+    mover = threading.Thread(target=move_entries)
+    mover.start()
+    read_entry_ids = []
+    while not moved.is_set():
+        read_entry_ids.append(sorted(entry.id for entry in queue_service.scheduled_queue()))
+        read_entry_ids.append(sorted(queue_service.entry_ids))
+    mover.join()
+
+    assert all(read == entry_ids for read in read_entry_ids)
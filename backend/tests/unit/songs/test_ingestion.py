@@ -0,0 +1,132 @@
+import asyncio
+import os
+from datetime import timedelta
+from typing import AsyncIterator, List
+from unittest.mock import patch
+
+from src.app.songs.ingestion import parse_song_file, parse_song_files
+from src.app.songs.schemas import ParsedSongFile, UltrastarSongBase
+from src.ultrastar_file_parser.cache import ParseResultCache
+
+
+def collect_parsed_song_files(parsed_song_files: AsyncIterator[ParsedSongFile]) -> List[ParsedSongFile]:
+    """Return the parsed song files ordered by path, they are yielded in the order they finish parsing."""
+    async def collect() -> List[ParsedSongFile]:
+        return [parsed_song_file async for parsed_song_file in parsed_song_files]
+
+    return sorted(asyncio.run(collect()), key=lambda parsed_song_file: parsed_song_file.file_path)
+
+
+def test_parse_song_files_in_process_pool_as_in_serial(tmp_path, write_song_file, song1_base, song2_base, song3_base):
+    (tmp_path / "readme.txt").write_text("Not a song")
+    file_paths = [write_song_file(tmp_path / "Powerwolf - Fire & Forgive" / "song.txt", song1_base),
+                  write_song_file(tmp_path / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base),
+                  write_song_file(tmp_path / "Lordi - Hardrock Hallelujah" / "song.txt", song3_base, "cp1252"),
+                  str(tmp_path / "readme.txt")]
+
+    serial = collect_parsed_song_files(parse_song_files(file_paths, workers=1, duration_source="notes"))
+    pooled = collect_parsed_song_files(parse_song_files(file_paths, workers=2, duration_source="notes"))
+
+    assert pooled == serial
+    assert [parsed_song_file.song.title for parsed_song_file in serial if parsed_song_file.song] == [
+        "Hardrock Hallelujah", "Fire & Forgive", "Sainted by the Storm"]
+    assert all(parsed_song_file.notes for parsed_song_file in serial if parsed_song_file.song)
+
+
+def test_parse_song_file_with_character_not_fitting_encoding_detected_from_first_bytes(tmp_path, write_song_file):
+    # more than the first bytes the encoding is detected from are ascii
+    song_base = UltrastarSongBase(title="Fire & Forgive",
+                                  artist="Powerwolf",
+                                  lyrics=" ".join(["la"] * 10000 + ["Café"]))
+    file_path = write_song_file(tmp_path / "song.txt", song_base, "cp1252")
+
+    parsed_song_file = parse_song_file(file_path, duration_source="notes")
+
+    assert parsed_song_file.errors == []
+    assert parsed_song_file.encoding == "cp1252"
+    assert parsed_song_file.song.lyrics.rstrip() == song_base.lyrics
+
+
+def test_parse_song_file_reads_file_once(tmp_path, write_song_file, song1_base):
+    file_path = write_song_file(tmp_path / "song.txt", song1_base, "cp1252")
+
+    with patch("builtins.open", wraps=open) as mock_open:
+        parsed_song_file = parse_song_file(file_path, duration_source="notes")
+
+    assert parsed_song_file.song.title == song1_base.title
+    assert parsed_song_file.content_hash
+    assert [call.args[0] for call in mock_open.call_args_list] == [file_path]
+
+
+def test_parse_song_files_takes_unchanged_files_from_cache(tmp_path, write_song_file, song1_base, song2_base):
+    file_paths = [write_song_file(tmp_path / "Powerwolf - Fire & Forgive" / "song.txt", song1_base),
+                  write_song_file(tmp_path / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)]
+
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        parsed = collect_parsed_song_files(parse_song_files(file_paths, cache=cache, duration_source="notes"))
+        with patch("src.app.songs.ingestion.parse_song_file") as mock_parse_song_file:
+            cached = collect_parsed_song_files(parse_song_files(file_paths, cache=cache, duration_source="notes"))
+
+    assert cached == parsed
+    mock_parse_song_file.assert_not_called()
+
+
+def test_parse_song_files_parses_files_with_changed_size_or_mtime_again(tmp_path, write_song_file,
+                                                                        song1_base, song2_base):
+    touched_file_path = write_song_file(tmp_path / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    changed_file_path = write_song_file(tmp_path / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    unchanged_file_path = write_song_file(tmp_path / "Lordi - Hardrock Hallelujah" / "song.txt", song1_base)
+    file_paths = [touched_file_path, changed_file_path, unchanged_file_path]
+
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        collect_parsed_song_files(parse_song_files(file_paths, cache=cache, duration_source="notes"))
+        file_stat = os.stat(touched_file_path)
+        os.utime(touched_file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+        write_song_file(tmp_path / "Powerwolf - Sainted by the Storm" / "song.txt", song1_base)
+        with patch("src.app.songs.ingestion.parse_song_file", wraps=parse_song_file) as mock_parse_song_file:
+            parsed = collect_parsed_song_files(parse_song_files(file_paths, cache=cache, duration_source="notes"))
+
+    assert sorted(call.args[0] for call in mock_parse_song_file.call_args_list) == sorted([touched_file_path,
+                                                                                           changed_file_path])
+    assert [parsed_song_file.song.title for parsed_song_file in parsed] == [song1_base.title] * 3
+
+
+def test_parse_song_file_takes_duration_from_source(tmp_path, write_song_file, song1_base):
+    file_path = write_song_file(tmp_path / "song.txt", song1_base)
+
+    from_notes = parse_song_file(file_path, duration_source="notes")
+    from_audio = parse_song_file(file_path, duration_source="audio")
+    with patch("src.app.songs.ingestion.get_audio_duration", return_value=timedelta(seconds=270)):
+        from_audio_file = parse_song_file(file_path, duration_source="audio")
+
+    # the last note ends at beat 39, 1.95 seconds into the song at 300 bpm
+    assert (from_notes.song.audio_duration, from_notes.errors) == (timedelta(seconds=2), [])
+    assert from_audio.song.audio_duration is None
+    assert len(from_audio.errors) == 1
+    assert (from_audio_file.song.audio_duration, from_audio_file.errors) == (timedelta(seconds=270), [])
+
+
+def test_parse_song_file_falls_back_to_audio_without_duration_from_notes(tmp_path):
+    file_path = tmp_path / "song.txt"
+    file_path.write_text("#TITLE:Fire & Forgive\n#ARTIST:Powerwolf\n#MP3:song.mp3\n: 0 4 5 And\nE\n")
+
+    with patch("src.app.songs.ingestion.get_audio_duration", return_value=timedelta(seconds=270)) as mock_duration:
+        parsed_song_file = parse_song_file(str(file_path), duration_source="notes_with_audio_fallback")
+
+    assert parsed_song_file.song.audio_duration == timedelta(seconds=270)
+    mock_duration.assert_called_once_with(str(tmp_path / "song.mp3"))
+
+
+def test_parse_song_files_parses_cached_file_with_duration_from_other_source_again(tmp_path, write_song_file,
+                                                                                   song1_base):
+    file_paths = [write_song_file(tmp_path / "song.txt", song1_base)]
+
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        collect_parsed_song_files(parse_song_files(file_paths, cache=cache, duration_source="audio"))
+        parsed_song_file, = collect_parsed_song_files(parse_song_files(file_paths, cache=cache,
+                                                                       duration_source="notes"))
+        cached_song_file, = collect_parsed_song_files(parse_song_files(file_paths, cache=cache,
+                                                                       duration_source="notes"))
+
+    assert parsed_song_file.song.audio_duration == timedelta(seconds=2)
+    assert cached_song_file == parsed_song_file
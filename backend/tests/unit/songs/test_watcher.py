@@ -0,0 +1,40 @@
+import asyncio
+from unittest.mock import patch
+
+from src.app.songs.watcher import get_affected_dir, watch_song_dir
+from watchfiles import Change
+
+
+def test_watch_song_dir_syncs_outermost_dirs_once_they_are_quiet(tmp_path):
+    song_dir = tmp_path / "songs"
+    for dir_path in [song_dir / "Powerwolf - Fire & Forgive", song_dir / "Lordi Pack" / "Lordi - Hardrock Hallelujah"]:
+        dir_path.mkdir(parents=True)
+    # the changes seen by the watcher at the time next to them, an empty set when it timed out
+    changes_and_times = [({(Change.added, str(song_dir / "Powerwolf - Fire & Forgive" / "song.txt")),
+                           (Change.added, str(song_dir / "Lordi Pack"))}, 0),
+                         ({(Change.added, str(song_dir / "Lordi Pack" / "Lordi - Hardrock Hallelujah" / "song.txt"))},
+                          3),
+                         (set(), 6),
+                         (set(), 9)]
+
+    async def fake_awatch(*args, **kwargs):
+        for changes, _ in changes_and_times:
+            yield changes
+
+    with (patch("src.app.songs.watcher.awatch", fake_awatch),
+          patch("src.app.songs.watcher.time") as mock_time,
+          patch("src.app.songs.watcher.sync_song_dir") as mock_sync_song_dir):
+        mock_time.monotonic.side_effect = [now for _, now in changes_and_times]
+        asyncio.run(watch_song_dir(str(song_dir), quiet_seconds=5))
+
+    # the pack is not quiet at 6, as a folder in it changed at 3, and its folder is synced with it at 9
+    assert [call.args[0] for call in mock_sync_song_dir.call_args_list] == [
+        str(song_dir / "Powerwolf - Fire & Forgive"), str(song_dir / "Lordi Pack")]
+
+
+def test_get_affected_dir_of_deleted_path_by_song_file_patterns(tmp_path):
+    song_folder = tmp_path / "songs" / "Powerwolf - Fire & Forgive"
+
+    assert get_affected_dir(Change.deleted, str(song_folder / "song.txt"), ["*.txt"]) == str(song_folder)
+    assert get_affected_dir(Change.deleted, str(song_folder / "song.ult"), ["*.txt", "*.ult"]) == str(song_folder)
+    assert get_affected_dir(Change.deleted, str(song_folder / "song.txt"), ["*.ult"]) == str(song_folder / "song.txt")
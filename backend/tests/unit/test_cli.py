@@ -0,0 +1,266 @@
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+from typing import List
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.app.config import settings
+from src.app.main import (SONG_DIR_SYNCED_MARK, build_catalog, start, startup_progress,
+                          sync_library_once_for_all_workers)
+
+"""test ultrastar-queue-build-catalog and ultrastar-queue"""
+
+
+@pytest.fixture()
+def mock_catalog_build():
+    with (patch("src.app.main.upgrade_database") as mock_upgrade_database,
+          patch("src.app.main.populate_database") as mock_populate_database,
+          patch("src.app.main.compact_database") as mock_compact_database):
+        yield mock_upgrade_database, mock_populate_database, mock_compact_database
+
+
+def test_build_catalog_compacts_into_output(tmp_path, monkeypatch, mock_catalog_build):
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(tmp_path))
+    mock_upgrade_database, mock_populate_database, mock_compact_database = mock_catalog_build
+    output_path = str(tmp_path / "catalog.sqlite")
+
+    with patch("sys.argv", ["ultrastar-queue-build-catalog", "--output", output_path]):
+        build_catalog()
+
+    mock_upgrade_database.assert_called_once()
+    mock_populate_database.assert_awaited_once()
+    mock_compact_database.assert_awaited_once_with(output_path)
+
+
+def test_build_catalog_compacts_in_place_without_output(tmp_path, monkeypatch, mock_catalog_build):
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(tmp_path))
+    _, _, mock_compact_database = mock_catalog_build
+
+    with patch("sys.argv", ["ultrastar-queue-build-catalog"]):
+        build_catalog()
+
+    mock_compact_database.assert_awaited_once_with(None)
+
+
+def test_build_catalog_refuses_existing_output(tmp_path, monkeypatch, mock_catalog_build, capsys):
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(tmp_path))
+    mock_upgrade_database, _, _ = mock_catalog_build
+    output_path = tmp_path / "catalog.sqlite"
+    output_path.touch()
+
+    with patch("sys.argv", ["ultrastar-queue-build-catalog", "--output", str(output_path)]):
+        with pytest.raises(SystemExit) as exc_info:
+            build_catalog()
+
+    assert exc_info.value.code == 2
+    assert f"{output_path} already exists" in capsys.readouterr().err
+    mock_upgrade_database.assert_not_called()
+
+
+def test_build_catalog_refuses_missing_song_dir(tmp_path, monkeypatch, mock_catalog_build, capsys):
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(tmp_path / "missing"))
+    mock_upgrade_database, _, _ = mock_catalog_build
+
+    with patch("sys.argv", ["ultrastar-queue-build-catalog"]):
+        with pytest.raises(SystemExit) as exc_info:
+            build_catalog()
+
+    assert exc_info.value.code == 2
+    assert "Could not find path" in capsys.readouterr().err
+    mock_upgrade_database.assert_not_called()
+
+
+def test_build_catalog_ingests_song_dir_into_output(tmp_path, monkeypatch, write_song_file, song1_base, song2_base):
+    song_dir = tmp_path / "songs"
+    write_song_file(song_dir / "Powerwolf - Fire & Forgive" / "song.txt", song1_base)
+    write_song_file(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt", song2_base)
+    (song_dir / "readme.txt").write_text("Not a song")
+    database_url = f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}"
+    output_path = str(tmp_path / "catalog.sqlite")
+    # the song files of the test have no audio files
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(song_dir))
+    monkeypatch.setattr(settings, "DATABASE_URL", database_url)
+    monkeypatch.setattr(settings, "SONG_DURATION_SOURCE", "notes")
+    monkeypatch.setattr(settings, "INGESTION_WORKERS", 1)
+    monkeypatch.setattr(settings, "PARSE_CACHE_PATH", None)
+    monkeypatch.setenv("ALEMBIC_CONFIG_PATH", "alembic.ini")
+    async_engine = create_async_engine(database_url)
+    monkeypatch.setattr("src.app.main.async_engine", async_engine)
+    monkeypatch.setattr("src.app.dependencies.async_engine", async_engine)
+
+    # the logging config of alembic.ini would disable the loggers of the app for the following tests
+    with (patch("sys.argv", ["ultrastar-queue-build-catalog", "--output", output_path]),
+          patch("logging.config.fileConfig")):
+        build_catalog()
+
+    with sqlite3.connect(output_path) as connection:
+        titles = [title for title, in connection.execute("SELECT title FROM ultrastarsong ORDER BY title")]
+        paths = [path for path, in connection.execute("SELECT path FROM ultrastarsongfile ORDER BY path")]
+        searched_titles = [title for title, in connection.execute("SELECT title FROM ultrastarsong_fts "
+                                                                  "WHERE ultrastarsong_fts MATCH 'storm'")]
+    assert titles == [song1_base.title, song2_base.title]
+    assert paths == [str(song_dir / "Powerwolf - Fire & Forgive" / "song.txt"),
+                     str(song_dir / "Powerwolf - Sainted by the Storm" / "song.txt"),
+                     str(song_dir / "readme.txt")]
+    assert searched_titles == [song2_base.title]
+
+
+@pytest.fixture()
+def mock_server_start():
+    with (patch("src.app.main.upgrade_database") as mock_upgrade_database,
+          patch("src.app.main.add_users_to_db") as mock_add_users_to_db,
+          patch("src.app.main.populate_database") as mock_populate_database,
+          patch("src.app.main.uvicorn.run") as mock_uvicorn_run):
+        yield mock_upgrade_database, mock_add_users_to_db, mock_populate_database, mock_uvicorn_run
+
+
+def test_start_refuses_less_than_one_worker(mock_server_start, capsys):
+    mock_upgrade_database, _, _, mock_uvicorn_run = mock_server_start
+
+    with patch("sys.argv", ["ultrastar-queue", "--workers", "0"]):
+        with pytest.raises(SystemExit) as exc_info:
+            start()
+
+    assert exc_info.value.code == 2
+    assert "--workers must be at least 1" in capsys.readouterr().err
+    mock_upgrade_database.assert_not_called()
+    mock_uvicorn_run.assert_not_called()
+
+
+def test_start_refuses_several_workers_without_queue_journal(monkeypatch, mock_server_start, capsys):
+    monkeypatch.setattr(settings, "QUEUE_JOURNAL_PATH", None)
+    mock_upgrade_database, _, _, mock_uvicorn_run = mock_server_start
+
+    with patch("sys.argv", ["ultrastar-queue", "--workers", "2"]):
+        with pytest.raises(SystemExit) as exc_info:
+            start()
+
+    assert exc_info.value.code == 2
+    assert "QUEUE_JOURNAL_PATH" in capsys.readouterr().err
+    mock_upgrade_database.assert_not_called()
+    mock_uvicorn_run.assert_not_called()
+
+
+def test_start_with_several_workers_leaves_song_dir_sync_to_workers(tmp_path, monkeypatch, mock_server_start):
+    monkeypatch.setattr(settings, "QUEUE_JOURNAL_PATH", str(tmp_path / "queue_journal.sqlite"))
+    monkeypatch.setattr(settings, "PATH_TO_ULTRASTAR_SONG_DIR", str(tmp_path))
+    monkeypatch.delenv("SONG_DIR_SYNC_LOCK_PATH", raising=False)
+    lock_path = tmp_path / "queue_journal.sqlite.sync-lock"
+    lock_path.write_text(SONG_DIR_SYNCED_MARK)
+    mock_upgrade_database, mock_add_users_to_db, mock_populate_database, mock_uvicorn_run = mock_server_start
+
+    with patch("sys.argv", ["ultrastar-queue", "--workers", "2"]):
+        start()
+
+    mock_upgrade_database.assert_called_once()
+    mock_add_users_to_db.assert_awaited_once()
+    mock_populate_database.assert_not_awaited()
+    mock_uvicorn_run.assert_called_once_with("src.app.main:app", host="0.0.0.0", port=8000, workers=2)
+    assert os.environ["SONG_DIR_SYNC_LOCK_PATH"] == str(lock_path)
+    assert lock_path.read_text() == ""
+
+
+def run_workers_syncing_library(lock_path: str, sync_results: List[bool], workers: int) -> List[bool]:
+    """Run the shared library sync of several workers at once, return the results of the syncs that ran."""
+    sync_results = iter(sync_results)
+    ran_sync_results = []
+
+    async def fake_sync_library() -> bool:
+        await asyncio.sleep(0.05)
+        ran_sync_results.append(next(sync_results))
+        return ran_sync_results[-1]
+
+    async def run_workers() -> None:
+        stop_event = asyncio.Event()
+        await asyncio.gather(*(sync_library_once_for_all_workers(lock_path, stop_event) for _ in range(workers)))
+
+    with patch("src.app.main.sync_library", fake_sync_library):
+        asyncio.run(run_workers())
+    startup_progress.reset()
+    return ran_sync_results
+
+
+def test_song_dir_is_synced_by_one_of_several_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.app.main.SYNC_LOCK_POLL_SECONDS", 0.01)
+    lock_path = tmp_path / "queue_journal.sqlite.sync-lock"
+    lock_path.touch()
+
+    with patch("src.app.main.build_song_search_indexes") as mock_build_song_search_indexes:
+        ran_sync_results = run_workers_syncing_library(str(lock_path), [True], workers=3)
+
+    assert ran_sync_results == [True]
+    assert mock_build_song_search_indexes.await_count == 2
+    assert lock_path.read_text() == SONG_DIR_SYNCED_MARK
+
+
+def test_song_dir_is_synced_by_next_worker_after_failed_sync(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.app.main.SYNC_LOCK_POLL_SECONDS", 0.01)
+    lock_path = tmp_path / "queue_journal.sqlite.sync-lock"
+    lock_path.touch()
+
+    with patch("src.app.main.build_song_search_indexes") as mock_build_song_search_indexes:
+        ran_sync_results = run_workers_syncing_library(str(lock_path), [False, True], workers=3)
+
+    assert ran_sync_results == [False, True]
+    assert mock_build_song_search_indexes.await_count == 1
+    assert lock_path.read_text() == SONG_DIR_SYNCED_MARK
+
+
+def test_song_dir_sync_lock_is_created_in_missing_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.app.main.SYNC_LOCK_POLL_SECONDS", 0.01)
+    lock_path = tmp_path / "journal" / "queue_journal.sqlite.sync-lock"
+
+    with patch("src.app.main.build_song_search_indexes") as mock_build_song_search_indexes:
+        ran_sync_results = run_workers_syncing_library(str(lock_path), [True], workers=2)
+
+    assert ran_sync_results == [True]
+    assert mock_build_song_search_indexes.await_count == 1
+    assert lock_path.read_text() == SONG_DIR_SYNCED_MARK
+
+
+def test_song_dir_is_synced_without_lock_that_cannot_be_taken(tmp_path):
+    # a dir cannot be opened as lock file
+    with patch("src.app.main.sync_library", return_value=True) as mock_sync_library:
+        asyncio.run(sync_library_once_for_all_workers(str(tmp_path), asyncio.Event()))
+
+    assert mock_sync_library.await_count == 1
+    assert startup_progress.ready
+
+    startup_progress.reset()
+
+
+def sync_library_in_worker(lock_path: str, barrier, results) -> None:
+    """Run the shared library sync in a worker process of its own, at the same time as the other workers."""
+
+    async def fake_sync_library() -> bool:
+        results.put("synced")
+        await asyncio.sleep(0.2)
+        return True
+
+    async def fake_build_song_search_indexes() -> None:
+        results.put("search indexes rebuilt")
+
+    barrier.wait()
+    with (patch("src.app.main.SYNC_LOCK_POLL_SECONDS", 0.01),
+          patch("src.app.main.sync_library", fake_sync_library),
+          patch("src.app.main.build_song_search_indexes", fake_build_song_search_indexes)):
+        asyncio.run(sync_library_once_for_all_workers(lock_path, asyncio.Event()))
+
+
+def test_song_dir_is_synced_by_one_of_two_worker_processes(tmp_path):
+    lock_path = str(tmp_path / "queue_journal.sqlite.sync-lock")
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(2)
+    results = context.Queue()
+    workers = [context.Process(target=sync_library_in_worker, args=(lock_path, barrier, results)) for _ in range(2)]
+
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    assert sorted(results.get(timeout=1) for _ in workers) == ["search indexes rebuilt", "synced"]
@@ -0,0 +1,30 @@
+from src.ultrastar_file_parser.cache import CachedParseResult, ParseResultCache
+
+
+def test_parse_result_cache_returns_result_for_unchanged_size_and_mtime(tmp_path):
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        cache.put("/songs/song.txt", 100, 5, {"title": "Fire & Forgive"}, b"notes")
+
+        assert cache.get("/songs/song.txt", 100, 5) == CachedParseResult({"title": "Fire & Forgive"}, b"notes")
+        assert cache.get("/songs/song.txt", 101, 5) is None
+        assert cache.get("/songs/song.txt", 100, 6) is None
+        assert cache.get("/songs/other.txt", 100, 5) is None
+
+
+def test_parse_result_cache_keeps_results_after_close(tmp_path):
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        cache.put("/songs/song.txt", 100, 5, {"title": "Fire & Forgive"})
+
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        assert cache.get("/songs/song.txt", 100, 5) == CachedParseResult({"title": "Fire & Forgive"})
+
+
+def test_parse_result_cache_evicts_missing_files_below_dir(tmp_path):
+    with ParseResultCache(str(tmp_path / "parse_cache.sqlite")) as cache:
+        for file_path in ["/songs/a/song.txt", "/songs/b/song.txt", "/songs_backup/a/song.txt"]:
+            cache.put(file_path, 100, 5, {})
+
+        assert cache.evict_missing("/songs", ["/songs/b/song.txt"]) == 1
+        assert cache.get("/songs/a/song.txt", 100, 5) is None
+        assert cache.get("/songs/b/song.txt", 100, 5) is not None
+        assert cache.get("/songs_backup/a/song.txt", 100, 5) is not None
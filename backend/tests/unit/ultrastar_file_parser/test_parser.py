@@ -0,0 +1,152 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from src.ultrastar_file_parser import (EndOfFile, EndOfPhrase, HeaderAttribute, Note, NoteType, PlayerSwitch,
+                                       UltrastarFileParser)
+from src.ultrastar_file_parser.exceptions import UltrastarMatchingError
+
+DUET_LINES = ["#TITLE:Fire & Forgive\n",
+              "#artist: Powerwolf \n",
+              "#BPM:300\n",
+              "P1\n",
+              ": 0 4 5 And \n",
+              "* 5 4 12 we\n",
+              "- 10\n",
+              "P2\n",
+              "R 12 2 -3 bring \n",
+              "F 15 2 0 fi~\n",
+              "- 18 20\n",
+              "G 21 4 7 re\n",
+              "E\n",
+              "not read after the end of file\n"]
+
+
+def test_iter_file_events_of_duet(tmp_path):
+    file_path = tmp_path / "song.txt"
+    file_path.write_text("".join(DUET_LINES), encoding="utf-8")
+
+    events = list(UltrastarFileParser.iter_file_events(str(file_path)))
+
+    assert events == [HeaderAttribute("title", "Fire & Forgive"),
+                      HeaderAttribute("artist", "Powerwolf"),
+                      HeaderAttribute("bpm", "300"),
+                      PlayerSwitch(1),
+                      Note(NoteType.NORMAL, 0, 4, 5, "And "),
+                      Note(NoteType.GOLDEN, 5, 4, 12, "we"),
+                      EndOfPhrase(10),
+                      PlayerSwitch(2),
+                      Note(NoteType.RAP, 12, 2, -3, "bring "),
+                      Note(NoteType.FREESTYLE, 15, 2, 0, "fi~"),
+                      EndOfPhrase(18, 20),
+                      Note(NoteType.RAP_GOLDEN, 21, 4, 7, "re"),
+                      EndOfFile()]
+
+
+def test_iter_line_events_ends_with_end_of_file_without_end_of_file_line():
+    events = list(UltrastarFileParser.iter_line_events(["#TITLE:Fire & Forgive", ": 0 4 5 And"]))
+
+    assert events == [HeaderAttribute("title", "Fire & Forgive"), Note(NoteType.NORMAL, 0, 4, 5, "And"), EndOfFile()]
+
+
+def test_iter_line_events_raises_for_line_not_in_ultrastar_format():
+    with pytest.raises(UltrastarMatchingError):
+        list(UltrastarFileParser.iter_line_events(["#TITLE:Fire & Forgive", "Fire & Forgive by Powerwolf"]))
+
+
+@pytest.mark.parametrize("head, encoding", [
+    ("#TITLE:Café".encode("utf-8-sig"), "utf-8-sig"),
+    ("#TITLE:Café".encode("utf-16"), "utf-16"),
+    ("#TITLE:Café".encode("utf-32"), "utf-32"),
+    ("#ENCODING:CP1250\n#TITLE:Łódź".encode("cp1250"), "cp1250"),
+    ("#TITLE:Café".encode("utf-8"), "utf-8"),
+    ("#TITLE:Café".encode("cp1252"), "cp1252"),
+    (b"#TITLE:\x81", "latin-1"),
+])
+def test_detect_encoding(head, encoding):
+    assert UltrastarFileParser.detect_encoding(head, is_complete=True) == encoding
+
+
+def test_detect_encoding_ignores_encoding_header_not_fitting_file():
+    assert UltrastarFileParser.detect_encoding("#ENCODING:ASCII\n#TITLE:Café".encode("utf-8"), True) == "utf-8"
+
+
+def test_detect_encoding_of_head_with_cut_off_character():
+    head = "#TITLE:Café".encode("utf-8")[:-1]
+
+    assert UltrastarFileParser.detect_encoding(head) == "utf-8"
+    assert UltrastarFileParser.detect_encoding(head, is_complete=True) == "cp1252"
+
+
+def test_open_file_detects_encoding(tmp_path):
+    file_path = tmp_path / "song.txt"
+    file_path.write_bytes("#TITLE:Café\n".encode("utf-8-sig"))
+
+    with UltrastarFileParser.open_file(str(file_path)) as file:
+        assert (file.encoding, file.read()) == ("utf-8-sig", "#TITLE:Café\n")
+    with UltrastarFileParser.open_file(str(file_path), "cp1252") as file:
+        assert file.encoding == "cp1252"
+
+
+@pytest.fixture()
+def song_dir(tmp_path):
+    """A song dir with song folders at different depths, a symlink loop and a symlink to a folder outside of it."""
+    song_dir = tmp_path / "songs"
+    for relative_path in ["top.txt",
+                          "Powerwolf/Fire & Forgive/song.txt",
+                          "Powerwolf/Fire & Forgive/cover.jpg",
+                          "Lordi/Hardrock Hallelujah/song.txt",
+                          "Lordi/Hardrock Hallelujah/demo.txt",
+                          "Backup/Powerwolf/Fire & Forgive/song.txt"]:
+        (song_dir / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (song_dir / relative_path).write_text("#TITLE:Song\n")
+    (tmp_path / "outside" / "Sainted by the Storm").mkdir(parents=True)
+    (tmp_path / "outside" / "Sainted by the Storm" / "song.txt").write_text("#TITLE:Song\n")
+    (song_dir / "Powerwolf" / "loop").symlink_to(song_dir, target_is_directory=True)
+    (song_dir / "Powerwolf" / "outside").symlink_to(tmp_path / "outside", target_is_directory=True)
+    return song_dir
+
+
+def get_relative_song_file_paths(song_dir, **kwargs):
+    return sorted(os.path.relpath(file_path, song_dir).replace(os.sep, "/")
+                  for file_path in UltrastarFileParser.iter_song_file_paths(str(song_dir), **kwargs))
+
+
+def test_iter_song_file_paths_visits_every_dir_once_following_symlinks(song_dir):
+    assert get_relative_song_file_paths(song_dir) == ["Backup/Powerwolf/Fire & Forgive/song.txt",
+                                                      "Lordi/Hardrock Hallelujah/demo.txt",
+                                                      "Lordi/Hardrock Hallelujah/song.txt",
+                                                      "Powerwolf/Fire & Forgive/song.txt",
+                                                      "Powerwolf/outside/Sainted by the Storm/song.txt",
+                                                      "top.txt"]
+
+
+def test_iter_song_file_paths_skips_excluded_names_and_relative_paths(song_dir):
+    assert get_relative_song_file_paths(song_dir, exclude=["Backup", "Lordi/*/demo.txt", "outside"]) == [
+        "Lordi/Hardrock Hallelujah/song.txt", "Powerwolf/Fire & Forgive/song.txt", "top.txt"]
+
+
+def test_iter_song_file_paths_stops_at_max_depth(song_dir):
+    assert get_relative_song_file_paths(song_dir, max_depth=0) == ["top.txt"]
+    assert get_relative_song_file_paths(song_dir, max_depth=2, exclude=["Backup"]) == [
+        "Lordi/Hardrock Hallelujah/demo.txt", "Lordi/Hardrock Hallelujah/song.txt",
+        "Powerwolf/Fire & Forgive/song.txt", "top.txt"]
+
+
+def test_iter_song_file_paths_passes_dirs_that_cannot_be_listed_to_on_error(song_dir):
+    unreadable_dir = str(song_dir / "Lordi")
+    errors = []
+    scandir = os.scandir
+
+    def fake_scandir(dir_path):
+        if dir_path == unreadable_dir:
+            raise PermissionError(13, "Permission denied", dir_path)
+        return scandir(dir_path)
+
+    with patch("src.ultrastar_file_parser.parser.os.scandir", fake_scandir):
+        file_paths = get_relative_song_file_paths(song_dir, exclude=["Backup"],
+                                                  on_error=lambda path, e: errors.append((path, type(e))))
+
+    assert file_paths == ["Powerwolf/Fire & Forgive/song.txt", "Powerwolf/outside/Sainted by the Storm/song.txt",
+                          "top.txt"]
+    assert errors == [(unreadable_dir, PermissionError)]
@@ -10,6 +10,7 @@ const authRoute = "/auth"
 export const getQueueURL = `${serverRoute}${queueRoute}/`
 export const getProcessedEntriesURL = `${serverRoute}${queueRoute}/processed-entries`
 export const getTimeUntilEndOfQueueURL = `${serverRoute}${queueRoute}/get-time-until-end-of-queue`
+export const getTimeUntilEntryURL = `${serverRoute}${queueRoute}/get-time-until-entry`
 export const addEntryToQueueURL = `${serverRoute}${queueRoute}/add-entry`
 
 
@@ -17,6 +18,7 @@ export const addEntryToQueueURL = `${serverRoute}${queueRoute}/add-entry`
 export const getSongsURL = `${serverRoute}${songsRoute}/`
 export const getSongsByCriteriaURL = `${serverRoute}${songsRoute}/get-songs-by-criteria`
 export const getSongByIdURL = `${serverRoute}${songsRoute}`
+export const suggestSongsURL = `${serverRoute}${songsRoute}/suggest`
 
 
 // AUTH
@@ -31,6 +33,9 @@ export const addEntryToQueueAsAdminURL = `${serverRoute}${adminRoute}/add-entry-
 export const removeEntryFromQueueURL = `${serverRoute}${adminRoute}/remove-entry`
 export const moveEntryFromIndexToIndexURL= `${serverRoute}${adminRoute}/move-entry-from-index-to-index`
 export const markEntryAtIndexAsProcessedURL = `${serverRoute}${adminRoute}/mark-entry-at-index-as-processed`
+export const markEntryAsProcessedURL = `${serverRoute}${adminRoute}/mark-entry-as-processed`
+export const removeEntryFromQueueByIdURL = `${serverRoute}${adminRoute}/remove-entry-by-id`
+export const moveEntryBeforeEntryURL = `${serverRoute}${adminRoute}/move-entry-before-entry`
 export const getQueueIsOpenURL = `${serverRoute}${adminRoute}/get-queue-is-open`
 export const getTimeBetweenSameSongURL = `${serverRoute}${adminRoute}/get-time-between-same-song`
 export const getMaxTimesSongCanBeSungURL = `${serverRoute}${adminRoute}/get-max-times-song-can-be-sung`
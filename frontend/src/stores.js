@@ -5,6 +5,8 @@ export const QueueStore = writable([])
 
 export const SongStore = writable([])
 
+export const SongsNextCursorStore = writable(null)
+
 export const ProcessedQueueEntriesStore = writable([])
 
 export const ErrorAlertStore = writable([])